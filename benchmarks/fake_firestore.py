@@ -0,0 +1,486 @@
+import asyncio
+import bisect
+import random
+import string
+import threading
+import time
+from datetime import datetime, timezone
+
+# Sustituto en memoria de firestore.client() para medir el panel sin el proyecto real.
+# Implementa solo lo que usa gymRaceAdmin: colecciones, select/where/order_by/limit/start_after,
+# stream, get_all, documentos, agregaciones count/sum/avg, on_snapshot y bulk_writer. La latencia se simula
+# con una espera por cada llamada a "la red". async_client() devuelve la versión con la interfaz
+# del AsyncClient sobre los mismos datos.
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self.update_time = update_time
+        self._data = data
+        self._fields = fields
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._fields is None:
+            return dict(self._data)
+        return {field: self._data[field] for field in self._fields if field in self._data}
+
+    def get(self, field):
+        return self._data.get(field) if self._data else None
+
+
+class FakeChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeChange:
+    def __init__(self, type_name, document):
+        self.type = FakeChangeType(type_name)
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self, store, callback, fields=None):
+        self.store = store
+        self.callback = callback
+        self.fields = fields
+
+    def unsubscribe(self):
+        with self.store.lock:
+            if self in self.store.watches:
+                self.store.watches.remove(self)
+
+
+class FakeCollectionStore:
+    # Documentos de una colección: ID -> (datos, update_time), y los IDs ordenados para paginar
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.sorted = None
+        self.watches = []
+
+    def sorted_ids(self):
+        with self.lock:
+            if self.sorted is None:
+                self.sorted = sorted(self.docs)
+            return self.sorted
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+# Firestore rechaza (INVALID_ARGUMENT) las consultas con más de 5 agregaciones
+MAX_AGGREGATIONS = 5
+
+
+class FakeAggregationQuery:
+    def __init__(self, query):
+        self.query = query
+        self.aggregations = []
+
+    def count(self, alias=None):
+        self.aggregations.append(("count", None, alias or "count"))
+        return self
+
+    def sum(self, field, alias=None):
+        self.aggregations.append(("sum", field, alias or "sum"))
+        return self
+
+    def avg(self, field, alias=None):
+        self.aggregations.append(("avg", field, alias or "avg"))
+        return self
+
+    def get(self):
+        self.query.db.wait()
+        return self.compute()
+
+    def compute(self):
+        if len(self.aggregations) > MAX_AGGREGATIONS:
+            raise ValueError(f"Demasiadas agregaciones en una consulta: {len(self.aggregations)} "
+                             f"(máximo {MAX_AGGREGATIONS})")
+        docs = [data for _, data, _ in self.query.matching()]
+        results = []
+        for kind, field, alias in self.aggregations:
+            if kind == "count":
+                value = len(docs)
+            else:
+                numbers = [data[field] for data in docs if isinstance(data.get(field), (int, float))
+                           and not isinstance(data.get(field), bool)]
+                if kind == "sum":
+                    value = sum(numbers)
+                else:
+                    value = sum(numbers) / len(numbers) if numbers else None
+            results.append(FakeAggregationResult(alias, value))
+        return [results]
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def snapshot(self, fields=None):
+        data, update_time = self.db.store(self.collection).docs.get(self.id, (None, None))
+        return FakeSnapshot(self, data, update_time, fields)
+
+    def get(self, field_paths=None):
+        self.db.wait()
+        return self.snapshot(field_paths)
+
+    def set(self, data, merge=False):
+        if merge:
+            existing, _ = self.db.store(self.collection).docs.get(self.id, (None, None))
+            data = dict(existing or {}, **data)
+        self.db.set_document(self.collection, self.id, data)
+
+    def delete(self):
+        self.db.delete_document(self.collection, self.id)
+
+
+def compare(value, op, target):
+    # Como en Firestore, los valores de otro tipo (o que faltan) no cumplen el filtro
+    try:
+        if op == "==":
+            return value == target
+        if op == "!=":
+            return value != target
+        if op == "<":
+            return value < target
+        if op == "<=":
+            return value <= target
+        if op == ">":
+            return value > target
+        if op == ">=":
+            return value >= target
+    except TypeError:
+        return False
+    raise ValueError(f"Operador no soportado: {op}")
+
+
+class FakeQuery:
+    # Consulta inmutable: cada método devuelve una copia con la nueva condición
+    def __init__(self, db, collection, filters=(), orders=(), fields=None, limit_count=None, cursor=None):
+        self.db = db
+        self.collection = collection
+        self.filters = filters
+        self.orders = orders
+        self.fields = fields
+        self.limit_count = limit_count
+        self.cursor = cursor
+
+    @property
+    def id(self):
+        return self.collection
+
+    def copy(self, **changes):
+        values = dict(filters=self.filters, orders=self.orders, fields=self.fields,
+                      limit_count=self.limit_count, cursor=self.cursor)
+        values.update(changes)
+        return FakeQuery(self.db, self.collection, **values)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = "".join(random.choices(string.ascii_letters + string.digits, k=20))
+        return FakeDocumentReference(self.db, self.collection, doc_id)
+
+    def select(self, field_paths):
+        return self.copy(fields=list(field_paths))
+
+    def where(self, field, op, value):
+        return self.copy(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self.copy(orders=self.orders + ((field, direction),))
+
+    def limit(self, count):
+        return self.copy(limit_count=count)
+
+    def start_after(self, snapshot):
+        return self.copy(cursor=snapshot)
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self).count(alias)
+
+    def sum(self, field, alias=None):
+        return FakeAggregationQuery(self).sum(field, alias)
+
+    def avg(self, field, alias=None):
+        return FakeAggregationQuery(self).avg(field, alias)
+
+    def matches(self, doc_id, data, condition):
+        field, op, value = condition
+        if field == "__name__":
+            # Los rangos de IDs se expresan con referencias a documentos
+            return compare(doc_id, op, getattr(value, "id", value))
+        return field in data and compare(data[field], op, value)
+
+    def matching(self):
+        # (ID, datos, update_time) de los documentos que cumplen los filtros, en orden
+        store = self.db.store(self.collection)
+        order_fields = [field for field, _ in self.orders if field != "__name__"]
+        if not order_fields and all(field == "__name__" for field, _, _ in self.filters):
+            # Rango de IDs (o colección completa): se recorre la lista ordenada desde el cursor
+            ids = store.sorted_ids()
+            start = bisect.bisect_right(ids, self.cursor.id) if self.cursor else 0
+            for field, op, value in self.filters:
+                if op in (">", ">="):
+                    bound = getattr(value, "id", value)
+                    start = max(start, (bisect.bisect_right if op == ">" else bisect.bisect_left)(ids, bound))
+            for doc_id in ids[start:]:
+                if not all(self.matches(doc_id, None, condition) for condition in self.filters):
+                    return
+                data, update_time = store.docs[doc_id]
+                yield doc_id, data, update_time
+            return
+        docs = [(doc_id, data, update_time) for doc_id, (data, update_time) in store.docs.items()
+                if all(self.matches(doc_id, data, condition) for condition in self.filters)
+                and all(field in data for field in order_fields)]
+
+        def key(item):
+            return tuple(item[1][field] for field in order_fields) + (item[0],)
+        docs.sort(key=key)
+        if self.cursor:
+            cursor_key = tuple(self.cursor.get(field) for field in order_fields) + (self.cursor.id,)
+            docs = [item for item in docs if key(item) > cursor_key]
+        yield from docs
+
+    def stream(self):
+        self.db.wait()
+        yield from self.results()
+
+    def results(self):
+        results = self.matching()
+        if self.limit_count is not None:
+            results = (item for _, item in zip(range(self.limit_count), results))
+        return [FakeSnapshot(self.document(doc_id), data, update_time, self.fields)
+                for doc_id, data, update_time in results]
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        # Como el listener real: primero todos los documentos como ADDED y después cada cambio
+        store = self.db.store(self.collection)
+        watch = FakeWatch(store, callback, self.fields)
+        with store.lock:
+            store.watches.append(watch)
+        changes = [FakeChange("ADDED", snapshot) for snapshot in self.stream()]
+        threading.Thread(target=callback, args=(None, changes, datetime.now(timezone.utc)), daemon=True).start()
+        return watch
+
+
+class FakeBulkWriter:
+    # Agrupa las escrituras en lotes de BATCH_SIZE con una espera por lote, como el BulkWriter real
+    BATCH_SIZE = 20
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+        self.result_callback = None
+        self.error_callback = None
+
+    def on_write_result(self, callback):
+        self.result_callback = callback
+
+    def on_write_error(self, callback):
+        self.error_callback = callback
+
+    def set(self, reference, data, merge=False):
+        self.pending.append((reference, data, merge))
+        if len(self.pending) >= self.BATCH_SIZE:
+            self.send()
+
+    def delete(self, reference):
+        # data None marca un borrado
+        self.set(reference, None)
+
+    def send(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.db.wait()
+        for reference, data, merge in batch:
+            if data is None:
+                reference.delete()
+            else:
+                reference.set(data, merge)
+            if self.result_callback:
+                self.result_callback(reference, None, self)
+
+    def flush(self):
+        self.send()
+
+    def close(self):
+        self.send()
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.collections = {}
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def wait_async(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def async_client(self):
+        return FakeAsyncFirestore(self)
+
+    def store(self, collection):
+        store = self.collections.get(collection)
+        if store is None:
+            store = self.collections.setdefault(collection, FakeCollectionStore())
+        return store
+
+    def collection(self, name):
+        return FakeQuery(self, name)
+
+    def bulk_writer(self, options=None):
+        return FakeBulkWriter(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self.wait()
+        return [reference.snapshot(field_paths) for reference in references]
+
+    def load(self, collection, documents):
+        # Carga masiva de pares (ID, datos) sin avisar a los listeners
+        store = self.store(collection)
+        update_time = datetime.now(timezone.utc)
+        with store.lock:
+            for doc_id, data in documents:
+                store.docs[doc_id] = (data, update_time)
+            store.sorted = None
+
+    def set_document(self, collection, doc_id, data):
+        store = self.store(collection)
+        with store.lock:
+            change_type = "MODIFIED" if doc_id in store.docs else "ADDED"
+            if change_type == "ADDED":
+                store.sorted = None
+            store.docs[doc_id] = (dict(data), datetime.now(timezone.utc))
+            watches = list(store.watches)
+        self.notify(collection, watches, change_type, doc_id)
+
+    def delete_document(self, collection, doc_id):
+        store = self.store(collection)
+        with store.lock:
+            if store.docs.pop(doc_id, None) is None:
+                return
+            store.sorted = None
+            watches = list(store.watches)
+        self.notify(collection, watches, "REMOVED", doc_id)
+
+    def notify(self, collection, watches, change_type, doc_id):
+        reference = FakeDocumentReference(self, collection, doc_id)
+        for watch in watches:
+            # Cada listener recibe el documento con la proyección de su consulta
+            snapshot = reference.snapshot(watch.fields)
+            if change_type == "REMOVED":
+                snapshot = FakeSnapshot(reference, {}, datetime.now(timezone.utc))
+            watch.callback(None, [FakeChange(change_type, snapshot)], datetime.now(timezone.utc))
+
+
+class FakeAsyncAggregationQuery:
+    def __init__(self, aggregation):
+        self.aggregation = aggregation
+
+    def count(self, alias=None):
+        self.aggregation.count(alias)
+        return self
+
+    def sum(self, field, alias=None):
+        self.aggregation.sum(field, alias)
+        return self
+
+    def avg(self, field, alias=None):
+        self.aggregation.avg(field, alias)
+        return self
+
+    async def get(self):
+        await self.aggregation.query.db.wait_async()
+        return self.aggregation.compute()
+
+
+class FakeAsyncDocumentReference:
+    def __init__(self, reference):
+        self.reference = reference
+        self.id = reference.id
+
+    async def get(self, field_paths=None):
+        await self.reference.db.wait_async()
+        return self.reference.snapshot(field_paths)
+
+
+class FakeAsyncQuery:
+    # Las esperas son asyncio.sleep, así que varias consultas avanzan a la vez en el mismo bucle
+    def __init__(self, query):
+        self.query = query
+
+    @property
+    def id(self):
+        return self.query.id
+
+    def document(self, doc_id):
+        return FakeAsyncDocumentReference(self.query.document(doc_id))
+
+    def select(self, field_paths):
+        return FakeAsyncQuery(self.query.select(field_paths))
+
+    def where(self, field, op, value):
+        return FakeAsyncQuery(self.query.where(field, op, value))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return FakeAsyncQuery(self.query.order_by(field, direction))
+
+    def limit(self, count):
+        return FakeAsyncQuery(self.query.limit(count))
+
+    def start_after(self, snapshot):
+        return FakeAsyncQuery(self.query.start_after(snapshot))
+
+    def count(self, alias=None):
+        return FakeAsyncAggregationQuery(self.query.count(alias))
+
+    def sum(self, field, alias=None):
+        return FakeAsyncAggregationQuery(self.query.sum(field, alias))
+
+    def avg(self, field, alias=None):
+        return FakeAsyncAggregationQuery(self.query.avg(field, alias))
+
+    async def get(self):
+        await self.query.db.wait_async()
+        return self.query.results()
+
+    async def stream(self):
+        for snapshot in await self.get():
+            yield snapshot
+
+
+class FakeAsyncFirestore:
+    def __init__(self, db):
+        self.db = db
+
+    def collection(self, name):
+        return FakeAsyncQuery(self.db.collection(name))
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        await self.db.wait_async()
+        for reference in references:
+            yield reference.reference.snapshot(field_paths)
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+# Generador de documentos sintéticos de usuarios, rutinas y dietas con la forma que usa la app
+SCALES = {"1k": 1000, "100k": 100000, "1M": 1000000}
+
+NOMBRES = ["Javier", "Lucía", "Carlos", "María", "Alejandro", "Sofía", "Daniel", "Paula", "Pablo", "Marta",
+           "Adrián", "Elena", "Sergio", "Laura", "Hugo", "Carmen", "Diego", "Irene", "Álvaro", "Noelia"]
+APELLIDOS = ["García", "Martínez", "López", "Sánchez", "Pérez", "Gómez", "Martín", "Jiménez", "Ruiz",
+             "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez", "Romero", "Navarro", "Torres", "Domínguez"]
+NIVELES = ["Principiante", "Intermedio", "Avanzado"]
+OBJETIVOS = ["Perder peso", "Ganar masa muscular", "Mantenerse en forma", "Mejorar resistencia"]
+DIFICULTADES = ["Fácil", "Media", "Difícil"]
+EJERCICIOS = ["Sentadilla", "Press banca", "Peso muerto", "Dominadas", "Remo con barra", "Zancadas",
+              "Press militar", "Curl de bíceps", "Fondos", "Plancha", "Burpees", "Hip thrust"]
+ALIMENTOS = ["Pollo", "Arroz", "Avena", "Huevos", "Salmón", "Brócoli", "Espinacas", "Plátano", "Yogur",
+             "Almendras", "Lentejas", "Pan integral", "Atún", "Patata", "Aguacate", "Queso fresco"]
+PROHIBIDOS = ["Bollería", "Refrescos", "Alcohol", "Fritos", "Embutidos", "Dulces", "Comida rápida"]
+# Como en la base real, las comidas y las calorías de las dietas son textos descriptivos
+COMIDAS = ["2-3 comidas pequeñas al día", "3 comidas principales y 2 snacks", "4-5 comidas a lo largo del día",
+           "5 comidas: desayuno, media mañana, almuerzo, merienda y cena", "6 comidas repartidas a lo largo del día",
+           "3-4 comidas: desayuno, almuerzo, cena y opcional merienda", "3 comidas principales y 1-2 tentempiés"]
+TIPOS_RUTINA = ["Fuerza", "Hipertrofia", "Cardio", "Full body", "Torso-pierna", "Funcional"]
+
+
+def document_id(rng):
+    # IDs de 20 caracteres como los que genera Firestore
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=20))
+
+
+def maybe(rng, data, field, value, missing=0.03):
+    # Una pequeña parte de los documentos no tiene todos los campos, como en la base real
+    if rng.random() >= missing:
+        data[field] = value
+
+
+def generate_usuarios(count, rng):
+    for _ in range(count):
+        data = {"nombre": f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}"}
+        maybe(rng, data, "edad", rng.randint(16, 70))
+        maybe(rng, data, "peso", round(rng.gauss(74, 12), 1))
+        maybe(rng, data, "altura", rng.randint(150, 200))
+        maybe(rng, data, "diasEntrenamientoPorSemana", rng.randint(1, 7))
+        maybe(rng, data, "nivelExperiencia", rng.choice(NIVELES))
+        maybe(rng, data, "objetivoFitness", rng.choice(OBJETIVOS))
+        yield document_id(rng), data
+
+
+def generate_rutinas(count, rng, user_ids):
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for _ in range(count):
+        ejercicios = [{"nombre": rng.choice(EJERCICIOS), "series": rng.randint(2, 5),
+                       "repeticiones": rng.randint(6, 15), "descansoSegundos": rng.choice([45, 60, 90, 120])}
+                      for _ in range(rng.randint(3, 10))]
+        tipo = rng.choice(TIPOS_RUTINA)
+        data = {"nombre": f"Rutina {tipo.lower()} {rng.randint(1, 999)}",
+                "usuarioId": rng.choice(user_ids) if user_ids else "",
+                "descripcion": f"Rutina de {tipo.lower()} de {len(ejercicios)} ejercicios",
+                "dificultad": rng.choice(DIFICULTADES),
+                "ejercicios": ejercicios}
+        # Firestore devuelve las fechas como Timestamp (datetime con zona horaria)
+        maybe(rng, data, "fechaCreacion", now - timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600)))
+        yield document_id(rng), data
+
+
+def generate_dietas(count, rng):
+    for _ in range(count):
+        minimo = rng.randrange(1200, 3200, 100)
+        calorias = f"{minimo}-{minimo + rng.choice([300, 400, 500, 600])} kcal"
+        objetivo = rng.choice(OBJETIVOS).lower()
+        data = {"nombre": f"Dieta {objetivo} {rng.randint(1, 999)}",
+                "descripcion": f"Plan de alimentación para {objetivo} de {calorias}",
+                "alimentosPermitidos": rng.sample(ALIMENTOS, rng.randint(4, 8)),
+                "alimentosProhibidos": rng.sample(PROHIBIDOS, rng.randint(1, 3)),
+                "comidas": rng.choice(COMIDAS)}
+        maybe(rng, data, "calorias", calorias)
+        yield document_id(rng), data
+
+
+def generate_dataset(count, seed=42, collections=("usuarios", "rutinas", "dietas")):
+    # Devuelve {colección: [(ID, datos), ...]}; las rutinas apuntan a usuarios existentes
+    rng = random.Random(seed)
+    dataset = {}
+    usuarios = list(generate_usuarios(count, rng))
+    if "usuarios" in collections:
+        dataset["usuarios"] = usuarios
+    if "rutinas" in collections:
+        dataset["rutinas"] = list(generate_rutinas(count, rng, [doc_id for doc_id, _ in usuarios]))
+    if "dietas" in collections:
+        dataset["dietas"] = list(generate_dietas(count, rng))
+    return dataset
+
+
+def populate(db, dataset):
+    for collection, documents in dataset.items():
+        db.load(collection, documents)
+    return db
+
+
+def save_dataset(dataset, output_dir):
+    # Un fichero JSON lines por colección: {"id": ..., "data": {...}}; las fechas van como texto ISO
+    os.makedirs(output_dir, exist_ok=True)
+    for collection, documents in dataset.items():
+        with open(os.path.join(output_dir, f"{collection}.jsonl"), "w", encoding="utf-8") as f:
+            for doc_id, data in documents:
+                f.write(json.dumps({"id": doc_id, "data": data}, ensure_ascii=False,
+                                   default=datetime.isoformat) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de GymRace")
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "data"))
+    args = parser.parse_args(argv)
+    dataset = generate_dataset(SCALES[args.scale], args.seed)
+    save_dataset(dataset, os.path.join(args.output, args.scale))
+    for collection, documents in dataset.items():
+        print(f"{collection}: {len(documents)} documentos")
+
+
+if __name__ == "__main__":
+    main()
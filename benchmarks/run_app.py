@@ -0,0 +1,27 @@
+import argparse
+import os
+import tempfile
+
+import gymRaceAdmin as app
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.generate_data import SCALES, generate_dataset, populate
+
+# Abre el panel contra el Firestore simulado para probar el rendimiento a mano con datos
+# grandes. El espejo local va a un directorio temporal para no mezclarse con el real
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Panel de GymRace sobre un Firestore simulado")
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    db = populate(FakeFirestore(latency=args.latency), generate_dataset(SCALES[args.scale], args.seed))
+    with tempfile.TemporaryDirectory() as mirror_dir:
+        window = app.FirestoreAdminApp(db=db, async_db=db.async_client(),
+                                       mirror_path=os.path.join(mirror_dir, "mirror.db"))
+        window.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+
+import gymRaceAdmin as app
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.generate_data import SCALES, generate_dataset, populate
+
+# Suite de rendimiento sin interfaz: carga, nombres de usuario, filtrado, ordenación, análisis
+# de calidad, volcado a la tabla (solo si hay pantalla, con la ventana oculta) y las exportaciones
+# sobre un Firestore simulado. Los resultados se guardan en JSON para compararlos entre ejecuciones
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SEARCH_QUERIES = ["juan", "garcía", "nivel de experiencia: avanzado", "zzz"]
+ADVANCED_FILTER = [("Edad", "entre", (20.0, 30.0)), ("Objetivo Fitness", "==", "Perder peso"),
+                   ("Nombre", "contiene", "mar")]
+SORT_SPECS = [[("Nombre", True)], [("Edad", False)], [("Nivel de Experiencia", True), ("Peso", False)]]
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"runs": times, "min": min(times), "median": statistics.median(times)}
+
+
+def headless_app(db, mirror):
+    # El panel sin ventana, con solo lo que usan sus lecturas asíncronas. Cada instancia empieza
+    # con la caché de nombres de usuario vacía
+    window = object.__new__(app.FirestoreAdminApp)
+    window.async_db = db.async_client()
+    window.user_names = app.UserNameResolver(db, window.async_db)
+    window.mirror = mirror
+    return window
+
+
+def load_collection(db, mirror, collection, parallel=False):
+    # Mismo camino que fetch_pages sin espejo previo: read_collection_pages del panel lee páginas
+    # con proyección (por rangos de IDs en paralelo si la colección es grande), pide los nombres
+    # de usuario con el AsyncClient y guarda las páginas en el espejo local
+    window = headless_app(db, mirror)
+    data = app.CollectionData(app.COLLECTIONS[collection])
+    expected = app.PARALLEL_LOAD_MIN_DOCS if parallel else None
+
+    async def read():
+        async for rows in window.read_collection_pages(collection, expected):
+            data.add_rows(rows)
+
+    asyncio.run(read())
+    return data
+
+
+def search_all(data):
+    for query in SEARCH_QUERIES:
+        data.search_index.last_query = None
+        data.search_index.search(query)
+
+
+def sort_all(data):
+    sort_keys = app.SortKeys(data.store)
+    for sort_spec in SORT_SPECS:
+        sort_keys.permutation(sort_spec)
+
+
+def make_table(data):
+    # El panel con su tabla real (Treeview y VirtualTreeview) sobre una raíz de Tk oculta, sin el
+    # resto de la ventana ni la conexión. Sin pantalla no se puede crear y no se mide
+    window = object.__new__(app.FirestoreAdminApp)
+    try:
+        app.tk.Tk.__init__(window)
+    except app.tk.TclError as e:
+        print(f"populate_tree omitido (sin pantalla): {e}")
+        return None
+    window.withdraw()
+    window.current_collection = "usuarios"
+    window.data = data
+    window.datasets = {}
+    window.insert_queue = deque()
+    window.insert_job = None
+    window.tree = app.ttk.Treeview(window, columns=app.COLLECTIONS["usuarios"], show="headings")
+    window.tree.pack(fill=app.tk.BOTH, expand=True)
+    scrollbar = app.ttk.Scrollbar(window, orient="vertical", command=window.tree.yview)
+    window.virtual_view = app.VirtualTreeview(window.tree, scrollbar)
+    window.virtual_mode = app.tk.BooleanVar(window, value=False)
+    window.set_view(data.store.live_positions())
+    return window
+
+
+def populate_tree(window, virtual):
+    # toggle_virtual_mode prepara la tabla para el modo y llama a populate_tree; en el modo
+    # clásico se procesan eventos hasta que se han insertado todos los lotes
+    window.virtual_mode.set(virtual)
+    window.toggle_virtual_mode()
+    while window.insert_queue or window.insert_job is not None:
+        window.update()
+
+
+def run(args):
+    app.PAGE_SIZE = args.page_size
+    count = SCALES[args.scale]
+    print(f"Generando {count} documentos por colección...")
+    dataset = generate_dataset(count, args.seed)
+    db = populate(FakeFirestore(latency=args.latency), dataset)
+    mirror_dir = tempfile.TemporaryDirectory()
+    mirror = app.LocalMirror(os.path.join(mirror_dir.name, "mirror.db"))
+    results = {}
+
+    def bench(name, func):
+        results[name] = measure(func, args.repeat)
+        print(f"{name:<32} mediana {results[name]['median'] * 1000:10.1f} ms   mín {results[name]['min'] * 1000:10.1f} ms")
+
+    for collection in app.COLLECTIONS:
+        bench(f"load_data[{collection}]",
+              lambda collection=collection: load_collection(db, mirror, collection))
+        bench(f"load_data[{collection}, paralelo]",
+              lambda collection=collection: load_collection(db, mirror, collection, parallel=True))
+    user_ids = [data.get("usuarioId", "") for _, data in dataset["rutinas"]]
+    bench("load_user_names", lambda: asyncio.run(headless_app(db, mirror).load_user_names(user_ids)))
+    usuarios = load_collection(db, mirror, "usuarios")
+    positions = usuarios.store.live_positions()
+    bench("filter_data[búsqueda]", lambda: search_all(usuarios))
+    bench("filter_data[avanzado]", lambda: app.filter_positions(usuarios.store, ADVANCED_FILTER, positions))
+    bench("sort_tree", lambda: sort_all(usuarios))
+    bench("quality_scan", lambda: app.scan_quality({"usuarios": app.QualitySnapshot("usuarios", usuarios.store)}))
+    window = make_table(usuarios)
+    if window is not None:
+        bench("populate_tree", lambda: populate_tree(window, False))
+        bench("populate_tree[virtual]", lambda: populate_tree(window, True))
+        window.destroy()
+    mirror.conn.close()
+    mirror_dir.cleanup()
+    headers = app.COLLECTIONS["usuarios"]
+    with tempfile.TemporaryDirectory() as output_dir:
+        for export_format, (ext, writer) in app.EXPORT_FORMATS.items():
+            # Parquet y Arrow se omiten si no está instalado pyarrow
+            if not app.format_available(export_format):
+                continue
+            filename = os.path.join(output_dir, f"usuarios{ext}")
+            bench(writer.__name__.replace("write_", "export_as_"),
+                  lambda writer=writer, filename=filename: writer(filename, headers, usuarios.store.view(positions),
+                                                                  table_name="usuarios"))
+        for compression in app.COMPRESSION_EXTS:
+            filename = app.export_filename(os.path.join(output_dir, "usuarios"), "csv", compression)
+            try:
+                bench(f"export_as_csv[{compression}]",
+                      lambda filename=filename: app.write_csv(filename, headers, usuarios.store.view(positions)))
+            except RuntimeError as e:
+                print(f"export_as_csv[{compression}] omitido: {e}")
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "scale": args.scale,
+            "latency": args.latency, "page_size": args.page_size, "repeat": args.repeat,
+            "python": sys.version.split()[0], "platform": platform.platform(), "results": results}
+
+
+def compare(report, baseline, threshold):
+    # Compara medianas con una ejecución anterior; devuelve las pruebas que han empeorado
+    regressions = []
+    print(f"\nComparación con {baseline['timestamp']} (escala {baseline['scale']}):")
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else float("inf")
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  <-- regresión"
+            regressions.append(name)
+        print(f"{name:<32} {previous['median'] * 1000:10.1f} ms -> {result['median'] * 1000:10.1f} ms "
+              f"({ratio:5.2f}x){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de GymRace Admin sobre un Firestore simulado")
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--page-size", type=int, default=app.PAGE_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichero de resultados (por defecto en benchmarks/results/)")
+    parser.add_argument("--compare", help="Resultados anteriores con los que comparar")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Empeoramiento relativo a partir del cual se marca una regresión")
+    args = parser.parse_args(argv)
+    report = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.scale}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
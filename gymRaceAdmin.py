@@ -1,14 +1,712 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from PIL import Image, ImageTk
-import firebase_admin
-from firebase_admin import credentials, firestore
+import numpy as np
 import threading
+import asyncio
 import time
 import csv
+import gzip
+import io
 import json
 import sqlite3
 import os
+import sys
+import math
+import operator
+import re
+import ast
+import hashlib
+import importlib.util
+import string
+import argparse
+import cProfile
+import pstats
+import textwrap
+import unicodedata
+from array import array
+from collections import deque, defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial, wraps
+from itertools import islice
+from datetime import datetime, timezone
+
+# Tamaño de página al leer de Firestore y nº de filas insertadas en la tabla por ciclo de la UI
+PAGE_SIZE = 500
+INSERT_BATCH_SIZE = 200
+# Altura de fila del Treeview y filas extra materializadas fuera de la vista en modo virtual
+ROW_HEIGHT = 25
+VIRTUAL_OVERSCAN = 5
+# Copia local de las colecciones, nº de documentos pedidos por cada llamada a get_all y campo con
+# la fecha de última modificación: si todos los documentos lo tienen, al sincronizar solo se leen
+# los modificados; si no, hay que recorrer los IDs de toda la colección. Aunque se usen las fechas,
+# cada SYNC_FULL_CHECK_INTERVAL segundos se recorren todos los IDs para encontrar las bajas que el
+# recuento no ve (una baja y un alta en la misma sincronización)
+MIRROR_PATH = os.path.join("cache", "gymrace_mirror.db")
+GET_ALL_BATCH_SIZE = 100
+UPDATED_FIELD = "updatedAt"
+SYNC_FULL_CHECK_INTERVAL = 24 * 3600
+CREDENTIALS_PATH = 'credencialesFireBase/firebase-credentials.json'
+# Filas escritas por bloque al exportar y filas por transacción en las exportaciones SQLite
+EXPORT_CHUNK_SIZE = 2000
+SQLITE_BATCH_SIZE = 20000
+# Filas por grupo (Parquet) o lote (Arrow), códec de las columnas, compresiones de los formatos
+# de texto con su extensión y nivel, y columnas indexadas en las exportaciones SQLite
+ARROW_BATCH_SIZE = 65536
+ARROW_COMPRESSION = "zstd"
+COMPRESSION_EXTS = {"gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESSIBLE_FORMATS = ["csv", "json", "ndjson", "txt"]
+SQLITE_INDEX_COLUMNS = ["ID", "Nombre", "Nivel de Experiencia", "Objetivo Fitness", "Dificultad", "Usuario",
+                        "Edad", "Calorias"]
+# Imágenes ya escaladas que se reutilizan entre arranques
+IMAGE_CACHE_DIR = os.path.join("cache", "img")
+# Intervalo (ms) en el que se agrupan los cambios recibidos en modo en vivo: un refresco por fotograma
+LIVE_FRAME_MS = 16
+# Espera (ms) tras la última tecla antes de filtrar y separador de celdas en el índice de búsqueda
+SEARCH_DEBOUNCE_MS = 200
+CELL_SEPARATOR = "\x1f"
+# Caché de nombres de usuario para las rutinas: tamaño máximo, caducidad (s) e hilos de consulta
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 600
+USER_FETCH_WORKERS = 4
+# Columnas que se ordenan como números o como fechas; el resto se ordena como texto
+NUMERIC_COLUMNS = ["Edad", "Peso", "Altura", "Días entrenamiento", "Calorias"]
+DATE_COLUMNS = ["Fecha de Creación"]
+# Columnas con pocos valores distintos, que se guardan codificadas con diccionario
+CATEGORICAL_COLUMNS = ["Nivel de Experiencia", "Objetivo Fitness", "Dificultad", "Usuario"]
+# Longitud máxima de los textos que se internan en el almacén por columnas
+INTERN_MAX_LENGTH = 64
+# Columnas con listas anidadas que no se descargan al listar: en la tabla se ve un resumen y
+# el documento completo se pide al abrir los detalles (se guardan los últimos DOCUMENT_CACHE_SIZE).
+# Las comidas de las dietas son un texto corto y se cargan como el resto de columnas
+HEAVY_COLUMNS = ["Ejercicios"]
+PREVIEW_LENGTH = 60
+HEAVY_PLACEHOLDER = "(ver detalles)"
+DOCUMENT_CACHE_SIZE = 50
+# Operadores del filtro avanzado; a Firestore solo se envían igualdades y rangos sobre una
+# única columna numérica, que no necesitan índices compuestos
+FILTER_OPERATORS = ["==", "!=", "<", "<=", ">", ">=", "entre", "contiene"]
+RANGE_OPERATORS = ["<", "<=", ">", ">=", "entre"]
+COMPARATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+               "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+# Columnas que Firestore guarda con un tipo conocido y que por eso se pueden filtrar allí: números
+# (rangos e igualdades) y textos simples (igualdades). Las fechas, las listas y las calorías de las
+# dietas (textos como "500-800 kcal") se filtran siempre en local, sobre el texto mostrado
+PUSHDOWN_NUMERIC = {"usuarios": ["Edad", "Peso", "Altura", "Días entrenamiento"]}
+PUSHDOWN_TEXT = {
+    "usuarios": ["Nombre", "Nivel de Experiencia", "Objetivo Fitness"],
+    "rutinas": ["Nombre", "Descripción", "Dificultad"],
+    "dietas": ["Nombre", "Descripción"],
+}
+# Nº de barras de los histogramas y espera (ms) antes de refrescar el panel de estadísticas
+HISTOGRAM_BINS = 10
+STATS_REFRESH_MS = 250
+# Máximo de agregaciones (count/sum/avg) que admite Firestore en una misma consulta
+MAX_AGGREGATIONS = 5
+# Registro JSON lines de tiempos y lecturas, perfiles de cProfile e intervalo (ms) de refresco
+# de las métricas en la barra de estado y el panel de diagnóstico
+METRICS_LOG_PATH = os.path.join("cache", "metrics.jsonl")
+PROFILE_DIR = os.path.join("cache", "profiles")
+METRICS_REFRESH_MS = 1000
+# Lectura en paralelo de las colecciones grandes: rangos de IDs leídos a la vez y tamaño
+# (estimado) a partir del cual se usa
+PARALLEL_READERS = min(8, 2 * (os.cpu_count() or 1))
+PARALLEL_LOAD_MIN_DOCS = 20000
+# Caracteres de los IDs automáticos de Firestore, en el orden en que Firestore los compara
+ID_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+# Importación: registros escritos entre dos puntos de control, escrituras por segundo con las que
+# empieza BulkWriter y máximo al que puede subir, intentos por documento y carpeta de los puntos
+# de control
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_INITIAL_OPS = 500
+IMPORT_MAX_OPS = 10000
+IMPORT_MAX_RETRIES = 5
+IMPORT_CHECKPOINT_DIR = os.path.join("cache", "imports")
+# Códigos gRPC de los errores transitorios que se reintentan al importar (DEADLINE_EXCEEDED,
+# RESOURCE_EXHAUSTED, ABORTED, INTERNAL y UNAVAILABLE)
+RETRYABLE_WRITE_CODES = {4, 8, 10, 13, 14}
+# Exportaciones incrementales: extensión del manifiesto (ID y huella de cada fila) que se guarda
+# junto a cada exportación, columna que indica el tipo de cambio en los archivos de cambios y
+# tamaño en bytes de las huellas
+MANIFEST_EXT = ".manifest"
+DELTA_COLUMN = "Cambio"
+HASH_DIGEST_SIZE = 16
+# Campos de Firestore que se guardan en el almacén sin mostrarse, para relacionar colecciones
+KEY_FIELDS = {"rutinas": ["usuarioId"]}
+# Relaciones entre colecciones: colección padre, columna calculada que se le añade en la tabla,
+# colección hija y campo de la hija con el ID del padre
+RELATIONS = [("usuarios", "Rutinas", "rutinas", "usuarioId")]
+# Análisis de calidad: columnas que agrupan los posibles duplicados (bloques) con la diferencia
+# admitida en cada columna numérica, filas vecinas que se comparan dentro de un bloque y nº de
+# columnas restantes que pueden ser distintas, valores posibles de cada columna numérica y z
+# robusto a partir del cual un valor es atípico. Los textos con unidad o en rango de las columnas
+# numéricas ("75 kg", "500-800 kcal") se analizan por su número o el punto medio del rango
+DUPLICATE_RULES = {
+    "usuarios": (["Nombre"], {"Edad": 1, "Altura": 2, "Peso": 2}),
+    "rutinas": (["Nombre", "usuarioId"], {}),
+    "dietas": (["Nombre"], {"Calorias": 50}),
+}
+DUPLICATE_WINDOW = 3
+DUPLICATE_MAX_DIFFERENT = 0
+PLAUSIBLE_RANGES = {"Edad": (10, 100), "Peso": (30, 250), "Altura": (120, 230), "Días entrenamiento": (0, 7),
+                    "Calorias": (500, 6000)}
+OUTLIER_Z = 3.5
+QUANTITY_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)(?:\s*[-–]\s*(\d+(?:[.,]\d+)?))?\s*([^\W\d]+)?")
+QUALITY_HEADERS = ["Colección", "ID", "Nombre", "Problema", "Columna", "Valor", "Detalle"]
+QUALITY_PROBLEMS = ["Duplicado exacto", "Posible duplicado", "Valor imposible", "Valor atípico",
+                    "Valor no numérico", "Sin referencia", "Referencia rota"]
+# Colecciones, columnas mostradas y campo de Firestore de cada columna
+COLLECTIONS = {
+    "usuarios": ["ID", "Nombre", "Edad", "Peso", "Altura", "Días entrenamiento", "Nivel de Experiencia", "Objetivo Fitness"],
+    "rutinas": ["ID", "Nombre", "Usuario", "Descripción", "Dificultad", "Ejercicios", "Fecha de Creación"],
+    "dietas": ["ID", "Nombre", "Descripción", "Alimentos Permitidos", "Alimentos Prohibidos", "Calorias", "Comidas"]
+}
+FIELD_MAPPINGS = {
+    "usuarios": {
+        "Nombre": "nombre",
+        "Edad": "edad",
+        "Peso": "peso",
+        "Altura": "altura",
+        "Días entrenamiento": "diasEntrenamientoPorSemana",
+        "Nivel de Experiencia": "nivelExperiencia",
+        "Objetivo Fitness": "objetivoFitness"
+    },
+    "rutinas": {
+        "Nombre": "nombre",
+        "Usuario": "usuarioId",
+        "Descripción": "descripcion",
+        "Dificultad": "dificultad",
+        "Ejercicios": "ejercicios",
+        "Fecha de Creación": "fechaCreacion"
+    },
+    "dietas": {
+        "Nombre": "nombre",
+        "Descripción": "descripcion",
+        "Alimentos Permitidos": "alimentosPermitidos",
+        "Alimentos Prohibidos": "alimentosProhibidos",
+        "Calorias": "calorias",
+        "Comidas": "comidas"
+    }
+}
+
+
+class Metrics:
+    # Tiempos de las operaciones principales y lecturas de documentos facturadas por colección;
+    # opcionalmente se escriben en un fichero JSON lines y se perfila una operación con cProfile
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.log_path = None
+        self.profile_next = False
+        self.profiling = False
+        self.last_profile = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # nombre -> [llamadas, total, máximo, última] en segundos
+            self.spans = {}
+            self.reads = defaultdict(int)
+            self.last_span = None
+
+    @contextmanager
+    def span(self, name):
+        profiler = self.start_profile()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.perf_counter() - start)
+            if profiler:
+                self.stop_profile(name, profiler)
+
+    def record_span(self, name, elapsed):
+        with self.lock:
+            stats = self.spans.setdefault(name, [0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3] = elapsed
+            self.last_span = (name, elapsed)
+        self.log({"type": "span", "name": name, "ms": round(elapsed * 1000, 3)})
+
+    def count_reads(self, collection, count, kind="documentos"):
+        if not count:
+            return
+        with self.lock:
+            self.reads[collection] += count
+        self.log({"type": "reads", "collection": collection, "count": count, "kind": kind})
+
+    def total_reads(self):
+        with self.lock:
+            return sum(self.reads.values())
+
+    def snapshot(self):
+        with self.lock:
+            return ({name: list(stats) for name, stats in self.spans.items()}, dict(self.reads), self.last_span)
+
+    def set_log_path(self, path):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.log_path = path
+
+    def log(self, event):
+        path = self.log_path
+        if not path:
+            return
+        event = dict(event, ts=datetime.now(timezone.utc).isoformat(), thread=threading.current_thread().name)
+        try:
+            with self.lock:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"No se pudo escribir el registro de métricas: {e}")
+
+    def start_profile(self):
+        # Solo se perfila una operación a la vez: la primera que empiece tras activarlo
+        with self.lock:
+            if not self.profile_next or self.profiling:
+                return None
+            self.profile_next = False
+            self.profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profile(self, name, profiler):
+        profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{name}_{datetime.now():%Y%m%d_%H%M%S}.prof")
+            profiler.dump_stats(path)
+            print(f"Perfil de {name} guardado en {path}")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        except OSError as e:
+            path = None
+            print(f"No se pudo guardar el perfil: {e}")
+        with self.lock:
+            self.profiling = False
+            self.last_profile = path
+
+
+metrics = Metrics()
+
+
+def timed(name):
+    # Decorador que mide cada llamada como una operación con ese nombre; en las corrutinas se
+    # mide hasta que terminan, no solo hasta que se crean
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with metrics.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_aggregation_reads(collection, index_entries, aggregations=1):
+    # Firestore factura una lectura por cada 1000 entradas de índice de cada agregación (mínimo
+    # una). Para sum y avg se usa el nº de documentos como cota de las entradas de su campo
+    reads = max(1, math.ceil((index_entries or 0) / 1000))
+    metrics.count_reads(collection, aggregations * reads, "agregación")
+
+
+def connect_firestore(credentials_path=CREDENTIALS_PATH, asynchronous=False):
+    # firebase_admin tarda en importarse, así que solo se importa cuando hace falta. Con
+    # asynchronous se devuelve el AsyncClient de la misma app (firebase-admin >= 6.2.0)
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(credentials_path)
+        firebase_admin.initialize_app(cred)
+    if asynchronous:
+        from firebase_admin import firestore_async
+        return firestore_async.client()
+    return firestore.client()
+
+
+_scaled_images = {}
+
+
+def load_scaled_image(path, size):
+    # Devuelve la imagen escalada a size; la versión escalada se guarda en disco y en memoria
+    key = (path, size)
+    if key in _scaled_images:
+        return _scaled_images[key]
+    name, _ = os.path.splitext(os.path.basename(path))
+    cached_path = os.path.join(IMAGE_CACHE_DIR, f"{name}_{size[0]}x{size[1]}.png")
+    if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(path):
+        image = Image.open(cached_path)
+        image.load()
+    else:
+        image = Image.open(path).resize(size, Image.Resampling.LANCZOS)
+        try:
+            os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+            image.save(cached_path)
+        except OSError as e:
+            print(f"No se pudo guardar la imagen escalada: {e}")
+    _scaled_images[key] = image
+    return image
+
+
+def iter_pages(query, cancel_event=None, order_field=None):
+    # Recorre una consulta por páginas ordenadas por ID usando start_after como cursor; si la
+    # consulta tiene un filtro de rango, Firestore exige ordenar primero por ese campo
+    if order_field:
+        query = query.order_by(order_field)
+    query = query.order_by("__name__").limit(PAGE_SIZE)
+    last_doc = None
+    while cancel_event is None or not cancel_event.is_set():
+        page_query = query.start_after(last_doc) if last_doc else query
+        docs = list(page_query.stream())
+        if docs:
+            yield docs
+        if len(docs) < PAGE_SIZE:
+            break
+        last_doc = docs[-1]
+
+
+async def aiter_pages(query, order_field=None):
+    # Como iter_pages, con una consulta del AsyncClient; para pararla basta con cancelar la tarea
+    if order_field:
+        query = query.order_by(order_field)
+    query = query.order_by("__name__").limit(PAGE_SIZE)
+    last_doc = None
+    while True:
+        page_query = query.start_after(last_doc) if last_doc else query
+        docs = list(await page_query.get())
+        if docs:
+            yield docs
+        if len(docs) < PAGE_SIZE:
+            break
+        last_doc = docs[-1]
+
+
+def list_fields(collection):
+    # Campos de Firestore que se piden al listar una colección (todos menos los pesados, más la
+    # fecha de modificación que usa la sincronización)
+    field_mapping = FIELD_MAPPINGS.get(collection, {})
+    return [field_mapping.get(header, header.lower()) for header in COLLECTIONS[collection][1:]
+            if header not in HEAVY_COLUMNS] + [UPDATED_FIELD]
+
+
+def project_document(collection, data):
+    # Los mismos campos que pide list_fields: el espejo local y las filas de la tabla tienen la
+    # misma forma venga el documento de donde venga (carga, sincronización o modo en vivo)
+    return {field: data[field] for field in list_fields(collection) if field in data}
+
+
+def preview_value(value):
+    # Resumen corto de un campo anidado: nº de elementos y el principio de su contenido
+    if isinstance(value, list):
+        names = [str(item.get("nombre", item)) if isinstance(item, dict) else str(item) for item in value]
+        text = f"{len(value)} elementos: {', '.join(names)}" if value else "0 elementos"
+    elif isinstance(value, dict):
+        text = f"{len(value)} campos: {', '.join(str(key) for key in value)}"
+    else:
+        text = str(value)
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1] + "…"
+
+
+def build_row(collection, doc_id, data, user_names, preview=True):
+    # Convierte un documento de Firestore en la fila que se muestra y se exporta; con preview
+    # los campos pesados se resumen (o se marcan para verlos en detalles si no se descargaron)
+    field_mapping = FIELD_MAPPINGS.get(collection, {})
+    row = [str(doc_id)]
+    for header in COLLECTIONS[collection][1:]:
+        firestore_field = field_mapping.get(header, header.lower())
+        if collection == "rutinas" and header == "Usuario":
+            user_id = data.get("usuarioId", "")
+            user_name = user_names.get(user_id)
+            row.append(user_name)
+        elif preview and header in HEAVY_COLUMNS:
+            # Solo se resume si es una lista o un mapa; un texto se muestra tal cual
+            if firestore_field not in data:
+                row.append(HEAVY_PLACEHOLDER)
+            elif isinstance(data[firestore_field], (list, dict)):
+                row.append(preview_value(data[firestore_field]))
+            else:
+                row.append(str(data[firestore_field]))
+        else:
+            val = data.get(firestore_field, 'N/A')
+            # Los números se conservan con su tipo; el ColumnStore los guarda en arrays tipados
+            if header in NUMERIC_COLUMNS and isinstance(val, (int, float)) and not isinstance(val, bool):
+                row.append(val)
+            else:
+                row.append(str(val))
+    # Las claves ocultas van al final de la fila: el ColumnStore las guarda aparte y no se muestran
+    for field in KEY_FIELDS.get(collection, ()):
+        row.append(str(data.get(field, "")))
+    return row
+
+
+def build_rows(collection, documents, user_names, preview=True):
+    # documents es una lista de pares (ID, datos) de una misma página
+    names = prepare_user_names(collection, documents, user_names)
+    return [build_row(collection, doc_id, data, names, preview) for doc_id, data in documents]
+
+
+def prepare_user_names(collection, documents, user_names):
+    # Devuelve los nombres que necesitan las filas de la página, tomados en ese momento de la caché
+    if collection == "rutinas":
+        return user_names.table([data.get("usuarioId", "") for _, data in documents])
+    if collection == "usuarios":
+        # Aprovechamos la lectura de usuarios para mantener al día la caché de nombres
+        for doc_id, data in documents:
+            user_names.put(doc_id, data.get("nombre", "Usuario sin nombre"))
+    return UserNameTable()
+
+
+async def prepare_user_names_async(collection, documents, user_names):
+    if collection == "rutinas":
+        return await user_names.table_async([data.get("usuarioId", "") for _, data in documents])
+    return prepare_user_names(collection, documents, user_names)
+
+
+class UserNameTable(dict):
+    # Nombres ya resueltos (ID -> nombre) con la misma interfaz de lectura que UserNameResolver
+    def get(self, user_id, default="N/A"):
+        return dict.get(self, user_id, default)
+
+
+def id_ranges(count):
+    # Divide el espacio de IDs en count rangos contiguos (inicio incluido, fin excluido); los IDs
+    # automáticos son aleatorios, así que los rangos quedan equilibrados
+    bounds = [ID_ALPHABET[len(ID_ALPHABET) * i // count] for i in range(1, count)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def range_query(collection_ref, fields, start, end):
+    query = collection_ref.select(fields)
+    if start:
+        query = query.where("__name__", ">=", collection_ref.document(start))
+    if end:
+        query = query.where("__name__", "<", collection_ref.document(end))
+    return query
+
+
+async def aiter_parallel_rows(collection_ref, fields, collection, user_names, readers=PARALLEL_READERS,
+                              on_docs=None):
+    # Lee la colección por rangos de IDs con el AsyncClient, una tarea por rango en el mismo bucle,
+    # y convierte cada página en filas según llegan, sin un orden concreto. Si se cancela quien
+    # lee, se cancelan también las lecturas de los rangos. La conversión se hace aquí y no en otros
+    # procesos: enviarles las páginas costaba más de lo que se ganaba (ver README)
+    results = asyncio.Queue()
+
+    async def read_range(start, end):
+        try:
+            async for docs in aiter_pages(range_query(collection_ref, fields, start, end)):
+                if on_docs:
+                    await asyncio.to_thread(on_docs, docs)
+                documents = [(doc.id, doc.to_dict()) for doc in docs]
+                names = await prepare_user_names_async(collection, documents, user_names)
+                results.put_nowait([build_row(collection, doc_id, data, names) for doc_id, data in documents])
+        finally:
+            results.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(read_range(start, end)) for start, end in id_ranges(readers)]
+    try:
+        finished = 0
+        while finished < len(tasks):
+            rows = await results.get()
+            if rows is None:
+                finished += 1
+            else:
+                yield rows
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def format_nested(value, indent=0):
+    # Texto con sangría para mostrar listas y mapas anidados en la ventana de detalles
+    pad = "  " * indent
+    lines = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{pad}{key}:")
+                lines.append(format_nested(item, indent + 1))
+            else:
+                lines.append(f"{pad}{key}: {item}")
+    elif isinstance(value, list):
+        for i, item in enumerate(value, 1):
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{pad}{i}.")
+                lines.append(format_nested(item, indent + 1))
+            else:
+                lines.append(f"{pad}{i}. {item}")
+    else:
+        lines.append(f"{pad}{value}")
+    return "\n".join(lines)
+
+
+def parse_condition(header, op, text):
+    # Devuelve la condición (columna, operador, valor) con el valor ya convertido; "entre"
+    # acepta los dos límites separados por "y", coma o punto y coma
+    text = text.strip()
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f"Operador no válido: {op}")
+    if op == "contiene":
+        if not text:
+            raise ValueError("Indica el texto a buscar")
+        return (header, op, text)
+    parts = re.split(r"\s*(?:\by\b|,|;)\s*", text) if op == "entre" else [text]
+    if op == "entre" and len(parts) != 2:
+        raise ValueError("Para 'entre' indica dos valores, por ejemplo: 20 y 30")
+    if header in NUMERIC_COLUMNS:
+        try:
+            parts = [float(part) for part in parts]
+        except ValueError:
+            raise ValueError(f"{header} solo admite valores numéricos")
+    return (header, op, tuple(parts) if op == "entre" else parts[0])
+
+
+def describe_condition(condition):
+    header, op, value = condition
+    if op == "entre":
+        return f"{header} entre {value[0]:g} y {value[1]:g}" if header in NUMERIC_COLUMNS \
+            else f"{header} entre '{value[0]}' y '{value[1]}'"
+    if isinstance(value, float):
+        return f"{header} {op} {value:g}"
+    return f"{header} {op} '{value}'"
+
+
+def pushable_condition(collection, condition):
+    # Solo se envían a Firestore las condiciones que dan el mismo resultado allí que en local:
+    # rangos e igualdades sobre columnas guardadas como número e igualdades sobre textos simples.
+    # "N/A" es como se muestra un campo que falta, y en Firestore no se puede buscar así
+    header, op, value = condition
+    if header in PUSHDOWN_NUMERIC.get(collection, []):
+        return op == "==" or op in RANGE_OPERATORS
+    return header in PUSHDOWN_TEXT.get(collection, []) and op == "==" and value != "N/A"
+
+
+def plan_filter(collection, conditions):
+    # Separa las condiciones que puede resolver Firestore (pushdown) de las que se evalúan en
+    # local. Sin índices compuestos Firestore admite varias igualdades o un rango sobre un único
+    # campo, así que si hay un rango numérico se envía ese y las igualdades quedan en local
+    pushable = [condition for condition in conditions if pushable_condition(collection, condition)]
+    ranges = [condition for condition in pushable if condition[1] in RANGE_OPERATORS]
+    if ranges:
+        pushed = [condition for condition in ranges if condition[0] == ranges[0][0]]
+    else:
+        pushed = [condition for condition in pushable if condition[1] == "=="]
+    local = [condition for condition in conditions if condition not in pushed]
+    return pushed, local
+
+
+def describe_plan(pushed, local, query_server=True, collection=None):
+    # Las condiciones que Firestore no puede resolver (fechas, listas, calorías en texto...) se marcan
+    if not query_server:
+        firestore_text = "no se consulta (se filtran los datos ya cargados)"
+    elif pushed:
+        firestore_text = ", ".join(describe_condition(condition) for condition in pushed)
+    else:
+        firestore_text = "colección completa (ninguna condición se puede enviar)"
+    local_text = ", ".join(describe_condition(condition) + (" (solo en local)" if query_server and collection
+                                                             and not pushable_condition(collection, condition)
+                                                             else "")
+                           for condition in local) or "ninguna condición"
+    return f"Firestore: {firestore_text}\nLocal: {local_text}"
+
+
+async def aggregate_collection(db, collection):
+    # Nº de documentos y suma y media de cada columna numérica calculados por Firestore,
+    # sin leer ningún documento (db es el AsyncClient). Firestore admite como mucho
+    # MAX_AGGREGATIONS agregaciones por consulta, así que se reparten en varias que se lanzan a la vez
+    field_mapping = FIELD_MAPPINGS.get(collection, {})
+    numeric = [header for header in COLLECTIONS[collection] if header in NUMERIC_COLUMNS]
+    aggregations = [("count", None, "total")]
+    for i, header in enumerate(numeric):
+        aggregations.append(("sum", field_mapping[header], f"sum_{i}"))
+        aggregations.append(("avg", field_mapping[header], f"avg_{i}"))
+    collection_ref = db.collection(collection)
+    queries = []
+    for start in range(0, len(aggregations), MAX_AGGREGATIONS):
+        query = None
+        for kind, field, alias in aggregations[start:start + MAX_AGGREGATIONS]:
+            target = collection_ref if query is None else query
+            query = target.count(alias=alias) if kind == "count" else getattr(target, kind)(field, alias=alias)
+        queries.append(query.get())
+    values = {aggregation.alias: aggregation.value
+              for results in await asyncio.gather(*queries) for result in results for aggregation in result}
+    # Se factura cada agregación de la consulta: el recuento y una suma y una media por columna
+    count_aggregation_reads(collection, values["total"], len(aggregations))
+    return values["total"], {header: (values[f"sum_{i}"], values[f"avg_{i}"]) for i, header in enumerate(numeric)}
+
+
+def apply_pushdown(query, collection, pushed):
+    # Añade a la consulta los where de las condiciones enviadas; devuelve también el campo
+    # del rango (si lo hay) para ordenar la paginación por él
+    field_mapping = FIELD_MAPPINGS.get(collection, {})
+    order_field = None
+    for header, op, value in pushed:
+        field = field_mapping[header]
+        if op == "entre":
+            query = query.where(field, ">=", value[0]).where(field, "<=", value[1])
+        else:
+            query = query.where(field, op, value)
+        if op in RANGE_OPERATORS:
+            order_field = field
+    return query, order_field
+
+
+def text_condition(header, text, op, value):
+    # Evalúa una condición sobre el texto que se muestra en la tabla
+    if op == "contiene":
+        return fold_text(value) in fold_text(text)
+    if op in ("==", "!="):
+        return COMPARATORS[op](text, value)
+    make_key = sort_key_function(header)
+    key = make_key(text)
+    if key[0] != 0:
+        # N/A y valores que no se pueden interpretar no cumplen ninguna comparación
+        return False
+    if op == "entre":
+        return make_key(value[0]) <= key <= make_key(value[1])
+    return COMPARATORS[op](key, make_key(value))
+
+
+def condition_mask(store, condition, positions):
+    # Máscara booleana (una entrada por posición) con las filas que cumplen la condición
+    header, op, value = condition
+    column = store.column(header)
+    if isinstance(column, NumericColumn) and op != "contiene":
+        values = np.frombuffer(column.values, dtype=np.float64)[positions]
+        if op == "entre":
+            return (values >= value[0]) & (values <= value[1])
+        return COMPARATORS[op](values, value)
+    if isinstance(column, CategoryColumn):
+        # La condición se evalúa una vez por categoría y se reparte con los códigos
+        lookup = np.array([text_condition(header, category, op, value) for category in column.categories],
+                          dtype=bool)
+        codes = np.frombuffer(column.codes, dtype=np.dtype(f"u{column.codes.itemsize}"))[positions]
+        return lookup[codes] if len(lookup) else np.zeros(len(positions), dtype=bool)
+    return np.fromiter((text_condition(header, column.display(position), op, value) for position in positions),
+                       dtype=bool, count=len(positions))
+
+
+def filter_positions(store, conditions, positions):
+    # Devuelve, en el mismo orden, las posiciones que cumplen todas las condiciones
+    positions = np.array(positions, dtype=np.intp)
+    mask = np.ones(len(positions), dtype=bool)
+    for condition in conditions:
+        if not mask.any():
+            break
+        mask &= condition_mask(store, condition, positions)
+    return array("l", positions[mask].tolist())
+
 
 class SplashScreen(tk.Toplevel):
     def __init__(self, parent):
@@ -24,60 +722,2444 @@ class SplashScreen(tk.Toplevel):
         self.geometry(f'+{x}+{y}')
         self.configure(bg='white')
         try:
-            logo_img = Image.open("img/gymrace.png")
-            logo_img = logo_img.resize((200, 200), Image.Resampling.LANCZOS)
-            self.logo_photo = ImageTk.PhotoImage(logo_img)
-            logo_label = tk.Label(self, image=self.logo_photo, bg='white')
-            logo_label.pack(expand=True)
-            self.loading_label = tk.Label(self, text="Cargando...", font=("Helvetica", 14), bg='white', fg='#2c3e50')
-            self.loading_label.pack(pady=10)
-            self.progress = ttk.Progressbar(self, orient="horizontal", length=300, mode='indeterminate')
-            self.progress.pack(pady=10)
-            self.progress.start()
+            logo_img = load_scaled_image("img/gymrace.png", (200, 200))
+            self.logo_photo = ImageTk.PhotoImage(logo_img)
+            logo_label = tk.Label(self, image=self.logo_photo, bg='white')
+            logo_label.pack(expand=True)
+            self.loading_label = tk.Label(self, text="Cargando...", font=("Helvetica", 14), bg='white', fg='#2c3e50')
+            self.loading_label.pack(pady=10)
+            self.progress = ttk.Progressbar(self, orient="horizontal", length=300, mode='indeterminate')
+            self.progress.pack(pady=10)
+            self.progress.start()
+        except Exception as e:
+            print(f"Error cargando logo de splash: {e}")
+
+
+def format_update_time(update_time):
+    # Formato fijo en UTC para que las marcas de tiempo se puedan comparar como texto
+    return update_time.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def build_fold_table():
+    # Tabla de traducción que quita tildes y diacríticos de los caracteres latinos (á -> a, ñ -> n...)
+    table = {}
+    for code in range(0xC0, 0x250):
+        base = unicodedata.normalize("NFKD", chr(code))[0]
+        if base != chr(code) and base.isascii():
+            table[code] = base.lower()
+    return table
+
+
+FOLD_TABLE = build_fold_table()
+
+
+def fold_text(text):
+    return str(text).lower().translate(FOLD_TABLE)
+
+
+def text_trigrams(text):
+    # Trigramas de un texto del índice, sin los que cruzan de una celda a otra
+    if text is None:
+        return set()
+    return {gram for gram in (text[i:i + 3] for i in range(len(text) - 2)) if CELL_SEPARATOR not in gram}
+
+
+class SearchIndex:
+    # Índice de búsqueda de una colección: texto de cada fila ya en minúsculas y sin tildes,
+    # más un índice invertido de trigramas; ambos usan la posición de la fila en el ColumnStore
+    def __init__(self, headers):
+        self.columns = {fold_text(header): i for i, header in enumerate(headers)}
+        self.texts = []
+        self.grams = defaultdict(lambda: array("I"))
+        # Trigrama -> nº de entradas de su lista que ya no corresponden a la fila (cambiada o borrada)
+        self.stale = {}
+        self.last_query = None
+        self.last_result = None
+
+    def add(self, position, row):
+        text = CELL_SEPARATOR.join(fold_text(cell) for cell in row)
+        while len(self.texts) <= position:
+            self.texts.append(None)
+        old_grams = text_trigrams(self.texts[position])
+        self.texts[position] = text
+        new_grams = text_trigrams(text)
+        for gram in new_grams - old_grams:
+            self.grams[gram].append(position)
+        self.drop_postings(old_grams - new_grams)
+        self.last_query = None
+
+    def remove(self, position):
+        if position < len(self.texts) and self.texts[position] is not None:
+            old_grams = text_trigrams(self.texts[position])
+            self.texts[position] = None
+            self.drop_postings(old_grams)
+            self.last_query = None
+
+    def drop_postings(self, grams):
+        # Quitar una posición de un array es lineal, así que las entradas que ya no valen se cuentan
+        # y cada lista se compacta de una vez cuando la mitad sobra: la memoria queda acotada y el
+        # coste repartido entre los cambios
+        for gram in grams:
+            postings = self.grams.get(gram)
+            if postings is None:
+                continue
+            stale = self.stale[gram] = self.stale.get(gram, 0) + 1
+            if 2 * stale >= len(postings):
+                texts = self.texts
+                kept = array("I", sorted({p for p in postings if texts[p] is not None and gram in texts[p]}))
+                del self.stale[gram]
+                if kept:
+                    self.grams[gram] = kept
+                else:
+                    del self.grams[gram]
+
+    def parse(self, query):
+        # "Nombre: juan" limita la búsqueda a la columna Nombre
+        term = fold_text(query.strip())
+        if ":" in term:
+            prefix, rest = term.split(":", 1)
+            if prefix.strip() in self.columns:
+                return self.columns[prefix.strip()], rest.strip()
+        return None, term
+
+    def text_matches(self, text, column, term):
+        if column is None:
+            return term in text
+        cells = text.split(CELL_SEPARATOR)
+        return column < len(cells) and term in cells[column]
+
+    def matches(self, position, query):
+        column, term = self.parse(query)
+        text = self.texts[position] if position < len(self.texts) else None
+        return text is not None and self.text_matches(text, column, term)
+
+    def search(self, query):
+        column, term = self.parse(query)
+        if not term:
+            return {position for position, text in enumerate(self.texts) if text is not None}
+        if self.last_query and self.last_query[0] == column and self.last_query[1] in term:
+            # El término amplía el anterior: basta con filtrar el resultado previo
+            candidates = self.last_result
+        elif len(term) >= 3:
+            # Partimos de la lista de filas del trigrama menos frecuente del término
+            grams = {term[i:i + 3] for i in range(len(term) - 2)}
+            rarest = min(grams, key=lambda gram: len(self.grams.get(gram, ())))
+            candidates = self.grams.get(rarest, ())
+        else:
+            candidates = range(len(self.texts))
+        result = {position for position in candidates
+                  if self.texts[position] is not None and self.text_matches(self.texts[position], column, term)}
+        self.last_query = (column, term)
+        self.last_result = result
+        return result
+
+
+def numeric_sort_key(value):
+    # Los valores no numéricos (N/A) quedan al final en orden ascendente
+    try:
+        return (0, float(value))
+    except ValueError:
+        return (1, 0.0)
+
+
+def date_sort_key(value):
+    try:
+        return (0, datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        pass
+    for date_format in ("%d/%m/%Y %H:%M", "%d/%m/%Y"):
+        try:
+            return (0, datetime.strptime(value, date_format).timestamp())
+        except ValueError:
+            pass
+    # Algunas fechas se guardan como milisegundos desde epoch
+    key = numeric_sort_key(value)
+    return (0, key[1] / 1000) if key[0] == 0 else key
+
+
+def text_sort_key(value):
+    # Sin distinguir mayúsculas ni tildes; el texto original desempata
+    if value == "N/A":
+        return (1, "", "")
+    return (0, fold_text(value), value)
+
+
+def sort_key_function(header):
+    if header in NUMERIC_COLUMNS:
+        return numeric_sort_key
+    if header in DATE_COLUMNS:
+        return date_sort_key
+    return text_sort_key
+
+
+def computed_sort_key(value_at, position):
+    value = value_at(position)
+    return (1, 0) if value is None else (0, value)
+
+
+class SortKeys:
+    # Claves de ordenación tipadas por columna (se calculan una vez por fila) y
+    # permutaciones ya ordenadas, guardadas por combinación de columnas y sentido
+    def __init__(self, store):
+        self.store = store
+        self.keys = {}
+        self.permutations = {}
+
+    def key_at(self, header, position):
+        column = self.store.column(header)
+        if isinstance(column, NumericColumn):
+            value = column.values[position]
+            return (1, 0.0) if value != value else (0, value)
+        return sort_key_function(header)(column.display(position))
+
+    def column_keys(self, header):
+        keys = self.keys.get(header)
+        if keys is None:
+            column = self.store.column(header)
+            if isinstance(column, NumericColumn):
+                # Los números ya están guardados como float: no hay nada que interpretar
+                keys = [(1, 0.0) if value != value else (0, value) for value in column.values]
+            elif isinstance(column, CategoryColumn):
+                # Una clave por categoría, no por fila
+                make_key = sort_key_function(header)
+                category_keys = [make_key(category) for category in column.categories]
+                keys = [category_keys[code] for code in column.codes]
+            else:
+                make_key = sort_key_function(header)
+                keys = [make_key(value) for value in column.values]
+            self.keys[header] = keys
+        return keys
+
+    def update(self, positions):
+        for header, keys in self.keys.items():
+            for position in positions:
+                key = self.key_at(header, position)
+                if position < len(keys):
+                    keys[position] = key
+                else:
+                    keys.extend([key] * (position - len(keys) + 1))
+        self.permutations.clear()
+
+    def invalidate(self):
+        self.permutations.clear()
+
+    def permutation(self, sort_spec, computed=None):
+        # computed: funciones posición -> valor de las columnas calculadas; esas ordenaciones no
+        # se guardan porque sus valores dependen de otras colecciones
+        sort_spec = tuple(sort_spec)
+        computed = computed or {}
+        cacheable = not any(header in computed for header, _ in sort_spec)
+        order = self.permutations.get(sort_spec) if cacheable else None
+        if order is None:
+            # Ordenaciones estables sucesivas, de la columna menos a la más prioritaria
+            positions = list(self.store.live_positions())
+            for header, ascending in reversed(sort_spec):
+                if header in computed:
+                    key = partial(computed_sort_key, computed[header])
+                else:
+                    key = self.column_keys(header).__getitem__
+                positions.sort(key=key, reverse=not ascending)
+            order = array("l", positions)
+            if cacheable:
+                self.permutations[sort_spec] = order
+        return order
+
+
+class AsyncDataLayer:
+    # Bucle de asyncio en un hilo propio donde se hacen las lecturas de Firestore de la interfaz.
+    # Cada vista tiene como mucho una tarea en curso: al enviar otra se cancela la anterior. Las
+    # peticiones idénticas en curso (misma clave) comparten una única tarea
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # Vista -> tarea actual y clave -> [tarea compartida, nº de tareas que la esperan]; solo
+        # se tocan desde el hilo del bucle
+        self.tasks = {}
+        self.inflight = {}
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def submit(self, view, coro_factory):
+        # Se llama desde cualquier hilo; los resultados los envía la propia corrutina con after()
+        return asyncio.run_coroutine_threadsafe(self.run(view, coro_factory), self.loop)
+
+    def call(self, coro):
+        # Ejecuta la corrutina en el bucle y espera su resultado (solo desde otros hilos)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def post(self, coro):
+        # Lanza la corrutina en el bucle sin esperarla; sus resultados los envía ella con after()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def cancel(self, view):
+        self.loop.call_soon_threadsafe(self.cancel_view, view)
+
+    def cancel_view(self, view):
+        task = self.tasks.pop(view, None)
+        if task:
+            task.cancel()
+
+    async def run(self, view, coro_factory):
+        task = asyncio.current_task()
+        self.cancel_view(view)
+        self.tasks[view] = task
+        try:
+            return await coro_factory()
+        finally:
+            if self.tasks.get(view) is task:
+                del self.tasks[view]
+
+    def in_flight(self, key):
+        return key in self.inflight
+
+    async def shared(self, key, coro_factory):
+        # Si ya hay una tarea con esa clave se espera a ella en lugar de repetir la petición. La
+        # tarea compartida solo se cancela cuando ya no la espera nadie
+        entry = self.inflight.get(key)
+        if entry is None:
+            task = self.loop.create_task(coro_factory())
+            entry = self.inflight[key] = [task, 0]
+            task.add_done_callback(lambda done, key=key: self.forget(key, done))
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+    def forget(self, key, task):
+        entry = self.inflight.get(key)
+        if entry and entry[0] is task:
+            del self.inflight[key]
+
+
+class UserNameResolver:
+    # Resuelve usuarioId -> nombre bajo demanda: solo se piden a Firestore los IDs que faltan,
+    # en lotes de get_all concurrentes, y se guardan en una caché LRU con caducidad. Con async_db
+    # también se pueden pedir desde el bucle de AsyncDataLayer
+    def __init__(self, db, async_db=None, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.db = db
+        self.async_db = async_db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        # Peticiones asíncronas en curso: usuarioId -> tarea que lo está pidiendo
+        self.pending = {}
+
+    def get(self, user_id, default="N/A"):
+        with self.lock:
+            entry = self.cache.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                return default
+            self.cache.move_to_end(user_id)
+            # None indica que el usuario no existe
+            return default if entry[0] is None else entry[0]
+
+    def put(self, user_id, name):
+        with self.lock:
+            self.cache[user_id] = (name, time.monotonic() + self.ttl)
+            self.cache.move_to_end(user_id)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.cache.pop(user_id, None)
+
+    def table(self, user_ids):
+        # Nombres conocidos de esos usuarios (sin los que no existen), pidiendo los que faltan.
+        # Se toman en el momento: con varios hilos, otros podrían expulsarlos de la caché después
+        names, missing = self.cached(user_ids)
+        names.update((user_id, name) for user_id, name in self.fetch(missing).items() if name is not None)
+        return names
+
+    async def table_async(self, user_ids):
+        # Igual que table con el AsyncClient; los usuarios que ya está pidiendo otra tarea no se
+        # vuelven a pedir, se espera a esa petición
+        names, missing = self.cached(user_ids)
+        waiting = {self.pending[user_id] for user_id in missing if user_id in self.pending}
+        new_ids = [user_id for user_id in missing if user_id not in self.pending]
+        if new_ids:
+            task = asyncio.ensure_future(self.fetch_async(new_ids))
+            for user_id in new_ids:
+                self.pending[user_id] = task
+            task.add_done_callback(lambda done, ids=new_ids: self.forget_pending(ids, done))
+            waiting.add(task)
+        # shield: si se cancela esta carga, la petición sigue para las demás que la esperan
+        for found in await asyncio.gather(*(asyncio.shield(task) for task in waiting)):
+            names.update((user_id, found[user_id]) for user_id in missing
+                         if found.get(user_id) is not None)
+        return names
+
+    def forget_pending(self, user_ids, task):
+        for user_id in user_ids:
+            if self.pending.get(user_id) is task:
+                del self.pending[user_id]
+
+    def cached(self, user_ids):
+        # Devuelve los nombres vigentes en la caché y los IDs válidos que hay que pedir
+        names = UserNameTable()
+        now = time.monotonic()
+        missing = []
+        with self.lock:
+            for user_id in set(user_ids):
+                entry = self.cache.get(user_id)
+                if entry is not None and entry[1] >= now:
+                    if entry[0] is not None:
+                        names[user_id] = entry[0]
+                elif self.valid_id(user_id):
+                    missing.append(user_id)
+        return names, missing
+
+    def valid_id(self, user_id):
+        return isinstance(user_id, str) and user_id and "/" not in user_id
+
+    def fetch(self, user_ids):
+        # Pide los usuarios en lotes de get_all concurrentes; devuelve ID -> nombre (None si no existe)
+        chunks = [user_ids[i:i + GET_ALL_BATCH_SIZE] for i in range(0, len(user_ids), GET_ALL_BATCH_SIZE)]
+        names = {}
+        if len(chunks) == 1:
+            names.update(self.fetch_chunk(chunks[0]))
+        elif chunks:
+            with ThreadPoolExecutor(max_workers=USER_FETCH_WORKERS) as executor:
+                for found in executor.map(self.fetch_chunk, chunks):
+                    names.update(found)
+        return names
+
+    def fetch_chunk(self, user_ids):
+        users_ref = self.db.collection("usuarios")
+        names = dict.fromkeys(user_ids)
+        metrics.count_reads("usuarios", len(user_ids), "nombres de usuario")
+        for user in self.db.get_all([users_ref.document(user_id) for user_id in user_ids]):
+            if user.exists:
+                names[user.id] = (user.to_dict() or {}).get("nombre", "Usuario sin nombre")
+        for user_id, name in names.items():
+            self.put(user_id, name)
+        return names
+
+    async def fetch_async(self, user_ids):
+        chunks = [user_ids[i:i + GET_ALL_BATCH_SIZE] for i in range(0, len(user_ids), GET_ALL_BATCH_SIZE)]
+        names = {}
+        for found in await asyncio.gather(*(self.fetch_chunk_async(chunk) for chunk in chunks)):
+            names.update(found)
+        return names
+
+    async def fetch_chunk_async(self, user_ids):
+        users_ref = self.async_db.collection("usuarios")
+        names = dict.fromkeys(user_ids)
+        metrics.count_reads("usuarios", len(user_ids), "nombres de usuario")
+        async for user in self.async_db.get_all([users_ref.document(user_id) for user_id in user_ids]):
+            if user.exists:
+                names[user.id] = (user.to_dict() or {}).get("nombre", "Usuario sin nombre")
+        for user_id, name in names.items():
+            self.put(user_id, name)
+        return names
+
+
+class LocalMirror:
+    # Espejo local en SQLite de los documentos de Firestore, indexado por colección e ID.
+    # Guarda el update_time de cada documento para poder sincronizar solo los cambios
+    def __init__(self, path=MIRROR_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+                                     collection TEXT NOT NULL,
+                                     doc_id TEXT NOT NULL,
+                                     update_time TEXT NOT NULL,
+                                     data TEXT NOT NULL,
+                                     PRIMARY KEY (collection, doc_id)
+                                 ) WITHOUT ROWID""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                                     collection TEXT PRIMARY KEY,
+                                     checked_at REAL NOT NULL
+                                 )""")
+            self.conn.commit()
+
+    def load(self, collection):
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT doc_id, data FROM documents WHERE collection = ? ORDER BY doc_id", (collection,))
+            return [(doc_id, json.loads(data)) for doc_id, data in cursor]
+
+    def update_times(self, collection):
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT doc_id, update_time FROM documents WHERE collection = ?", (collection,))
+            return dict(cursor.fetchall())
+
+    def upsert(self, collection, docs):
+        # Se guardan solo los campos de la proyección de listado, aunque el documento traiga más
+        records = [(collection, doc.id, format_update_time(doc.update_time),
+                    json.dumps(project_document(collection, doc.to_dict()), ensure_ascii=False, default=str))
+                   for doc in docs]
+        if not records:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)", records)
+            self.conn.commit()
+
+    def delete(self, collection, doc_ids):
+        if not doc_ids:
+            return
+        with self.lock:
+            self.conn.executemany("DELETE FROM documents WHERE collection = ? AND doc_id = ?",
+                                  [(collection, doc_id) for doc_id in doc_ids])
+            self.conn.commit()
+
+    def get_checked_at(self, collection):
+        # Momento (time.time()) en que se comprobaron por última vez todos los IDs de la colección
+        with self.lock:
+            row = self.conn.execute("SELECT checked_at FROM sync_state WHERE collection = ?",
+                                    (collection,)).fetchone()
+        return row[0] if row else None
+
+    def set_checked_at(self, collection, checked_at):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (collection, checked_at))
+            self.conn.commit()
+
+    def get_watermark(self, collection):
+        # Fecha de modificación (UPDATED_FIELD) más reciente de la colección. None si falta en algún
+        # documento, porque la consulta por fecha no vería sus cambios
+        path = f"$.{UPDATED_FIELD}"
+        with self.lock:
+            total, dated, latest = self.conn.execute(
+                "SELECT COUNT(*), COUNT(json_extract(data, ?)), MAX(json_extract(data, ?)) "
+                "FROM documents WHERE collection = ?", (path, path, collection)).fetchone()
+        if not total or dated != total:
+            return None
+        try:
+            return datetime.fromisoformat(latest)
+        except (TypeError, ValueError):
+            return None
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def iter_chunks(rows, progress=None, cancel_event=None, chunk_size=EXPORT_CHUNK_SIZE):
+    # Recorre las filas por bloques; entre bloque y bloque informa del progreso y comprueba la cancelación
+    iterator = iter(rows)
+    written = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExportCancelled()
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+        written += len(chunk)
+        if progress:
+            progress(written)
+
+
+def split_compression(filename):
+    # ("datos.csv", ".gz") para "datos.csv.gz"; la compresión va siempre en la última extensión
+    base, ext = os.path.splitext(filename)
+    if ext.lower() in COMPRESSION_EXTS.values():
+        return base, ext.lower()
+    return filename, ""
+
+
+def open_text(filename, mode="r", encoding="utf-8", newline=None):
+    # Abre un archivo de texto comprimiendo o descomprimiendo según la extensión (.gz o .zst),
+    # por bloques y sin pasar nunca el archivo entero por memoria
+    compression = split_compression(filename)[1]
+    if compression == ".gz":
+        return gzip.open(filename, mode + "t", compresslevel=GZIP_LEVEL, encoding=encoding, newline=newline)
+    if compression == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Los archivos .zst necesitan zstandard (pip install zstandard)")
+        raw = open(filename, mode + "b")
+        if "w" in mode:
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+    return open(filename, mode, encoding=encoding, newline=newline)
+
+
+def import_pyarrow():
+    # pyarrow es opcional: solo hace falta para Parquet y Arrow
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Los formatos Parquet y Arrow necesitan pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def format_available(export_format):
+    if export_format in ("parquet", "arrow"):
+        return importlib.util.find_spec("pyarrow") is not None
+    return True
+
+
+def typed_number(cell):
+    # Los textos que no son números (p. ej. "500-800 kcal") se conservan como texto
+    if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+        return cell
+    if cell in ("", "N/A"):
+        return None
+    number = parse_number(str(cell))
+    return str(cell) if number is None else number
+
+
+def typed_text(cell):
+    return None if cell in ("", "N/A") else str(cell)
+
+
+def typed_converters(headers, numeric_headers=None):
+    # Conversión de las celdas exportadas a tipos nativos: números en las columnas numéricas y
+    # nulos en lugar de "N/A"
+    numeric = NUMERIC_COLUMNS if numeric_headers is None else numeric_headers
+    return [typed_number if header in numeric else typed_text for header in headers]
+
+
+def numeric_headers(store):
+    # Columnas que se exportan con tipo número: las numéricas en las que todos los valores no
+    # vacíos lo son. Si alguna fila guarda un texto (las calorías "500-800 kcal") la columna
+    # entera se exporta como texto para no perderlo
+    return [header for header, column in zip(store.headers, store.columns)
+            if isinstance(column, NumericColumn) and not any(store.alive[position] for position in column.invalid)]
+
+
+def typed_row(converters, row):
+    return [convert(cell) for convert, cell in zip(converters, row)]
+
+
+def write_csv(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+              numeric_headers=None):
+    with open_text(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for chunk in iter_chunks(rows, progress, cancel_event):
+            writer.writerows(chunk)
+
+
+def write_json(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+               numeric_headers=None):
+    # Mismo formato que json.dump(..., indent=2) pero escribiendo cada bloque según se genera
+    with open_text(filename, 'w') as jsonfile:
+        jsonfile.write("[")
+        first = True
+        for chunk in iter_chunks(rows, progress, cancel_event):
+            parts = []
+            for row in chunk:
+                item = json.dumps(dict(zip(headers, row)), ensure_ascii=False, indent=2)
+                parts.append(("\n" if first else ",\n") + textwrap.indent(item, "  "))
+                first = False
+            jsonfile.write("".join(parts))
+        jsonfile.write("]" if first else "\n]")
+
+
+def write_ndjson(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+                 numeric_headers=None):
+    # Un objeto por línea con los números como números, para cargarlo directamente en pandas,
+    # DuckDB o BigQuery. numeric_headers son las columnas con tipo número (por defecto, las numéricas)
+    converters = typed_converters(headers, numeric_headers)
+    with open_text(filename, 'w') as ndjsonfile:
+        for chunk in iter_chunks(rows, progress, cancel_event):
+            ndjsonfile.write("".join(json.dumps(dict(zip(headers, typed_row(converters, row))), ensure_ascii=False)
+                                     + "\n" for row in chunk))
+
+
+def write_txt(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+              numeric_headers=None):
+    with open_text(filename, 'w') as txtfile:
+        # Encabezado
+        header_line = "\t".join(headers)
+        txtfile.write(f"{header_line}\n")
+        txtfile.write("-" * len(header_line) + "\n")
+        # Datos
+        for chunk in iter_chunks(rows, progress, cancel_event):
+            txtfile.write("".join("\t".join(str(cell) for cell in row) + "\n" for row in chunk))
+
+
+def write_sqlite(filename, headers, rows, table_name="datos", progress=None, cancel_event=None,
+                 numeric_headers=None):
+    # Eliminar el archivo si ya existe
+    if os.path.exists(filename):
+        os.remove(filename)
+    conn = sqlite3.connect(filename)
+    try:
+        # El archivo se genera de cero: no necesitamos diario ni sincronizar en cada escritura
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        # Columnas numéricas con afinidad NUMERIC (enteros y reales nativos) y nulos en vez de "N/A"
+        numeric = NUMERIC_COLUMNS if numeric_headers is None else numeric_headers
+        fields = ", ".join([f'"{header}" {"NUMERIC" if header in numeric else "TEXT"}' for header in headers])
+        conn.execute(f'CREATE TABLE "{table_name}" ({fields})')
+        placeholders = ", ".join(["?" for _ in headers])
+        insert = f'INSERT INTO "{table_name}" VALUES ({placeholders})'
+        converters = typed_converters(headers, numeric_headers)
+        for chunk in iter_chunks(rows, progress, cancel_event, chunk_size=SQLITE_BATCH_SIZE):
+            conn.executemany(insert, [typed_row(converters, row) for row in chunk])
+            conn.commit()
+        # Los índices se crean al final: construirlos de una vez es más rápido que mantenerlos
+        # fila a fila durante la carga
+        for header in SQLITE_INDEX_COLUMNS:
+            if header in headers:
+                conn.execute(f'CREATE INDEX "idx_{table_name}_{header}" ON "{table_name}" ("{header}")')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def arrow_schema(pa, headers, numeric_headers=None):
+    # Un texto en una columna float64 hace fallar la escritura: numeric_headers debe dejar fuera
+    # las columnas con textos (numeric_headers(store))
+    numeric = NUMERIC_COLUMNS if numeric_headers is None else numeric_headers
+    return pa.schema([(header, pa.float64() if header in numeric else pa.string()) for header in headers])
+
+
+def iter_record_batches(pa, schema, headers, rows, progress=None, cancel_event=None, numeric_headers=None):
+    # Lotes tipados de ARROW_BATCH_SIZE filas; en memoria solo está el lote en curso
+    converters = typed_converters(headers, numeric_headers)
+    for chunk in iter_chunks(rows, progress, cancel_event, chunk_size=ARROW_BATCH_SIZE):
+        columns = zip(*(typed_row(converters, row) for row in chunk))
+        yield pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                              schema=schema)
+
+
+def write_parquet(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+                  numeric_headers=None):
+    # Cada lote se escribe como un grupo de filas
+    pa, pq = import_pyarrow()
+    schema = arrow_schema(pa, headers, numeric_headers)
+    with pq.ParquetWriter(filename, schema, compression=ARROW_COMPRESSION) as writer:
+        for batch in iter_record_batches(pa, schema, headers, rows, progress, cancel_event, numeric_headers):
+            writer.write_batch(batch)
+
+
+def write_arrow(filename, headers, rows, table_name=None, progress=None, cancel_event=None,
+                numeric_headers=None):
+    # Formato de archivo IPC de Arrow (Feather v2), que se puede abrir sin copiar con memory_map
+    pa, _ = import_pyarrow()
+    schema = arrow_schema(pa, headers, numeric_headers)
+    options = pa.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION)
+    with pa.ipc.new_file(filename, schema, options=options) as writer:
+        for batch in iter_record_batches(pa, schema, headers, rows, progress, cancel_event, numeric_headers):
+            writer.write_batch(batch)
+
+
+# Formatos de exportación: extensión y función que escribe el archivo
+EXPORT_FORMATS = {
+    "csv": (".csv", write_csv),
+    "json": (".json", write_json),
+    "ndjson": (".ndjson", write_ndjson),
+    "txt": (".txt", write_txt),
+    "db": (".db", write_sqlite),
+    "parquet": (".parquet", write_parquet),
+    "arrow": (".arrow", write_arrow)
+}
+
+
+def export_filename(base, export_format, compression=None):
+    # Nombre del archivo con la extensión del formato y, en los de texto, la de la compresión
+    filename = base + EXPORT_FORMATS[export_format][0]
+    if compression and export_format in COMPRESSIBLE_FORMATS:
+        filename += COMPRESSION_EXTS[compression]
+    return filename
+
+
+def cell_text(value):
+    # Texto con el que se exporta una celda: las filas recién leídas (con números), las del
+    # ColumnStore (ya en texto) y las de los formatos tipados (con nulos) dan la misma huella
+    if value is None:
+        return "N/A"
+    if isinstance(value, float):
+        return format_number(value)
+    return str(value)
+
+
+def row_hash(row, version=""):
+    # Huella del contenido de una fila (sin el ID): cambia si cambia cualquier celda exportada.
+    # version es el update_time del documento cuando sus campos pesados solo se ven resumidos
+    content = CELL_SEPARATOR.join(cell_text(cell) for cell in row[1:])
+    if version:
+        content += CELL_SEPARATOR + version
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+def versioned_hashes(collection):
+    # Con los campos pesados resumidos (interfaz) la tabla no ve sus cambios: en esas colecciones
+    # la huella incluye la versión del documento para que un cambio en los ejercicios cuente
+    return any(header in HEAVY_COLUMNS for header in COLLECTIONS[collection])
+
+
+def hashed_rows(rows, entries, versions=None):
+    # Deja pasar las filas hacia el escritor anotando (ID, huella) de cada una
+    for row in rows:
+        entries.append((row[0], row_hash(row, versions.get(row[0], "") if versions else "")))
+        yield row
+
+
+def manifest_path(filename):
+    return os.path.splitext(split_compression(filename)[0])[0] + MANIFEST_EXT
+
+
+def write_manifest(filename, collection, entries, full, scope=None):
+    # Una línea de metadatos y después "ID<TAB>huella" ordenado por ID, para poder comparar dos
+    # exportaciones recorriéndolas a la vez. full indica si los campos pesados van completos
+    # (línea de comandos) o resumidos (interfaz), porque sus huellas no son comparables; scope,
+    # la búsqueda o los filtros si no se exportó la colección completa
+    entries.sort()
+    meta = {"collection": collection, "rows": len(entries), "full": full, "filter": scope,
+            "created": datetime.now().isoformat(timespec="seconds")}
+    temp_path = filename + ".tmp"
+    with open(temp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("# " + json.dumps(meta, ensure_ascii=False) + "\n")
+        for chunk in iter_chunks(entries):
+            f.write("".join(f"{doc_id}\t{digest}\n" for doc_id, digest in chunk))
+    os.replace(temp_path, filename)
+
+
+def read_manifest(filename):
+    # (metadatos, iterador de (ID, huella)); las entradas se leen del disco según se recorren
+    f = open(filename, encoding="utf-8")
+    first_line = f.readline()
+    if not first_line.startswith("# "):
+        f.close()
+        raise ValueError(f"{filename} no es un manifiesto de exportación")
+
+    def entries():
+        with f:
+            for line in f:
+                doc_id, _, digest = line.rstrip("\n").partition("\t")
+                yield doc_id, digest
+
+    return json.loads(first_line[2:]), entries()
+
+
+def export_entries(filename, table_name=None):
+    # Huellas de un archivo exportado sin manifiesto (p. ej. anterior a los manifiestos). Aquí
+    # sí hay que ordenarlas en memoria
+    entries = []
+    for record in iter_import_records(filename, table_name):
+        if DELTA_COLUMN in record:
+            raise ValueError(f"{filename} es un archivo de cambios: compare su manifiesto")
+        row = list(record.values())
+        entries.append((row[0], row_hash(row)))
+    entries.sort()
+    return {"collection": None, "rows": len(entries), "full": None}, iter(entries)
+
+
+def snapshot_entries(path, table_name=None):
+    # Acepta un manifiesto o un archivo exportado (se usa su manifiesto si lo tiene)
+    if path.endswith(MANIFEST_EXT):
+        return read_manifest(path)
+    if os.path.exists(manifest_path(path)):
+        return read_manifest(manifest_path(path))
+    return export_entries(path, table_name)
+
+
+def check_order(entries, name):
+    previous = None
+    for doc_id, digest in entries:
+        if previous is not None and doc_id <= previous:
+            raise ValueError(f"{name} no está ordenado por ID ({previous} antes de {doc_id})")
+        previous = doc_id
+        yield doc_id, digest
+
+
+def diff_entries(old, new, old_name="anterior", new_name="actual"):
+    # Recorre a la vez dos secuencias (ID, huella) ordenadas por ID y devuelve (cambio, ID) de los
+    # documentos dados de alta, modificados o dados de baja. No guarda nada en memoria
+    old = check_order(old, old_name)
+    new = check_order(new, new_name)
+    a = next(old, None)
+    b = next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield "baja", a[0]
+            a = next(old, None)
+        elif a is None or b[0] < a[0]:
+            yield "alta", b[0]
+            b = next(new, None)
+        else:
+            if a[1] != b[1]:
+                yield "modificado", a[0]
+            a = next(old, None)
+            b = next(new, None)
+
+
+def previous_entries(filename, collection, full):
+    # Entradas de un manifiesto anterior con el que se puede comparar la exportación actual
+    meta, entries = read_manifest(filename)
+    if meta.get("collection") != collection:
+        entries.close()
+        raise ValueError(f"{os.path.basename(filename)} es un manifiesto de {meta.get('collection')}, "
+                         f"no de {collection}")
+    if meta.get("full") != full:
+        entries.close()
+        raise ValueError(f"{os.path.basename(filename)} no es comparable: sus campos pesados se exportaron "
+                         f"{'completos' if meta.get('full') else 'resumidos'}")
+    if meta.get("filter"):
+        # Todo lo que el filtro dejó fuera saldría como dado de baja
+        entries.close()
+        raise ValueError(f"{os.path.basename(filename)} es de una exportación filtrada ({meta['filter']}) "
+                         f"y no sirve para calcular cambios")
+    return entries
+
+
+def delta_rows(store, changes):
+    # Filas del archivo de cambios: el tipo de cambio delante y, en las bajas, solo el ID
+    blank = [""] * (len(store.headers) - 1)
+    for change, doc_id in changes:
+        if change == "baja":
+            yield [change, doc_id] + blank
+        else:
+            yield [change] + store.row(store.positions[doc_id])
+
+
+def iter_json_records(f, chunk_size=1 << 16):
+    # Recorre un array JSON objeto a objeto, leyendo el archivo por bloques
+    decoder = json.JSONDecoder()
+    separators = re.compile(r"[\s,]*")
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("El archivo JSON debe contener una lista de registros")
+    pos = 1
+    while True:
+        pos = separators.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # El registro está partido entre dos bloques (o el archivo está truncado)
+            more = f.read(chunk_size)
+            if not more:
+                raise
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield record
+        pos = end
+
+
+def iter_sqlite_records(filename, table_name=None):
+    # Sin table_name (o si no existe) se usa la única tabla del archivo
+    if not os.path.exists(filename):
+        raise FileNotFoundError(filename)
+    conn = sqlite3.connect(filename)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        if table_name not in tables:
+            if len(tables) != 1:
+                raise ValueError(f"Indica la tabla a importar: {', '.join(tables) or 'el archivo no tiene tablas'}")
+            table_name = tables[0]
+        cursor = conn.execute(f'SELECT * FROM "{table_name}"')
+        headers = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(SQLITE_BATCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(headers, row))
+    finally:
+        conn.close()
+
+
+def iter_arrow_records(filename):
+    # Parquet por grupos de filas o Arrow por lotes, sin cargar el archivo entero
+    pa, pq = import_pyarrow()
+    if filename.lower().endswith(".parquet"):
+        batches = pq.ParquetFile(filename).iter_batches(batch_size=ARROW_BATCH_SIZE)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(filename, "r"))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def iter_import_records(filename, table_name=None):
+    # Registros (encabezado -> valor) de un archivo exportado por el panel, sin cargarlo entero.
+    # Los formatos de texto pueden venir comprimidos con gzip o zstd
+    ext = os.path.splitext(split_compression(filename)[0])[1].lower()
+    if ext == ".csv":
+        with open_text(filename, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+    elif ext == ".json":
+        with open_text(filename) as f:
+            yield from iter_json_records(f)
+    elif ext == ".ndjson":
+        with open_text(filename) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ext == ".txt":
+        with open_text(filename) as f:
+            headers = f.readline().rstrip("\n").split("\t")
+            for line in f:
+                line = line.rstrip("\n")
+                # La segunda línea es la raya bajo el encabezado
+                if line and line.strip("-"):
+                    yield dict(zip(headers, line.split("\t")))
+    elif ext == ".db":
+        yield from iter_sqlite_records(filename, table_name)
+    elif ext in (".parquet", ".arrow"):
+        yield from iter_arrow_records(filename)
+    else:
+        raise ValueError(f"Formato no soportado: {ext or filename}")
+
+
+def parse_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_import_value(header, value):
+    # Deshace la conversión a texto de la exportación. Devuelve None si la celda no trae un valor
+    # que se pueda escribir (vacía, "N/A" o el resumen de un campo pesado)
+    if value is None or not isinstance(value, str):
+        # Los formatos tipados guardan todos los números como reales; los enteros vuelven a
+        # serlo igual que al leer "25" de un CSV
+        if isinstance(value, float) and value.is_integer() and header in NUMERIC_COLUMNS:
+            return int(value)
+        return value
+    text = value.strip()
+    if text in ("", "N/A"):
+        return None
+    if header in NUMERIC_COLUMNS or header in DATE_COLUMNS:
+        number = parse_number(text)
+        if number is not None:
+            return number
+    if header in DATE_COLUMNS:
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    if header in HEAVY_COLUMNS and (text == HEAVY_PLACEHOLDER or text.endswith("…")
+                                    or re.match(r"\d+ (elementos|campos)\b", text)):
+        return None
+    # Las listas y mapas se exportan con su repr de Python
+    if text[0] in "[{":
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            pass
+    return value
+
+
+def record_to_document(collection, record, user_ids=None):
+    # (ID, datos de Firestore) de un registro importado. Las columnas se traducen con
+    # FIELD_MAPPINGS y también se aceptan directamente los nombres de campo de Firestore
+    field_mapping = FIELD_MAPPINGS.get(collection, {})
+    headers_by_field = {field: header for header, field in field_mapping.items()}
+    doc_id = None
+    data = {}
+    for header, value in record.items():
+        if header is None:
+            continue
+        header = header.strip()
+        if header == DELTA_COLUMN:
+            continue
+        if header == "ID":
+            doc_id = str(value).strip() if value not in (None, "") else None
+            continue
+        if collection == "rutinas" and header == "Usuario":
+            # La exportación guarda el nombre del usuario, que solo se puede deshacer si es único
+            user_id = (user_ids or {}).get(str(value).strip())
+            if user_id:
+                data["usuarioId"] = user_id
+            continue
+        field = header if header in headers_by_field else field_mapping.get(header, header.lower())
+        parsed = parse_import_value(headers_by_field.get(field, header), value)
+        if parsed is not None:
+            data[field] = parsed
+    return doc_id, data
+
+
+def user_ids_by_name(db):
+    # nombre -> usuarioId de los usuarios cuyo nombre no se repite
+    user_ids = {}
+    repeated = set()
+    for docs in iter_pages(db.collection("usuarios").select(["nombre"])):
+        metrics.count_reads("usuarios", len(docs), "importación")
+        for doc in docs:
+            name = (doc.to_dict() or {}).get("nombre")
+            if name in user_ids:
+                repeated.add(name)
+            user_ids[name] = doc.id
+    for name in repeated:
+        del user_ids[name]
+    return user_ids
+
+
+class ImportCheckpoint:
+    # Nº de registros del archivo ya escritos en Firestore, para continuar una importación
+    # interrumpida. Deja de valer si el archivo cambia de tamaño o de fecha de modificación
+    def __init__(self, collection, filename, directory=IMPORT_CHECKPOINT_DIR):
+        stat = os.stat(filename)
+        path = os.path.abspath(filename)
+        self.source = {"collection": collection, "file": path, "size": stat.st_size, "mtime": stat.st_mtime}
+        key = hashlib.sha1(f"{collection}\n{path}".encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(directory, f"{collection}_{key}.json")
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return state.get("done", 0) if state.get("source") == self.source else 0
+
+    def save(self, done):
+        # Se escribe en un temporal y se renombra para no dejar nunca un punto de control a medias
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "done": done,
+                       "updated": datetime.now().isoformat(timespec="seconds")}, f)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def auto_id(self, index):
+        # ID (20 caracteres, como los automáticos de Firestore) del registro nº index del archivo si
+        # no trae uno. Sale del archivo y de la fila: al continuar una importación, el bloque que se
+        # vuelve a enviar escribe los mismos documentos en lugar de duplicarlos
+        source = json.dumps(self.source, sort_keys=True)
+        digest = int.from_bytes(hashlib.sha256(f"{source}\n{index}".encode("utf-8")).digest(), "big")
+        chars = []
+        for _ in range(20):
+            digest, i = divmod(digest, len(ID_ALPHABET))
+            chars.append(ID_ALPHABET[i])
+        return "".join(chars)
+
+
+def import_documents(db, collection, filename, resume=True, table_name=None, max_ops=IMPORT_MAX_OPS,
+                     progress=None, cancel_event=None):
+    # Escribe en Firestore los registros del archivo con BulkWriter: lotes enviados en paralelo,
+    # escrituras por segundo que suben poco a poco hasta max_ops y reintentos de los errores
+    # transitorios. Los documentos se fusionan (merge) con los que ya existen, así que los campos
+    # que no trae el archivo se conservan; las bajas de un archivo de cambios se borran. Tras cada
+    # bloque se guarda el punto de control
+    from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriterOptions
+    checkpoint = ImportCheckpoint(collection, filename)
+    done = checkpoint.load() if resume else 0
+    summary = {"resumed_at": done, "written": 0, "deleted": 0, "empty": 0, "invalid": 0, "unmatched_users": 0,
+               "failed": [], "cancelled": False}
+    lock = threading.Lock()
+    # Rutas borradas en el bloque en curso (las bajas de un archivo de cambios)
+    deleting = set()
+
+    def on_write_result(reference, result, writer):
+        with lock:
+            summary["deleted" if reference.path in deleting else "written"] += 1
+
+    def on_write_error(failure, writer):
+        if failure.code in RETRYABLE_WRITE_CODES and failure.attempts < IMPORT_MAX_RETRIES:
+            return True
+        with lock:
+            summary["failed"].append((failure.operation.reference.id, failure.message))
+        return False
+
+    writer = db.bulk_writer(BulkWriterOptions(initial_ops_per_second=min(IMPORT_INITIAL_OPS, max_ops),
+                                              max_ops_per_second=max_ops, retry=BulkRetry.exponential))
+    writer.on_write_result(on_write_result)
+    writer.on_write_error(on_write_error)
+    collection_ref = db.collection(collection)
+    records = islice(iter_import_records(filename, table_name or collection), done, None)
+    user_ids = None
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                summary["cancelled"] = True
+                break
+            chunk = list(islice(records, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            if user_ids is None and collection == "rutinas" and "Usuario" in chunk[0] and "usuarioId" not in chunk[0]:
+                user_ids = user_ids_by_name(db)
+            for index, record in enumerate(chunk, done):
+                doc_id, data = record_to_document(collection, record, user_ids)
+                if doc_id is not None and "/" in doc_id:
+                    summary["invalid"] += 1
+                elif record.get(DELTA_COLUMN) == "baja":
+                    if doc_id:
+                        reference = collection_ref.document(doc_id)
+                        deleting.add(reference.path)
+                        writer.delete(reference)
+                    else:
+                        summary["invalid"] += 1
+                elif not data:
+                    summary["empty"] += 1
+                else:
+                    if user_ids is not None and "usuarioId" not in data:
+                        summary["unmatched_users"] += 1
+                    reference = collection_ref.document(doc_id or checkpoint.auto_id(index))
+                    writer.set(reference, data, merge=True)
+            # flush espera a que el bloque esté escrito (con sus reintentos) antes del punto de control
+            writer.flush()
+            deleting.clear()
+            done += len(chunk)
+            checkpoint.save(done)
+            if progress:
+                progress(done)
+    finally:
+        writer.close()
+    summary["done"] = done
+    if not summary["cancelled"]:
+        checkpoint.clear()
+    return summary
+
+
+def format_number(value):
+    if value != value:
+        return "N/A"
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else str(value)
+
+
+class TextColumn:
+    # Columna de texto libre; los textos cortos se internan para compartir memoria
+    def __init__(self):
+        self.values = []
+
+    def encode(self, value):
+        text = str(value)
+        return sys.intern(text) if len(text) <= INTERN_MAX_LENGTH else text
+
+    def append(self, value):
+        self.values.append(self.encode(value))
+
+    def set(self, position, value):
+        self.values[position] = self.encode(value)
+
+    def copy(self):
+        column = TextColumn()
+        column.values = list(self.values)
+        return column
+
+    def display(self, position):
+        return self.values[position]
+
+    def value(self, position):
+        text = self.values[position]
+        return None if text == "N/A" else text
+
+
+class CategoryColumn:
+    # Columna con pocos valores distintos: cada fila guarda solo el código de su categoría
+    def __init__(self):
+        self.codes = array("I")
+        self.categories = []
+        self.lookup = {}
+
+    def encode(self, value):
+        text = str(value)
+        code = self.lookup.get(text)
+        if code is None:
+            code = self.lookup[text] = len(self.categories)
+            self.categories.append(sys.intern(text))
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def set(self, position, value):
+        self.codes[position] = self.encode(value)
+
+    def copy(self):
+        column = CategoryColumn()
+        column.codes = array(self.codes.typecode, self.codes)
+        column.categories = list(self.categories)
+        column.lookup = dict(self.lookup)
+        return column
+
+    def display(self, position):
+        return self.categories[self.codes[position]]
+
+    def value(self, position):
+        text = self.display(position)
+        return None if text == "N/A" else text
+
+
+class NumericColumn:
+    # Columna numérica en un array de float; NaN marca los valores que faltan y los textos
+    # que no son números se guardan aparte para poder mostrarlos igual
+    def __init__(self):
+        self.values = array("d")
+        self.invalid = {}
+
+    def encode(self, position, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            number = float(value)
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = math.nan
+        if number != number and value != "N/A":
+            self.invalid[position] = str(value)
+        else:
+            self.invalid.pop(position, None)
+        return number
+
+    def append(self, value):
+        self.values.append(self.encode(len(self.values), value))
+
+    def set(self, position, value):
+        self.values[position] = self.encode(position, value)
+
+    def copy(self):
+        column = NumericColumn()
+        column.values = array("d", self.values)
+        column.invalid = dict(self.invalid)
+        return column
+
+    def display(self, position):
+        if position in self.invalid:
+            return self.invalid[position]
+        return format_number(self.values[position])
+
+    def value(self, position):
+        number = self.values[position]
+        return None if number != number else number
+
+
+def make_column(header):
+    if header in NUMERIC_COLUMNS:
+        return NumericColumn()
+    if header in CATEGORICAL_COLUMNS:
+        return CategoryColumn()
+    return TextColumn()
+
+
+class ColumnStore:
+    # Almacén por columnas de una colección. Cada fila tiene una posición fija durante toda la
+    # carga; las filas borradas solo se marcan, y las vistas son arrays de posiciones
+    def __init__(self, headers, key_fields=()):
+        self.headers = headers
+        self.columns = [make_column(header) for header in headers]
+        self.column_index = {header: i for i, header in enumerate(headers)}
+        self.ids = self.columns[0].values
+        # Columnas ocultas con las claves que relacionan la colección con otras (p. ej. usuarioId)
+        self.keys = {field: TextColumn() for field in key_fields}
+        self.positions = {}
+        self.alive = bytearray()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def column(self, header):
+        return self.columns[self.column_index[header]]
+
+    def append(self, row):
+        position = len(self.alive)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        for column, value in zip(self.keys.values(), self.key_values(row)):
+            column.append(value)
+        self.alive.append(1)
+        self.positions[self.ids[position]] = position
+        return position
+
+    def update(self, position, row):
+        for column, value in zip(self.columns, row):
+            column.set(position, value)
+        for column, value in zip(self.keys.values(), self.key_values(row)):
+            column.set(position, value)
+
+    def key_values(self, row):
+        # Las claves van detrás de las columnas visibles; si la fila no las trae quedan vacías
+        values = row[len(self.columns):]
+        return [values[i] if i < len(values) else "" for i in range(len(self.keys))]
+
+    def key(self, field, position):
+        return self.keys[field].values[position]
+
+    def remove(self, doc_id):
+        position = self.positions.pop(doc_id, None)
+        if position is not None:
+            self.alive[position] = 0
+        return position
+
+    def equals(self, position, row):
+        width = len(self.columns)
+        return all(self.columns[i].display(position) == self.display_value(i, value)
+                   for i, value in enumerate(row[:width])) \
+            and all(column.values[position] == value for column, value in zip(self.keys.values(), self.key_values(row)))
+
+    def display_value(self, index, value):
+        if isinstance(self.columns[index], NumericColumn) and isinstance(value, (int, float)) \
+                and not isinstance(value, bool):
+            return format_number(float(value))
+        return str(value)
+
+    def row(self, position):
+        return [column.display(position) for column in self.columns]
+
+    def typed_row(self, position):
+        return [column.value(position) for column in self.columns]
+
+    def live_positions(self):
+        return array("l", [position for position, alive in enumerate(self.alive) if alive])
+
+    def snapshot(self):
+        # Copia fija del almacén para leerla desde otro hilo mientras este sigue recibiendo altas,
+        # cambios y bajas (modo en vivo, sincronización). Se copian los arrays y las listas de
+        # cada columna, no los textos, que se comparten
+        store = ColumnStore.__new__(ColumnStore)
+        store.headers = self.headers
+        store.columns = [column.copy() for column in self.columns]
+        store.column_index = self.column_index
+        store.ids = store.columns[0].values
+        store.keys = {field: column.copy() for field, column in self.keys.items()}
+        store.positions = dict(self.positions)
+        store.alive = bytearray(self.alive)
+        return store
+
+    def view(self, positions, extra=()):
+        return RowView(self, positions, extra)
+
+
+def joined_cell(value):
+    # Las columnas calculadas no tienen valor hasta que la colección relacionada está cargada
+    return "…" if value is None else str(value)
+
+
+class RowView:
+    # Secuencia de filas de un ColumnStore definida por un array de posiciones; las filas
+    # se generan al acceder a ellas en lugar de copiarse. extra son las funciones
+    # posición -> valor de las columnas calculadas que se añaden al final de cada fila
+    def __init__(self, store, positions, extra=()):
+        self.store = store
+        self.positions = positions
+        self.extra = extra
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        return self.row(self.positions[index])
+
+    def __iter__(self):
+        for position in self.positions:
+            yield self.row(position)
+
+    def row(self, position):
+        row = self.store.row(position)
+        if self.extra:
+            row.extend(joined_cell(value_at(position)) for value_at in self.extra)
+        return row
+
+
+class RelationIndex:
+    # Posiciones de una colección agrupadas por el ID al que apunta una de sus claves (p. ej. las
+    # rutinas de cada usuario). Se construye una vez y después se mantiene con las altas, los
+    # cambios y las bajas de filas
+    def __init__(self, store, field):
+        self.children = defaultdict(set)
+        column = store.keys[field]
+        for position in store.live_positions():
+            self.add(position, column.values[position])
+
+    def add(self, position, parent_id):
+        if parent_id:
+            self.children[parent_id].add(position)
+
+    def remove(self, position, parent_id):
+        children = self.children.get(parent_id)
+        if children is not None:
+            children.discard(position)
+            if not children:
+                del self.children[parent_id]
+
+    def count(self, parent_id):
+        children = self.children.get(parent_id)
+        return len(children) if children else 0
+
+    def positions(self, parent_ids):
+        found = set()
+        for parent_id in parent_ids:
+            found.update(self.children.get(parent_id, ()))
+        return array("l", sorted(found))
+
+
+class CollectionStats:
+    # Acumuladores de las columnas numéricas de una colección (nº, suma y suma de cuadrados,
+    # en total y por categoría). Se calculan una vez con numpy y después se actualizan fila a fila
+    def __init__(self, store):
+        self.store = store
+        self.numeric = [header for header in store.headers if header in NUMERIC_COLUMNS]
+        self.categorical = [header for header in store.headers if header in CATEGORICAL_COLUMNS]
+        self.rebuild()
+
+    def alive_mask(self):
+        return np.frombuffer(self.store.alive, dtype=np.uint8).astype(bool)
+
+    def column_values(self, header):
+        return np.frombuffer(self.store.column(header).values, dtype=np.float64)[self.alive_mask()]
+
+    def column_codes(self, header):
+        codes = self.store.column(header).codes
+        return np.frombuffer(codes, dtype=np.dtype(f"u{codes.itemsize}"))[self.alive_mask()].astype(np.intp)
+
+    def rebuild(self):
+        self.totals = {}
+        self.group_counts = {}
+        self.groups = {}
+        for header in self.numeric:
+            values = self.column_values(header)
+            values = values[~np.isnan(values)]
+            self.totals[header] = np.array([len(values), values.sum(), (values * values).sum()])
+        for category_header in self.categorical:
+            codes = self.column_codes(category_header)
+            size = len(self.store.column(category_header).categories)
+            self.group_counts[category_header] = np.bincount(codes, minlength=size).astype(np.float64)
+            for header in self.numeric:
+                values = self.column_values(header)
+                valid = ~np.isnan(values)
+                self.groups[(category_header, header)] = (
+                    np.bincount(codes[valid], minlength=size).astype(np.float64),
+                    np.bincount(codes[valid], weights=values[valid], minlength=size))
+
+    def grow(self, values, size):
+        # Las categorías nuevas amplían los acumuladores por categoría
+        return values if len(values) >= size else np.concatenate([values, np.zeros(size - len(values))])
+
+    def add(self, position, sign=1):
+        # sign=-1 descuenta la fila (antes de modificarla o al borrarla)
+        numbers = {}
+        for header in self.numeric:
+            value = self.store.column(header).values[position]
+            if value == value:
+                numbers[header] = value
+                self.totals[header] += sign * np.array([1.0, value, value * value])
+        for category_header in self.categorical:
+            column = self.store.column(category_header)
+            code = column.codes[position]
+            size = len(column.categories)
+            counts = self.group_counts[category_header] = self.grow(self.group_counts[category_header], size)
+            counts[code] += sign
+            for header, value in numbers.items():
+                group_counts, group_sums = self.groups[(category_header, header)]
+                group_counts = self.grow(group_counts, size)
+                group_sums = self.grow(group_sums, size)
+                group_counts[code] += sign
+                group_sums[code] += sign * value
+                self.groups[(category_header, header)] = (group_counts, group_sums)
+
+    def remove(self, position):
+        self.add(position, sign=-1)
+
+    def summary(self, header):
+        # Nº, media y desviación salen de los acumuladores; mínimo, mediana y máximo de numpy
+        count, total, squares = self.totals[header]
+        if count < 1:
+            return {"count": 0}
+        mean = total / count
+        values = self.column_values(header)
+        values = values[~np.isnan(values)]
+        return {"count": int(round(count)), "mean": mean, "std": math.sqrt(max(squares / count - mean * mean, 0.0)),
+                "min": values.min(), "median": np.median(values), "max": values.max()}
+
+    def breakdown(self, category_header):
+        # Filas (categoría, nº de registros, {columna: media}) de las categorías con algún registro
+        categories = self.store.column(category_header).categories
+        counts = self.group_counts[category_header]
+        rows = []
+        for code, category in enumerate(categories):
+            if code >= len(counts) or counts[code] < 0.5:
+                continue
+            means = {}
+            for header in self.numeric:
+                group_counts, group_sums = self.groups[(category_header, header)]
+                if code < len(group_counts) and group_counts[code] >= 0.5:
+                    means[header] = group_sums[code] / group_counts[code]
+            rows.append((category, int(round(counts[code])), means))
+        return sorted(rows, key=lambda row: -row[1])
+
+    def histogram(self, header, bins=HISTOGRAM_BINS):
+        values = self.column_values(header)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return np.zeros(0), np.zeros(0)
+        return np.histogram(values, bins=bins)
+
+
+class CollectionData:
+    # Filas ya cargadas de una colección junto con sus índices, para poder cambiar de colección al instante
+    def __init__(self, headers, complete=True, pushed=None, key_fields=()):
+        self.store = ColumnStore(headers, key_fields)
+        self.search_index = SearchIndex(headers)
+        self.sort_keys = SortKeys(self.store)
+        self.complete = complete
+        # Condiciones enviadas a Firestore si solo se leyó una parte de la colección
+        self.pushed = pushed
+        # Estadísticas: solo se calculan si se abren, y desde entonces se mantienen al día
+        self.stats = None
+        # Índices de relaciones por campo clave; igual que las estadísticas, se crean al usarlos
+        self.relations = {}
+
+    def get_stats(self):
+        if self.stats is None:
+            self.stats = CollectionStats(self.store)
+        return self.stats
+
+    def get_relation(self, field):
+        relation = self.relations.get(field)
+        if relation is None:
+            relation = self.relations[field] = RelationIndex(self.store, field)
+        return relation
+
+    def link(self, position):
+        for field, relation in self.relations.items():
+            relation.add(position, self.store.key(field, position))
+
+    def unlink(self, position):
+        for field, relation in self.relations.items():
+            relation.remove(position, self.store.key(field, position))
+
+    def add_rows(self, rows):
+        # Añade filas nuevas (las que ya existen se ignoran) y devuelve sus posiciones
+        positions = []
+        for row in rows:
+            if row[0] in self.store.positions:
+                continue
+            position = self.store.append(row)
+            self.search_index.add(position, self.store.row(position))
+            if self.stats:
+                self.stats.add(position)
+            self.link(position)
+            positions.append(position)
+        self.sort_keys.update(positions)
+        return positions
+
+    def upsert_rows(self, rows):
+        # Devuelve las posiciones de las filas nuevas o modificadas
+        changed = []
+        for row in rows:
+            position = self.store.positions.get(row[0])
+            if position is None:
+                position = self.store.append(row)
+            elif self.store.equals(position, row):
+                continue
+            else:
+                if self.stats:
+                    self.stats.remove(position)
+                self.unlink(position)
+                self.store.update(position, row)
+            if self.stats:
+                self.stats.add(position)
+            self.link(position)
+            self.search_index.add(position, self.store.row(position))
+            changed.append(position)
+        self.sort_keys.update(changed)
+        return changed
+
+    def remove_ids(self, doc_ids):
+        removed = [position for position in (self.store.remove(doc_id) for doc_id in doc_ids)
+                   if position is not None]
+        for position in removed:
+            self.search_index.remove(position)
+            if self.stats:
+                self.stats.remove(position)
+            self.unlink(position)
+        if removed:
+            self.sort_keys.invalidate()
+        return removed
+
+
+def text_hashes(texts, fold=False):
+    # Hash de 64 bits de cada texto; con fold, del texto sin tildes ni mayúsculas (una vez por
+    # texto distinto, los nombres se repiten mucho)
+    if fold:
+        folded = {text: hash(fold_text(text)) for text in set(texts)}
+        hashes = (folded[text] for text in texts)
+    else:
+        hashes = (hash(text) for text in texts)
+    return np.fromiter(hashes, dtype=np.int64, count=len(texts)).view(np.uint64)
+
+
+def combine_hashes(columns):
+    # Una huella por fila a partir de los hashes de sus columnas; el desbordamiento es intencionado
+    combined = np.zeros(len(columns[0]), dtype=np.uint64)
+    for hashes in columns:
+        combined = combined * np.uint64(1000003) ^ hashes
+    return combined
+
+
+class QualitySnapshot:
+    # Copia de las columnas de una colección para analizarla en otro hilo mientras la tabla sigue
+    # recibiendo cambios. Se toma en el hilo de la interfaz y son solo copias de arrays y listas
+    def __init__(self, collection, store):
+        self.collection = collection
+        self.headers = store.headers
+        self.alive = np.frombuffer(store.alive, dtype=np.uint8).astype(bool)
+        self.live = np.flatnonzero(self.alive)
+        self.ids = list(store.ids)
+        self.numbers = {}
+        self.categories = {}
+        self.texts = {}
+        # Texto original de los valores de las columnas numéricas que no se guardaron como número
+        self.number_texts = {}
+        for header, column in zip(store.headers, store.columns):
+            if isinstance(column, NumericColumn):
+                values = np.array(column.values, dtype=np.float64)
+                invalid = {}
+                for position, text in column.invalid.items():
+                    quantity = parse_quantity(text)
+                    if quantity is None:
+                        invalid[position] = text
+                    else:
+                        values[position] = quantity
+                self.numbers[header] = (values, invalid)
+                self.number_texts[header] = dict(column.invalid)
+            elif isinstance(column, CategoryColumn):
+                self.categories[header] = (np.array(column.codes, dtype=np.intp), list(column.categories))
+            else:
+                self.texts[header] = list(column.values)
+        self.texts.update((field, list(column.values)) for field, column in store.keys.items())
+        self.names = self.text("Nombre")
+
+    def __len__(self):
+        return len(self.live)
+
+    def text(self, header):
+        # Texto de una columna de texto, de categoría o clave oculta en todas las posiciones
+        if header in self.categories:
+            codes, categories = self.categories[header]
+            return [categories[code] for code in codes]
+        return self.texts[header]
+
+    def hashes(self, header):
+        if header in self.numbers:
+            # Los NaN de los valores que faltan tienen todos los mismos bits; los valores que eran
+            # texto se distinguen por su texto y no por el número que se sacó de él
+            hashes = self.numbers[header][0].view(np.uint64).copy()
+            texts = self.number_texts[header]
+            if texts:
+                hashes[np.fromiter(texts, dtype=np.intp, count=len(texts))] = text_hashes(list(texts.values()))
+            return hashes
+        if header in self.categories:
+            codes, categories = self.categories[header]
+            return text_hashes(categories)[codes]
+        return text_hashes(self.texts[header])
+
+    def number_text(self, header, position):
+        # El valor tal como está en la tabla: el texto si no era un número, si no el número
+        text = self.number_texts[header].get(position)
+        return text if text is not None else format_number(self.numbers[header][0][position])
+
+    def finding(self, position, problem, column, value, detail):
+        return [self.collection, self.ids[position], self.names[position], problem, column, value, detail]
+
+
+def find_duplicates(snapshot):
+    # Duplicados exactos: filas (sin contar el ID) con la misma huella. Posibles duplicados: dentro
+    # de cada bloque (mismo nombre sin tildes ni mayúsculas) se ordena por las columnas numéricas y
+    # se compara cada fila con sus DUPLICATE_WINDOW siguientes, todo con operaciones de numpy
+    live = snapshot.live
+    if len(live) < 2:
+        return []
+    findings = []
+    hashes = {header: snapshot.hashes(header)[live]
+              for header in snapshot.headers[1:] + KEY_FIELDS.get(snapshot.collection, [])}
+    content = combine_hashes(list(hashes.values()))
+    order = np.argsort(content, kind="stable")
+    same = content[order[1:]] == content[order[:-1]]
+    starts = np.flatnonzero(np.r_[True, ~same])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    for index in np.flatnonzero(np.r_[False, same]):
+        position = live[order[index]]
+        findings.append(snapshot.finding(position, "Duplicado exacto", "", "",
+                                         f"igual que {snapshot.ids[live[order[group_start[index]]]]}"))
+    block_headers, tolerances = DUPLICATE_RULES.get(snapshot.collection, ([], {}))
+    if not block_headers:
+        return findings
+    block_texts = [snapshot.text(header) for header in block_headers]
+    block = combine_hashes([text_hashes(texts, fold=True) for texts in block_texts])[live]
+    # Las filas sin nombre (o sin usuario) no forman bloque
+    valid = np.ones(len(live), dtype=bool)
+    for texts in block_texts:
+        valid &= np.fromiter((texts[position] not in ("", "N/A") for position in live), dtype=bool, count=len(live))
+    candidates = np.flatnonzero(valid)
+    numbers = [snapshot.numbers[header][0][live] for header in tolerances]
+    # Las columnas pesadas solo tienen el marcador "(ver detalles)": no sirven para comparar
+    others = [column for header, column in hashes.items()
+              if header not in block_headers and header not in tolerances and header not in HEAVY_COLUMNS]
+    order = candidates[np.lexsort(tuple(values[candidates] for values in reversed(numbers)) + (block[candidates],))]
+    pairs = set()
+    for step in range(1, DUPLICATE_WINDOW + 1):
+        first, second = order[:-step], order[step:]
+        close = (block[first] == block[second]) & (content[first] != content[second])
+        for values, tolerance in zip(numbers, tolerances.values()):
+            a, b = values[first], values[second]
+            close &= (np.abs(a - b) <= tolerance) | (np.isnan(a) & np.isnan(b))
+        different = np.zeros(len(first), dtype=np.intp)
+        for column in others:
+            different += column[first] != column[second]
+        close &= different <= DUPLICATE_MAX_DIFFERENT
+        pairs.update(zip(first[close].tolist(), second[close].tolist()))
+    for first, second in sorted(pairs):
+        # El hash del bloque podría coincidir con nombres distintos: se comprueban los textos
+        position, other = live[first], live[second]
+        if all(fold_text(texts[position]) == fold_text(texts[other]) for texts in block_texts):
+            findings.append(snapshot.finding(position, "Posible duplicado", block_headers[0],
+                                             snapshot.names[position], f"parecido a {snapshot.ids[other]}"))
+    return findings
+
+
+def parse_quantity(text):
+    # Número de un texto con unidad ("75 kg") o punto medio de un rango ("500-800 kcal"); None si
+    # el texto no es una cantidad
+    match = QUANTITY_PATTERN.fullmatch(text.strip())
+    if not match:
+        return None
+    low = float(match.group(1).replace(",", "."))
+    high = float(match.group(2).replace(",", ".")) if match.group(2) else low
+    return (low + high) / 2
+
+
+def find_outliers(snapshot):
+    # Valores fuera de PLAUSIBLE_RANGES, valores atípicos por el z robusto (mediana y desviación
+    # absoluta mediana de los valores posibles) y textos de columnas numéricas que no son cantidades
+    findings = []
+    live = snapshot.live
+    for header, (values, invalid) in snapshot.numbers.items():
+        for position in sorted(invalid):
+            if snapshot.alive[position]:
+                findings.append(snapshot.finding(position, "Valor no numérico", header, invalid[position],
+                                                 "no es un número"))
+        x = values[live]
+        finite = ~np.isnan(x)
+        low, high = PLAUSIBLE_RANGES.get(header, (-math.inf, math.inf))
+        impossible = finite & ((x < low) | (x > high))
+        for index in np.flatnonzero(impossible):
+            findings.append(snapshot.finding(live[index], "Valor imposible", header,
+                                             snapshot.number_text(header, live[index]),
+                                             f"fuera del rango {low}-{high}"))
+        plausible = finite & ~impossible
+        if plausible.sum() < 3:
+            continue
+        median = np.median(x[plausible])
+        mad = np.median(np.abs(x[plausible] - median))
+        if mad == 0:
+            continue
+        z = np.zeros(len(x))
+        z[plausible] = 0.6745 * (x[plausible] - median) / mad
+        for index in np.flatnonzero(np.abs(z) > OUTLIER_Z):
+            findings.append(snapshot.finding(live[index], "Valor atípico", header,
+                                             snapshot.number_text(header, live[index]),
+                                             f"z robusto {z[index]:.1f} (mediana {format_number(median)})"))
+    return findings
+
+
+def find_dangling(snapshot, field, parent):
+    # Filas cuya clave está vacía o apunta a un documento que no está en la colección padre
+    findings = []
+    parent_ids = {parent.ids[position] for position in parent.live}
+    keys = snapshot.texts[field]
+    for position in snapshot.live.tolist():
+        key = keys[position]
+        if not key:
+            findings.append(snapshot.finding(position, "Sin referencia", field, "", f"sin {field}"))
+        elif key not in parent_ids:
+            findings.append(snapshot.finding(position, "Referencia rota", field, key,
+                                             f"no existe en {parent.collection}"))
+    return findings
+
+
+@timed("quality_scan")
+def scan_quality(snapshots):
+    # snapshots: {colección: QualitySnapshot}; las referencias solo se comprueban si la colección
+    # padre también está cargada entera
+    findings = []
+    for collection, snapshot in snapshots.items():
+        findings.extend(find_duplicates(snapshot))
+        findings.extend(find_outliers(snapshot))
+        for parent, _, child, field in RELATIONS:
+            if child == collection and parent in snapshots:
+                findings.extend(find_dangling(snapshot, field, snapshots[parent]))
+    return findings
+
+
+class VirtualTreeview:
+    # Tabla virtual: solo las filas visibles (más un pequeño margen) existen como
+    # elementos del Treeview; al desplazarse se reciclan cambiando sus valores
+    def __init__(self, tree, scrollbar, row_height=ROW_HEIGHT, overscan=VIRTUAL_OVERSCAN):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_height = row_height
+        self.overscan = overscan
+        self.rows = []
+        self.offset = 0
+        self.items = []
+        self.selected_index = None
+        self.enabled = False
+        self.tree.bind("<Configure>", lambda e: self.refresh(), add="+")
+        self.tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_units(3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.visible_rows()))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.visible_rows()))
+
+    def enable(self):
+        self.enabled = True
+        self.tree.delete(*self.tree.get_children())
+        self.items = []
+        self.scrollbar.configure(command=self.yview)
+        self.tree.configure(yscrollcommand=lambda *args: None)
+
+    def disable(self):
+        self.enabled = False
+        self.tree.delete(*self.tree.get_children())
+        self.items = []
+        self.rows = []
+        self.scrollbar.configure(command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+    def set_rows(self, rows, keep_offset=False):
+        self.rows = rows
+        if not keep_offset:
+            self.offset = 0
+            self.selected_index = None
+        self.refresh()
+
+    def visible_rows(self):
+        # Restamos la altura de la cabecera
+        height = self.tree.winfo_height() - self.row_height
+        return max(1, height // self.row_height)
+
+    def clamp_offset(self, offset):
+        return max(0, min(offset, len(self.rows) - self.visible_rows()))
+
+    def refresh(self):
+        if not self.enabled:
+            return
+        self.offset = self.clamp_offset(self.offset)
+        count = max(0, min(self.visible_rows() + self.overscan, len(self.rows) - self.offset))
+        while len(self.items) < count:
+            self.items.append(self.tree.insert("", tk.END))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        for i, item in enumerate(self.items):
+            self.tree.item(item, values=self.rows[self.offset + i])
+        # La selección sigue a la fila de datos, no al elemento reciclado
+        if self.selected_index is not None and 0 <= self.selected_index - self.offset < count:
+            self.tree.selection_set(self.items[self.selected_index - self.offset])
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        self.tree.yview_moveto(0)
+        total = len(self.rows)
+        if total:
+            self.scrollbar.set(self.offset / total, min(total, self.offset + self.visible_rows()) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.offset += step * self.visible_rows() if args[2] == "pages" else step
+        self.refresh()
+
+    def scroll_units(self, units):
+        if not self.enabled:
+            return None
+        self.offset += units
+        self.refresh()
+        return "break"
+
+    def on_mousewheel(self, event):
+        return self.scroll_units(-3 if event.delta > 0 else 3)
+
+    def on_select(self, event):
+        if not self.enabled:
+            return
+        selection = self.tree.selection()
+        if selection and selection[0] in self.items:
+            self.selected_index = self.offset + self.items.index(selection[0])
+
+    def move_selection(self, step):
+        if not self.enabled:
+            return None
+        if not self.rows:
+            return "break"
+        current = self.selected_index if self.selected_index is not None else self.offset
+        self.selected_index = max(0, min(current + step, len(self.rows) - 1))
+        # Desplazamos la ventana para que la fila seleccionada quede visible
+        if self.selected_index < self.offset:
+            self.offset = self.selected_index
+        elif self.selected_index >= self.offset + self.visible_rows():
+            self.offset = self.selected_index - self.visible_rows() + 1
+        self.refresh()
+        return "break"
+
+
+class StatsDashboard(tk.Toplevel):
+    # Panel de estadísticas: totales calculados por Firestore con agregaciones y desgloses e
+    # histogramas sobre los datos ya cargados, que se refrescan cuando cambian
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Estadísticas")
+        self.geometry("780x660")
+        self.minsize(640, 560)
+        self.server_generation = 0
+        top_frame = tk.Frame(self, padx=15, pady=10)
+        top_frame.pack(fill=tk.X)
+        tk.Label(top_frame, text="Colección:", font=("Helvetica", 11, "bold")).pack(side=tk.LEFT)
+        self.collection_var = tk.StringVar(value=app.current_collection)
+        collection_box = ttk.Combobox(top_frame, textvariable=self.collection_var, values=list(app.collections),
+                                      state="readonly", width=15)
+        collection_box.pack(side=tk.LEFT, padx=10)
+        collection_box.bind("<<ComboboxSelected>>", lambda e: self.refresh(server=True))
+        tk.Button(top_frame, text="🔄 Recalcular totales", command=lambda: self.refresh(server=True)).pack(side=tk.RIGHT)
+        server_frame = tk.LabelFrame(self, text="Firestore (agregaciones, sin leer documentos)", padx=10, pady=5)
+        server_frame.pack(fill=tk.X, padx=15, pady=5)
+        self.server_var = tk.StringVar()
+        tk.Label(server_frame, textvariable=self.server_var, justify=tk.LEFT, anchor="w").pack(fill=tk.X)
+        local_frame = tk.LabelFrame(self, text="Datos cargados", padx=10, pady=5)
+        local_frame.pack(fill=tk.X, padx=15, pady=5)
+        self.local_var = tk.StringVar()
+        tk.Label(local_frame, textvariable=self.local_var, anchor="w").pack(fill=tk.X)
+        summary_columns = ["Columna", "Registros", "Media", "Desv.", "Mín", "Mediana", "Máx"]
+        self.summary_tree = ttk.Treeview(local_frame, columns=summary_columns, show="headings", height=5)
+        for column in summary_columns:
+            self.summary_tree.heading(column, text=column)
+            self.summary_tree.column(column, width=140 if column == "Columna" else 80,
+                                     anchor=tk.W if column == "Columna" else tk.E)
+        self.summary_tree.pack(fill=tk.X)
+        breakdown_frame = tk.LabelFrame(self, text="Desglose por categoría", padx=10, pady=5)
+        breakdown_frame.pack(fill=tk.X, padx=15, pady=5)
+        self.group_var = tk.StringVar()
+        self.group_box = ttk.Combobox(breakdown_frame, textvariable=self.group_var, state="readonly", width=25)
+        self.group_box.pack(anchor="w")
+        self.group_box.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        self.breakdown_tree = ttk.Treeview(breakdown_frame, show="headings", height=5)
+        self.breakdown_tree.pack(fill=tk.X, pady=(5, 0))
+        histogram_frame = tk.LabelFrame(self, text="Histograma", padx=10, pady=5)
+        histogram_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(5, 15))
+        self.histogram_var = tk.StringVar()
+        self.histogram_box = ttk.Combobox(histogram_frame, textvariable=self.histogram_var, state="readonly", width=25)
+        self.histogram_box.pack(anchor="w")
+        self.histogram_box.bind("<<ComboboxSelected>>", lambda e: self.draw_histogram())
+        self.canvas = tk.Canvas(histogram_frame, bg="white", height=160)
+        self.canvas.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+        self.canvas.bind("<Configure>", lambda e: self.draw_histogram())
+        self.refresh(server=True)
+
+    def refresh(self, server=False):
+        collection = self.collection_var.get()
+        if server:
+            self.server_generation += 1
+            self.server_var.set("Calculando...")
+            self.app.data_layer.submit("estadísticas", partial(self.aggregate_worker, collection,
+                                                               self.server_generation))
+        dataset = self.app.dataset_for(collection)
+        headers = self.app.collections[collection]
+        categorical = [header for header in headers if header in CATEGORICAL_COLUMNS]
+        numeric = [header for header in headers if header in NUMERIC_COLUMNS]
+        self.group_box.config(values=categorical)
+        if self.group_var.get() not in categorical:
+            self.group_var.set(categorical[0] if categorical else "")
+        self.histogram_box.config(values=numeric)
+        if self.histogram_var.get() not in numeric:
+            self.histogram_var.set(numeric[0] if numeric else "")
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        self.breakdown_tree.delete(*self.breakdown_tree.get_children())
+        self.draw_histogram()
+        if dataset is None:
+            self.local_var.set("La colección no está cargada: solo hay totales de Firestore")
+            return
+        stats = dataset.get_stats()
+        state = "" if dataset.complete else " (carga parcial)"
+        self.local_var.set(f"{len(dataset.store)} registros cargados{state}")
+        for header in numeric:
+            summary = stats.summary(header)
+            if summary["count"]:
+                values = [f"{summary[key]:.1f}" for key in ("mean", "std", "min", "median", "max")]
+            else:
+                values = ["-"] * 5
+            self.summary_tree.insert("", tk.END, values=[header, summary["count"]] + values)
+        group = self.group_var.get()
+        breakdown_columns = [group or "Categoría", "Registros"] + [f"Media {header}" for header in numeric]
+        self.breakdown_tree["columns"] = breakdown_columns
+        for column in breakdown_columns:
+            self.breakdown_tree.heading(column, text=column)
+            self.breakdown_tree.column(column, width=160 if column == breakdown_columns[0] else 100,
+                                       anchor=tk.W if column == breakdown_columns[0] else tk.E)
+        if group:
+            for category, count, means in stats.breakdown(group):
+                self.breakdown_tree.insert("", tk.END, values=[category, count] + [
+                    f"{means[header]:.1f}" if header in means else "-" for header in numeric])
+
+    def draw_histogram(self):
+        self.canvas.delete("all")
+        dataset = self.app.dataset_for(self.collection_var.get())
+        if dataset is None or not self.histogram_var.get():
+            return
+        counts, edges = dataset.get_stats().histogram(self.histogram_var.get())
+        if not len(counts):
+            return
+        width = max(self.canvas.winfo_width(), 200)
+        height = max(self.canvas.winfo_height(), 120)
+        bar_width = (width - 20) / len(counts)
+        top = counts.max() or 1
+        for i, count in enumerate(counts):
+            x0 = 10 + i * bar_width
+            y0 = height - 20 - (height - 40) * count / top
+            self.canvas.create_rectangle(x0 + 2, y0, x0 + bar_width - 2, height - 20, fill="#3498db", outline="")
+            self.canvas.create_text(x0 + bar_width / 2, y0 - 8, text=str(int(count)), font=("Helvetica", 8))
+            self.canvas.create_text(x0 + bar_width / 2, height - 10, text=f"{edges[i]:g}", font=("Helvetica", 8))
+
+    async def aggregate_worker(self, collection, generation):
+        try:
+            result = await self.app.data_layer.shared(("agregación", collection),
+                                                      partial(aggregate_collection, self.app.async_db, collection))
+            self.app.after(0, self.on_aggregated, generation, result, None)
+        except Exception as e:
+            self.app.after(0, self.on_aggregated, generation, None, e)
+
+    def on_aggregated(self, generation, result, error):
+        if generation != self.server_generation or not self.winfo_exists():
+            return
+        if error is not None:
+            self.server_var.set(f"No se pudieron calcular las agregaciones: {error}")
+            return
+        total, fields = result
+        lines = [f"Total de documentos: {total}"]
+        for header, (field_sum, field_avg) in fields.items():
+            average = "-" if field_avg is None else f"{field_avg:.2f}"
+            lines.append(f"{header}: suma {field_sum:g}, media {average}")
+        self.server_var.set("\n".join(lines))
+
+
+class DiagnosticsPanel(tk.Toplevel):
+    # Tiempos de cada operación, lecturas de documentos por colección y opciones de registro
+    # y perfilado
+    def __init__(self, app):
+        super().__init__(app)
+        self.title("Diagnóstico")
+        self.geometry("640x520")
+        self.minsize(520, 420)
+        spans_frame = tk.LabelFrame(self, text="Operaciones", padx=10, pady=5)
+        spans_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(15, 5))
+        span_columns = ["Operación", "Llamadas", "Total (ms)", "Media (ms)", "Máx (ms)", "Última (ms)"]
+        self.spans_tree = ttk.Treeview(spans_frame, columns=span_columns, show="headings", height=9)
+        for column in span_columns:
+            self.spans_tree.heading(column, text=column)
+            self.spans_tree.column(column, width=160 if column == "Operación" else 85,
+                                   anchor=tk.W if column == "Operación" else tk.E)
+        self.spans_tree.pack(fill=tk.BOTH, expand=True)
+        reads_frame = tk.LabelFrame(self, text="Lecturas de documentos facturadas", padx=10, pady=5)
+        reads_frame.pack(fill=tk.X, padx=15, pady=5)
+        self.reads_tree = ttk.Treeview(reads_frame, columns=["Colección", "Lecturas"], show="headings", height=4)
+        self.reads_tree.heading("Colección", text="Colección")
+        self.reads_tree.heading("Lecturas", text="Lecturas")
+        self.reads_tree.column("Lecturas", anchor=tk.E)
+        self.reads_tree.pack(fill=tk.X)
+        options_frame = tk.Frame(self, padx=15, pady=10)
+        options_frame.pack(fill=tk.X)
+        self.log_enabled = tk.BooleanVar(value=bool(metrics.log_path))
+        tk.Checkbutton(options_frame, text=f"Registrar en {METRICS_LOG_PATH} (JSON lines)",
+                       variable=self.log_enabled, command=self.toggle_log).pack(anchor="w")
+        buttons_frame = tk.Frame(options_frame)
+        buttons_frame.pack(fill=tk.X, pady=(5, 0))
+        tk.Button(buttons_frame, text="Perfilar la próxima operación",
+                  command=self.profile_next).pack(side=tk.LEFT)
+        tk.Button(buttons_frame, text="Reiniciar contadores",
+                  command=lambda: (metrics.reset(), self.refresh())).pack(side=tk.LEFT, padx=10)
+        self.profile_var = tk.StringVar()
+        tk.Label(options_frame, textvariable=self.profile_var, fg="gray", anchor="w",
+                 justify=tk.LEFT, wraplength=580).pack(fill=tk.X, pady=(5, 0))
+        self.refresh()
+
+    def toggle_log(self):
+        try:
+            metrics.set_log_path(METRICS_LOG_PATH if self.log_enabled.get() else None)
+        except OSError as e:
+            self.log_enabled.set(False)
+            messagebox.showerror("Error", f"No se pudo activar el registro: {e}", parent=self)
+
+    def profile_next(self):
+        metrics.profile_next = True
+        self.refresh()
+
+    def refresh(self):
+        spans, reads, _ = metrics.snapshot()
+        self.spans_tree.delete(*self.spans_tree.get_children())
+        for name, (calls, total, maximum, last) in sorted(spans.items(), key=lambda item: -item[1][1]):
+            self.spans_tree.insert("", tk.END, values=[name, calls, f"{total * 1000:.1f}",
+                                                       f"{total * 1000 / calls:.1f}", f"{maximum * 1000:.1f}",
+                                                       f"{last * 1000:.1f}"])
+        self.reads_tree.delete(*self.reads_tree.get_children())
+        for collection, count in sorted(reads.items()):
+            self.reads_tree.insert("", tk.END, values=[collection, count])
+        self.reads_tree.insert("", tk.END, values=["Total de la sesión", sum(reads.values())])
+        if metrics.profile_next:
+            self.profile_var.set("Se perfilará la próxima operación medida")
+        elif metrics.last_profile:
+            self.profile_var.set(f"Último perfil: {metrics.last_profile} (resumen en la consola)")
+        else:
+            self.profile_var.set("")
+
+
+class RelatedRowsWindow(tk.Toplevel):
+    # Filas de una colección relacionada (p. ej. las rutinas de unos usuarios) sacadas de los datos
+    # ya cargados, sin lecturas a Firestore. Usa la tabla virtual para abrirse al momento aunque
+    # haya cientos de miles de filas
+    def __init__(self, app, title, collection, dataset, positions):
+        super().__init__(app)
+        self.title(title)
+        self.geometry("900x450")
+        self.minsize(600, 300)
+        headers = COLLECTIONS[collection]
+        tk.Label(self, text=f"{title}: {len(positions)} registros", font=("Helvetica", 12, "bold"),
+                 anchor="w").pack(fill=tk.X, padx=15, pady=(15, 5))
+        tree_frame = tk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        self.tree = ttk.Treeview(tree_frame, columns=headers, show="headings")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        v_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        h_scrollbar = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.tree.xview)
+        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        for header in headers:
+            self.tree.heading(header, text=header)
+            self.tree.column(header, width=210 if header == "ID" else 150, minwidth=50, stretch=False,
+                             anchor=tk.E if header in NUMERIC_COLUMNS else tk.W)
+        self.virtual_view = VirtualTreeview(self.tree, v_scrollbar)
+        self.virtual_view.enable()
+        self.virtual_view.set_rows(dataset.store.view(positions))
+
+
+def export_writer(filename):
+    # Función de exportación según la extensión del archivo (con o sin compresión); CSV si no se reconoce
+    ext = os.path.splitext(split_compression(filename)[0])[1].lower()
+    for format_ext, writer in EXPORT_FORMATS.values():
+        if format_ext == ext:
+            return writer
+    return write_csv
+
+
+class QualityPanel(tk.Toplevel):
+    # Análisis de calidad de las colecciones cargadas: duplicados, valores imposibles o atípicos y
+    # referencias a documentos que no existen. Se analiza una copia de los datos en otro hilo; el
+    # resultado se puede filtrar y exportar, y con doble clic se abre el registro en la tabla
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Calidad de Datos")
+        self.geometry("1000x560")
+        self.minsize(760, 400)
+        self.findings = []
+        self.visible = []
+        top_frame = tk.Frame(self, padx=15, pady=10)
+        top_frame.pack(fill=tk.X)
+        self.scan_btn = tk.Button(top_frame, text="🔄 Analizar", command=self.scan)
+        self.scan_btn.pack(side=tk.LEFT)
+        tk.Button(top_frame, text="📥 Exportar", command=self.export).pack(side=tk.RIGHT)
+        self.summary_var = tk.StringVar()
+        tk.Label(top_frame, textvariable=self.summary_var, anchor="w").pack(side=tk.LEFT, fill=tk.X, expand=True,
+                                                                          padx=10)
+        filter_frame = tk.Frame(self, padx=15)
+        filter_frame.pack(fill=tk.X)
+        tk.Label(filter_frame, text="Colección:").pack(side=tk.LEFT)
+        self.collection_var = tk.StringVar(value="Todas")
+        collection_box = ttk.Combobox(filter_frame, textvariable=self.collection_var,
+                                      values=["Todas"] + list(COLLECTIONS), state="readonly", width=12)
+        collection_box.pack(side=tk.LEFT, padx=(5, 15))
+        collection_box.bind("<<ComboboxSelected>>", lambda e: self.apply_filter())
+        tk.Label(filter_frame, text="Problema:").pack(side=tk.LEFT)
+        self.problem_var = tk.StringVar(value="Todos")
+        problem_box = ttk.Combobox(filter_frame, textvariable=self.problem_var, values=["Todos"] + QUALITY_PROBLEMS,
+                                   state="readonly", width=20)
+        problem_box.pack(side=tk.LEFT, padx=(5, 15))
+        problem_box.bind("<<ComboboxSelected>>", lambda e: self.apply_filter())
+        tk.Label(filter_frame, text="Buscar:").pack(side=tk.LEFT)
+        self.text_var = tk.StringVar()
+        text_entry = ttk.Entry(filter_frame, textvariable=self.text_var)
+        text_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        text_entry.bind("<KeyRelease>", lambda e: self.apply_filter())
+        tree_frame = tk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(10, 15))
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        self.tree = ttk.Treeview(tree_frame, columns=QUALITY_HEADERS, show="headings")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        v_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        h_scrollbar = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.tree.xview)
+        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        for header in QUALITY_HEADERS:
+            self.tree.heading(header, text=header)
+            self.tree.column(header, width=210 if header in ("ID", "Detalle") else 120, minwidth=50, stretch=False)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        self.virtual_view = VirtualTreeview(self.tree, v_scrollbar)
+        self.virtual_view.enable()
+        self.scan()
+
+    def scan(self):
+        # Copias tomadas aquí, en el hilo de la interfaz; las colecciones a medio cargar o leídas
+        # con filtros de Firestore no se analizan
+        snapshots = {}
+        skipped = []
+        for collection in COLLECTIONS:
+            dataset = self.app.dataset_for(collection)
+            if dataset is not None and dataset.complete:
+                snapshots[collection] = QualitySnapshot(collection, dataset.store)
+            else:
+                skipped.append(collection)
+        if not snapshots:
+            self.summary_var.set("No hay ninguna colección cargada por completo")
+            return
+        self.scan_btn.config(state=tk.DISABLED)
+        self.summary_var.set(f"Analizando {sum(len(snapshot) for snapshot in snapshots.values())} registros...")
+        threading.Thread(target=self.scan_worker, args=(snapshots, skipped), daemon=True).start()
+
+    def scan_worker(self, snapshots, skipped):
+        start_time = time.perf_counter()
+        try:
+            findings = scan_quality(snapshots)
         except Exception as e:
-            print(f"Error cargando logo de splash: {e}")
+            print(f"Error al analizar la calidad de los datos: {e}")
+            self.app.after(0, self.on_scan_error, e)
+            return
+        self.app.after(0, self.on_scanned, findings, snapshots, skipped, time.perf_counter() - start_time)
+
+    def on_scan_error(self, error):
+        if not self.winfo_exists():
+            return
+        self.scan_btn.config(state=tk.NORMAL)
+        self.summary_var.set("")
+        messagebox.showerror("Error", f"No se pudo analizar la calidad de los datos: {error}", parent=self)
+
+    def on_scanned(self, findings, snapshots, skipped, elapsed):
+        if not self.winfo_exists():
+            return
+        self.scan_btn.config(state=tk.NORMAL)
+        self.findings = findings
+        summary = (f"{len(findings)} problemas en {sum(len(snapshot) for snapshot in snapshots.values())} "
+                   f"registros ({elapsed:.2f} s)")
+        if skipped:
+            summary += f"; sin analizar (no cargadas por completo): {', '.join(skipped)}"
+        self.summary_var.set(summary)
+        self.apply_filter()
+
+    def apply_filter(self):
+        collection = self.collection_var.get()
+        problem = self.problem_var.get()
+        text = fold_text(self.text_var.get().strip())
+        self.visible = [finding for finding in self.findings
+                        if (collection == "Todas" or finding[0] == collection)
+                        and (problem == "Todos" or finding[3] == problem)
+                        and (not text or text in fold_text(CELL_SEPARATOR.join(finding)))]
+        self.virtual_view.set_rows(self.visible)
+
+    def export(self):
+        if not self.visible:
+            messagebox.showinfo("Exportar", "No hay resultados que exportar", parent=self)
+            return
+        filetypes = [(f"{export_format.upper()} Files", f"*{ext}") for export_format, (ext, _) in EXPORT_FORMATS.items()
+                     if format_available(export_format)]
+        filename = filedialog.asksaveasfilename(parent=self, defaultextension=".csv", initialfile="calidad",
+                                                filetypes=filetypes + [("All Files", "*.*")])
+        if not filename:
+            return
+        try:
+            export_writer(filename)(filename, QUALITY_HEADERS, self.visible, table_name="calidad")
+        except Exception as e:
+            print(f"Error al exportar el análisis de calidad: {e}")
+            messagebox.showerror("Error", f"No se pudo exportar: {e}", parent=self)
+            return
+        messagebox.showinfo("Exportar", f"{len(self.visible)} resultados exportados a {filename}", parent=self)
+
+    def on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return
+        values = self.tree.item(item, 'values')
+        if values:
+            self.app.show_document(values[0], values[1])
 
 
 class FirestoreAdminApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, db=None, async_db=None, mirror_path=MIRROR_PATH):
         super().__init__()
         self.withdraw()
         self.splash = SplashScreen(self)
         # Variables que se usan en varias partes de la aplicación
-        self.collections = {
-            "usuarios": ["ID", "Nombre", "Edad", "Peso", "Altura", "Días entrenamiento", "Nivel de Experiencia", "Objetivo Fitness"],
-            "rutinas": ["ID", "Nombre", "Usuario", "Descripción", "Dificultad", "Ejercicios", "Fecha de Creación"],
-            "dietas": ["ID", "Nombre", "Descripción", "Alimentos Permitidos", "Alimentos Prohibidos", "Calorias", "Comidas"]
-        }
-        self.field_mappings = {
-            "usuarios": {
-                "Nombre": "nombre",
-                "Edad": "edad",
-                "Peso": "peso",
-                "Altura": "altura",
-                "Días entrenamiento": "diasEntrenamientoPorSemana",
-                "Nivel de Experiencia": "nivelExperiencia",
-                "Objetivo Fitness": "objetivoFitness"
-            },
-            "rutinas": {
-                "Nombre": "nombre",
-                "Usuario": "usuarioId",
-                "Descripción": "descripcion",
-                "Dificultad": "dificultad",
-                "Ejercicios": "ejercicios",
-                "Fecha de Creación": "fechaCreacion"
-            },
-            "dietas": {
-                "Nombre": "nombre",
-                "Descripción": "descripcion",
-                "Alimentos Permitidos": "alimentosPermitidos",
-                "Alimentos Prohibidos": "alimentosProhibidos",
-                "Calorias": "calorias",
-                "Comidas": "comidas"
-            }
-        }
+        self.collections = COLLECTIONS
+        self.field_mappings = FIELD_MAPPINGS
         self.current_collection = "usuarios"
-        self.current_data = []
+        # Datos de la colección activa y vista actual (posiciones filtradas y ordenadas)
+        self.data = CollectionData(self.collections[self.current_collection],
+                                   key_fields=KEY_FIELDS.get(self.current_collection, ()))
+        self.set_view(array("l"))
+        # Colecciones ya cargadas que no se están mostrando
+        self.datasets = {}
+        self.loading = False
+        # Medición del arranque
+        self.start_time = time.perf_counter()
+        self.first_row_logged = False
+        self.widgets_ready = False
+        self.db = None
+        self.async_db = None
+        # Clientes de Firestore ya creados (por ejemplo, los simulados de benchmarks/); si no hay,
+        # se conecta con las credenciales al arrancar
+        self.injected_db = db
+        self.injected_async_db = async_db
+        # Las lecturas de la interfaz van por el AsyncClient en el bucle de esta capa; el cliente
+        # síncrono queda para el modo en vivo (on_snapshot)
+        self.data_layer = AsyncDataLayer()
+        # Estado de la carga paginada
+        self.load_generation = 0
+        self.load_span = None
+        self.loaded_count = 0
+        self.expected_count = None
+        self.insert_queue = deque()
+        self.insert_job = None
+        self.sync_summary = None
+        self.mirror = LocalMirror(mirror_path)
+        # Estado del modo en vivo (listener on_snapshot)
+        self.listener = None
+        self.live_collection = None
+        self.live_changes = {}
+        self.live_lock = threading.Lock()
+        # Los snapshots se convierten en filas de uno en uno en el bucle de la capa de datos
+        self.live_build_lock = asyncio.Lock()
+        self.live_flush_job = None
+        self.filter_job = None
+        # Documentos completos ya abiertos en detalles: (colección, ID) -> datos
+        self.document_cache = OrderedDict()
+        # Condiciones del filtro avanzado de la colección activa
+        self.advanced_filter = []
+        # Panel de estadísticas abierto (si lo hay) y su refresco pendiente
+        self.dashboard = None
+        self.dashboard_job = None
+        self.diagnostics = None
+        self.quality = None
         self.active_bg = "#3498db"   # Botón activo
         self.inactive_bg = "#34495e" # Botón inactivo
         # threading.Thread(target=self.init_app, daemon=True).start()
@@ -87,26 +3169,32 @@ class FirestoreAdminApp(tk.Tk):
         # Iniciar la función cargando_datos_prints en otro hilo
         # threading.Thread(target=cargando_datos_prints, daemon=True).start()
 
+    @timed("init_app")
     def init_app(self):
-        time.sleep(5)
+        # Firebase se inicializa en este hilo mientras el hilo principal construye la ventana
+        self.after(0, self.setup_main_window)
         try:
-            if not firebase_admin._apps:
-                cred = credentials.Certificate('credencialesFireBase/firebase-credentials.json')
-                firebase_admin.initialize_app(cred)
-            self.db = firestore.client()
+            db = self.injected_db or connect_firestore()
+            async_db = self.injected_async_db or connect_firestore(asynchronous=True)
         except Exception as e:
-            messagebox.showerror("Error de Firebase", f"No se pudo inicializar Firebase: {e}")
-            self.splash.destroy()
+            self.after(0, self.on_firebase_error, e)
             return
-        self.load_user_names()
-        self.after(0, self.setup_main_window)
+        self.after(0, self.on_firebase_ready, db, async_db)
 
-    def setup_main_window(self):
+    def on_firebase_error(self, error):
+        messagebox.showerror("Error de Firebase", f"No se pudo inicializar Firebase: {error}")
         self.splash.destroy()
+
+    def on_firebase_ready(self, db, async_db):
+        self.db = db
+        self.async_db = async_db
+        self.user_names = UserNameResolver(self.db, self.async_db)
+        self.show_main_window()
+
+    def setup_main_window(self):
         self.title("GymRace Admin Panel")
         self.geometry("1200x700")
         self.minsize(1000, 650)
-        self.state('zoomed')
         try:
             self.iconbitmap('icono/gymrace.ico')
         except Exception as e:
@@ -116,21 +3204,72 @@ class FirestoreAdminApp(tk.Tk):
         self.grid_rowconfigure(1, weight=1)
         self.configure(bg="#ecf0f1")
         self.create_widgets()
+        self.widgets_ready = True
+        self.show_main_window()
+
+    def show_main_window(self):
+        # Solo se muestra la ventana cuando están listos tanto los widgets como Firestore
+        if not self.widgets_ready or self.db is None:
+            return
+        self.splash.destroy()
+        self.state('zoomed')
         self.load_data()
+        self.prefetch_collections()
+        self.after_idle(self.log_startup_time, "Tiempo hasta interactivo")
+        self.update_metrics()
+
+    def log_startup_time(self, label):
+        print(f"{label}: {(time.perf_counter() - self.start_time) * 1000:.0f} ms")
+
+    def prefetch_collections(self):
+        # Precarga en paralelo el resto de colecciones para que cambiar entre ellas sea inmediato
+        for collection in self.collections:
+            if collection != self.current_collection:
+                self.data_layer.submit(("precarga", collection), partial(self.prefetch_collection, collection))
+
+    async def prefetch_collection(self, collection):
+        try:
+            cached = await asyncio.to_thread(self.mirror.load, collection)
+            if cached:
+                dataset = CollectionData(self.collections[collection], key_fields=KEY_FIELDS.get(collection, ()))
+                for start in range(0, len(cached), PAGE_SIZE):
+                    dataset.add_rows(await self.build_rows(collection, cached[start:start + PAGE_SIZE]))
+            else:
+                dataset = await self.data_layer.shared(("colección", collection),
+                                                       partial(self.read_dataset, collection))
+            self.after(0, self.on_prefetched, collection, dataset)
+        except Exception as e:
+            print(f"Error precargando {collection}: {e}")
 
-    def load_user_names(self):
+    async def read_dataset(self, collection):
+        # Lectura completa de una colección sin mostrarla; si se abre mientras tanto, la carga de
+        # la tabla espera a esta misma lectura en lugar de empezar otra
+        dataset = CollectionData(self.collections[collection], key_fields=KEY_FIELDS.get(collection, ()))
+        expected = await self.estimate_count(collection)
+        async for rows in self.read_collection_pages(collection, expected):
+            dataset.add_rows(rows)
+        return dataset
+
+    def on_prefetched(self, collection, dataset):
+        # Si el usuario ya abrió la colección mientras se precargaba, nos quedamos con esa carga
+        if collection != self.current_collection and collection not in self.datasets:
+            self.datasets[collection] = dataset
+            print(f"Precargados {len(dataset.store)} registros de {collection}")
+            self.schedule_dashboard_refresh()
+            if any(child == collection for _, child, _ in self.relations()):
+                self.refresh_joined_columns()
+
+    @timed("load_user_names")
+    async def load_user_names(self, user_ids):
+        # Solo se consultan los usuarios que no están ya en la caché ni los está pidiendo otra
+        # carga; devuelve los nombres de esos IDs
         try:
-            self.user_id_to_name = {}
-            users_ref = self.db.collection("usuarios")
-            users = users_ref.stream()
-            for user in users:
-                user_data = user.to_dict()
-                user_id = user.id
-                user_name = user_data.get("nombre", "Usuario sin nombre")
-                self.user_id_to_name[user_id] = user_name
-            # print(f"Caché de nombres de usuarios cargada: {len(self.user_id_to_name)} usuarios")
+            return await self.user_names.table_async(user_ids)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"Error cargando nombres de usuarios: {e}")
+            return UserNameTable()
 
     def create_widgets(self):
         # === HEADER ===
@@ -138,8 +3277,7 @@ class FirestoreAdminApp(tk.Tk):
         header_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
         header_frame.grid_columnconfigure(1, weight=1)
         try:
-            logo_img = Image.open("img/gymrace.png")
-            logo_img = logo_img.resize((60, 60), Image.Resampling.LANCZOS)
+            logo_img = load_scaled_image("img/gymrace.png", (60, 60))
             self.logo_photo = ImageTk.PhotoImage(logo_img)
             logo_label = tk.Label(header_frame, image=self.logo_photo, bg="#2c3e50")
             logo_label.grid(row=0, column=0, padx=20, pady=10)
@@ -151,9 +3289,16 @@ class FirestoreAdminApp(tk.Tk):
         
         # === STATUS BAR ===
         self.status_var = tk.StringVar(value="Listo")
-        status_bar = tk.Label(self, textvariable=self.status_var, font=("Helvetica", 10),
-                              bg="#ecf0f1", relief=tk.SUNKEN, anchor=tk.W, padx=10)
-        status_bar.grid(row=2, column=0, columnspan=2, sticky="ew")
+        status_frame = tk.Frame(self, bg="#ecf0f1", relief=tk.SUNKEN, bd=1)
+        status_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
+        status_bar = tk.Label(status_frame, textvariable=self.status_var, font=("Helvetica", 10),
+                              bg="#ecf0f1", anchor=tk.W, padx=10)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Lecturas de la sesión y duración de la última operación
+        self.metrics_var = tk.StringVar()
+        metrics_label = tk.Label(status_frame, textvariable=self.metrics_var, font=("Helvetica", 10),
+                                 bg="#ecf0f1", fg="#7f8c8d", anchor=tk.E, padx=10)
+        metrics_label.pack(side=tk.RIGHT)
         
         # === MENÚ LATERAL ===
         sidebar_frame = tk.Frame(self, bg="#34495e", width=250)
@@ -175,6 +3320,14 @@ class FirestoreAdminApp(tk.Tk):
                             command=lambda col=collection_id: self.switch_collection(col))
             btn.pack(fill=tk.X, pady=2)
             self.menu_buttons[collection_id] = btn
+        dashboard_btn = tk.Button(collections_frame, text="📈 Estadísticas", bg=self.inactive_bg,
+                                  fg="white", font=("Helvetica", 12), bd=0, padx=15, pady=8,
+                                  anchor="w", width=25, highlightthickness=0, command=self.show_dashboard)
+        dashboard_btn.pack(fill=tk.X, pady=2)
+        quality_btn = tk.Button(collections_frame, text="🧹 Calidad de Datos", bg=self.inactive_bg,
+                                fg="white", font=("Helvetica", 12), bd=0, padx=15, pady=8,
+                                anchor="w", width=25, highlightthickness=0, command=self.show_quality)
+        quality_btn.pack(fill=tk.X, pady=2)
         tk.Frame(sidebar_frame, height=2, bg="#2c3e50").pack(fill=tk.X, padx=15, pady=15)
         # Sección de búsqueda
         search_label = tk.Label(sidebar_frame, text="BUSCAR", font=("Helvetica", 13, "bold"),
@@ -186,13 +3339,18 @@ class FirestoreAdminApp(tk.Tk):
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, font=("Helvetica", 12))
         search_entry.pack(fill=tk.X, pady=5)
         # search_entry.bind("<Return>", lambda e: self.filter_data()) # Filtrar al presionar Enter
-        search_entry.bind("<KeyRelease>", lambda e: self.filter_data()) # Filtrar al escribir
+        search_entry.bind("<KeyRelease>", lambda e: self.schedule_filter()) # Filtrar al escribir
         search_btn = tk.Button(search_frame, text="🔍 Buscar", font=("Helvetica", 12),
                                bg="#3498db", fg="white", command=self.filter_data)
         search_btn.pack(fill=tk.X, pady=5)
-        # advanced_filter_btn = tk.Button(search_frame, text="📊 Filtros Avanzados", font=("Helvetica", 12),
-        #                                 bg="#3498db", fg="white", command=self.show_advanced_filter)
-        # advanced_filter_btn.pack(fill=tk.X, pady=5)
+        advanced_filter_btn = tk.Button(search_frame, text="📊 Filtros Avanzados", font=("Helvetica", 12),
+                                        bg="#3498db", fg="white", command=self.show_advanced_filter)
+        advanced_filter_btn.pack(fill=tk.X, pady=5)
+        # Resumen del filtro avanzado: qué se resolvió en Firestore y qué en local
+        self.filter_summary_var = tk.StringVar()
+        filter_summary = tk.Label(search_frame, textvariable=self.filter_summary_var, font=("Helvetica", 9),
+                                  fg="#ecf0f1", bg="#34495e", justify=tk.LEFT, anchor="w", wraplength=210)
+        filter_summary.pack(fill=tk.X)
         # Operaciones (actualizar y exportar)
         operations_label = tk.Label(sidebar_frame, text="OPERACIONES", font=("Helvetica", 13, "bold"),
                                     fg="white", bg="#34495e")
@@ -200,11 +3358,35 @@ class FirestoreAdminApp(tk.Tk):
         operations_frame = tk.Frame(sidebar_frame, bg="#34495e", padx=15)
         operations_frame.pack(fill=tk.X)
         refresh_btn = tk.Button(operations_frame, text="🔄 Actualizar Datos", font=("Helvetica", 12),
-                                bg="#3498db", fg="white", command=self.load_data)
+                                bg="#3498db", fg="white", command=self.refresh_data)
         refresh_btn.pack(fill=tk.X, pady=5)
+        self.cancel_load_btn = tk.Button(operations_frame, text="⏹ Cancelar Carga", font=("Helvetica", 12),
+                                         bg="#95a5a6", fg="white", state=tk.DISABLED, command=self.cancel_load)
+        self.cancel_load_btn.pack(fill=tk.X, pady=5)
+        self.virtual_mode = tk.BooleanVar(value=True)
+        virtual_check = tk.Checkbutton(operations_frame, text="Tabla virtual", variable=self.virtual_mode,
+                                       font=("Helvetica", 11), fg="white", bg="#34495e", selectcolor="#2c3e50",
+                                       activebackground="#34495e", activeforeground="white", anchor="w",
+                                       command=self.toggle_virtual_mode)
+        virtual_check.pack(fill=tk.X, pady=5)
+        self.live_mode = tk.BooleanVar(value=False)
+        live_check = tk.Checkbutton(operations_frame, text="Modo en vivo", variable=self.live_mode,
+                                    font=("Helvetica", 11), fg="white", bg="#34495e", selectcolor="#2c3e50",
+                                    activebackground="#34495e", activeforeground="white", anchor="w",
+                                    command=self.toggle_live_mode)
+        live_check.pack(fill=tk.X, pady=5)
         export_btn = tk.Button(operations_frame, text="📥 Exportar Datos", font=("Helvetica", 12),
                                bg="#3498db", fg="white", command=self.show_export_options)
         export_btn.pack(fill=tk.X, pady=5)
+        import_btn = tk.Button(operations_frame, text="📂 Importar Datos", font=("Helvetica", 12),
+                               bg="#3498db", fg="white", command=self.show_import_dialog)
+        import_btn.pack(fill=tk.X, pady=5)
+        related_btn = tk.Button(operations_frame, text="🔗 Ver Relacionados", font=("Helvetica", 12),
+                                bg="#3498db", fg="white", command=self.show_view_related)
+        related_btn.pack(fill=tk.X, pady=5)
+        diagnostics_btn = tk.Button(operations_frame, text="🩺 Diagnóstico", font=("Helvetica", 12),
+                                    bg="#3498db", fg="white", command=self.show_diagnostics)
+        diagnostics_btn.pack(fill=tk.X, pady=5)
         
         # === TABLA DE DATOS ===
         table_frame = tk.Frame(self, bd=0)
@@ -212,7 +3394,7 @@ class FirestoreAdminApp(tk.Tk):
         table_frame.grid_rowconfigure(0, weight=1)
         table_frame.grid_columnconfigure(0, weight=1)
         style = ttk.Style()
-        style.configure("Treeview", background="#ffffff", foreground="#333333", rowheight=25,
+        style.configure("Treeview", background="#ffffff", foreground="#333333", rowheight=ROW_HEIGHT,
                         fieldbackground="#ffffff", borderwidth=0)
         style.map('Treeview', background=[('selected', '#3498db')])
         style.configure("Treeview.Heading", font=('Helvetica', 10, 'bold'),
@@ -229,11 +3411,37 @@ class FirestoreAdminApp(tk.Tk):
         h_scrollbar = ttk.Scrollbar(tree_container, orient="horizontal", command=self.tree.xview)
         h_scrollbar.grid(row=1, column=0, sticky="ew")
         self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.virtual_view = VirtualTreeview(self.tree, v_scrollbar)
+        if self.virtual_mode.get():
+            self.virtual_view.enable()
+        self.tree.bind("<Shift-Button-1>", self.on_heading_shift_click)
         self.setup_table_headers()
         self.setup_context_menu()
 
+    def table_headers(self):
+        # Columnas de la colección más las calculadas a partir de colecciones relacionadas
+        return self.collections[self.current_collection] + [header for header, _, _ in self.relations()]
+
+    def relations(self):
+        # (columna calculada, colección hija, campo clave) de la colección activa
+        return [(header, child, field) for parent, header, child, field in RELATIONS
+                if parent == self.current_collection]
+
+    def joined_columns(self):
+        # Columna calculada -> función posición -> valor (p. ej. nº de rutinas de cada usuario)
+        return {header: partial(self.related_count, child, field) for header, child, field in self.relations()}
+
+    def related_count(self, child, field, position):
+        # Se cuenta con el índice de la colección hija ya cargada, sin leer de Firestore; hasta
+        # que esté cargada entera no hay valor
+        dataset = self.dataset_for(child)
+        if dataset is None or not dataset.complete:
+            return None
+        return dataset.get_relation(field).count(self.data.store.ids[position])
+
     def setup_table_headers(self):
-        headers = self.collections[self.current_collection]
+        headers = self.table_headers()
+        joined = self.joined_columns()
         self.tree["columns"] = headers
         base_column_widths = {
             "ID": 210, "Nombre": 150, "Descripción": 400, "Edad": 70,
@@ -241,119 +3449,746 @@ class FirestoreAdminApp(tk.Tk):
             "Nivel de Experiencia": 180, "Objetivo Fitness": 150,
             "Alimentos Permitidos": 400, "Alimentos Prohibidos": 400,
             "Calorias": 100, "Comidas": 270, "Usuario": 150, "Dificultad": 120,
-            "Ejercicios": 300, "Fecha de Creación": 150
+            "Ejercicios": 300, "Fecha de Creación": 150, "Rutinas": 90
         }
-        numeric_columns = ["Edad", "Peso", "Altura", "Días entrenamiento", "Calorias"]
         # Inicializamos el diccionario para la dirección de ordenación
         self.sort_orders = {}
         for header in headers:
             self.sort_orders[header] = True  # True = ascendente, False = descendente
             width = base_column_widths.get(header, 150)
-            anchor = tk.E if header in numeric_columns else tk.W
+            anchor = tk.E if header in NUMERIC_COLUMNS or header in joined else tk.W
             self.tree.heading(header, text=header, anchor=tk.CENTER,
                               command=lambda c=header: self.sort_tree(c))
             self.tree.column(header, width=width, anchor=anchor, minwidth=50, stretch=False)
         # Inicialmente, ningún encabezado muestra flecha
-        self.sorted_column = None
-        self.sorted_direction = None
+        self.sort_spec = []
 
-    def sort_tree(self, col):
-        headers = self.collections[self.current_collection]
-        col_index = headers.index(col)
-        # Obtenemos el orden actual para la columna (True = ascendente)
-        current_order = self.sort_orders[col]
-        try:
-            # Intentamos ordenar numéricamente
-            self.current_data.sort(
-                key=lambda row: float(row[col_index]) if row[col_index] != 'N/A' else float('inf'),
-                reverse=not current_order
-            )
-        except ValueError:
-            # Si no es numérico, se ordena como cadenas
-            self.current_data.sort(
-                key=lambda row: row[col_index],
-                reverse=not current_order
-            )
-        # Guardamos la columna ordenada y la dirección usada
-        self.sorted_column = col
-        self.sorted_direction = "asc" if current_order else "desc"
-        # Alternamos el orden para el siguiente clic
-        self.sort_orders[col] = not current_order
-        self.populate_tree()
+    def on_heading_shift_click(self, event):
+        # Mayús + clic en una cabecera añade esa columna a la ordenación actual
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return None
+        column = self.tree.identify_column(event.x)
+        headers = self.table_headers()
+        index = int(column.lstrip("#")) - 1
+        if 0 <= index < len(headers):
+            self.sort_tree(headers[index], add=True)
+        return "break"
+
+    @timed("sort_tree")
+    def sort_tree(self, col, add=False):
+        sorted_columns = [header for header, _ in self.sort_spec]
+        if add and col in sorted_columns:
+            # La columna ya estaba en la ordenación múltiple: invertimos su sentido
+            position = sorted_columns.index(col)
+            self.sort_spec[position] = (col, not self.sort_spec[position][1])
+        elif add:
+            self.sort_spec.append((col, True))
+        else:
+            # Obtenemos el orden actual para la columna (True = ascendente)
+            current_order = self.sort_orders[col]
+            self.sort_spec = [(col, current_order)]
+            # Alternamos el orden para el siguiente clic
+            self.sort_orders[col] = not current_order
+        self.apply_sort()
+        self.show_sorted_rows()
         self.update_headers()
-        self.status_var.set(f"Ordenado por {col} ({self.sorted_direction})")
+        description = ", ".join(f"{header} ({'asc' if ascending else 'desc'})" for header, ascending in self.sort_spec)
+        self.status_var.set(f"Ordenado por {description}")
+
+    def set_view(self, positions):
+        # current_data es una vista sobre el almacén: no copia filas, solo posiciones
+        self.current_view = positions
+        self.current_data = self.data.store.view(positions, list(self.joined_columns().values()))
+
+    def apply_sort(self):
+        if not self.sort_spec:
+            return
+        order = self.data.sort_keys.permutation(self.sort_spec, self.joined_columns())
+        if len(self.current_view) == len(self.data.store):
+            self.set_view(array("l", order))
+        else:
+            visible = set(self.current_view)
+            self.set_view(array("l", [position for position in order if position in visible]))
+
+    def show_sorted_rows(self):
+        if self.virtual_mode.get():
+            self.virtual_view.set_rows(self.current_data)
+        elif self.insert_queue or len(self.tree.get_children()) != len(self.current_data):
+            self.populate_tree()
+        else:
+            # Reordenamos los elementos existentes en lugar de borrarlos y volver a insertarlos
+            ids = self.data.store.ids
+            for index, position in enumerate(self.current_view):
+                self.tree.move(ids[position], "", index)
 
     def update_headers(self):
-        headers = self.collections[self.current_collection]
+        headers = self.table_headers()
+        sorted_columns = [header for header, _ in self.sort_spec]
         for header in headers:
             arrow = ""
-            if self.sorted_column == header:
-                arrow = " ↑" if self.sorted_direction == "asc" else " ↓"
+            if header in sorted_columns:
+                position = sorted_columns.index(header)
+                arrow = " ↑" if self.sort_spec[position][1] else " ↓"
+                if len(sorted_columns) > 1:
+                    arrow += str(position + 1)
             new_text = header + arrow
             # Actualizamos el encabezado con la flecha correspondiente
             self.tree.heading(header, text=new_text,
                               command=lambda c=header: self.sort_tree(c))
             
+    async def build_rows(self, collection, documents):
+        if collection == "rutinas":
+            names = await self.load_user_names([data.get("usuarioId", "") for _, data in documents])
+        else:
+            names = prepare_user_names(collection, documents, self.user_names)
+        return [build_row(collection, doc_id, data, names) for doc_id, data in documents]
+
     def load_data(self):
+        self.datasets.pop(self.current_collection, None)
+        self.start_load(self.fetch_pages, "load_data")
+        self.data = CollectionData(self.collections[self.current_collection], complete=False,
+                                   key_fields=KEY_FIELDS.get(self.current_collection, ()))
+        self.set_view(array("l"))
+        self.loaded_count = 0
+        self.expected_count = None
+        self.populate_tree()
+        self.status_var.set(f"Cargando {self.current_collection}...")
+
+    def refresh_data(self):
+        # Una tabla leída con filtros en Firestore se vuelve a consultar con los mismos filtros
+        if self.data.pushed:
+            self.load_filtered(self.data.pushed)
+            return
+        # Con la tabla ya cargada, "Actualizar" solo trae los cambios desde la última sincronización
+        if not len(self.data.store) or self.loading:
+            self.load_data()
+            return
+        self.start_load(self.sync_delta, "refresh_data")
+        self.status_var.set(f"Sincronizando {self.current_collection}...")
+
+    def start_load(self, loader, span_name):
+        # La tabla es una sola vista: su nueva tarea cancela la carga anterior si seguía en curso.
+        # La carga es asíncrona: su tiempo se mide desde aquí hasta on_load_finished
+        self.load_span = (span_name, time.perf_counter())
+        self.load_generation += 1
+        self.loading = True
+        self.cancel_load_btn.config(state=tk.NORMAL)
+        self.data_layer.submit("tabla", partial(self.run_load, loader, self.current_collection,
+                                                self.load_generation))
+
+    async def run_load(self, loader, collection, generation):
+        # Se ejecuta en el bucle de la capa de datos; el final, la cancelación o el error se
+        # comunican a la interfaz con after()
         try:
-            # Vaciar la tabla
-            for row in self.tree.get_children():
-                self.tree.delete(row)
-            field_mapping = self.field_mappings.get(self.current_collection, {})
-            collection_ref = self.db.collection(self.current_collection)
-            docs = collection_ref.stream()
-            self.all_data = []
-            for doc in docs:
-                data = doc.to_dict()
-                row = [str(doc.id)]
-                for header in self.collections[self.current_collection][1:]:
-                    firestore_field = field_mapping.get(header, header.lower())
-                    if self.current_collection == "rutinas" and header == "Usuario":
-                        user_id = data.get("usuarioId", "")
-                        user_name = self.user_id_to_name.get(user_id, "N/A")
-                        row.append(user_name)
-                    else:
-                        val = data.get(firestore_field, 'N/A')
-                        row.append(str(val))
-                self.all_data.append(row)
-            # Inicialmente se muestran todos los datos
-            self.current_data = self.all_data.copy()
-            self.populate_tree()
-            self.status_var.set(f"Cargandos {len(self.current_data)} registros")
-            print(f"Cargados {len(self.current_data)} datos")
+            await loader(collection, generation)
+        except asyncio.CancelledError:
+            self.after(0, self.on_load_finished, generation, True)
+            raise
+        except Exception as e:
+            self.after(0, self.on_load_error, generation, e)
+        else:
+            self.after(0, self.on_load_finished, generation, False)
+
+    async def fetch_pages(self, collection, generation):
+        # Rellena la tabla desde el espejo local si existe y después sincroniza solo los cambios;
+        # si no, lee la colección completa por páginas
+        if self.data_layer.in_flight(("colección", collection)):
+            # La precarga ya está leyendo esta colección (y rellenando el espejo): se espera a
+            # ella y se muestra entera
+            dataset = await self.data_layer.shared(("colección", collection),
+                                                   partial(self.read_dataset, collection))
+            self.after(0, self.on_dataset_loaded, generation, dataset)
+            return
+        cached = await asyncio.to_thread(self.mirror.load, collection)
+        if cached:
+            self.after(0, self.on_count_estimated, generation, len(cached))
+            for start in range(0, len(cached), PAGE_SIZE):
+                rows = await self.build_rows(collection, cached[start:start + PAGE_SIZE])
+                self.after(0, self.on_page_loaded, generation, rows)
+            await self.sync_delta(collection, generation)
+            return
+        expected = await self.estimate_count(collection)
+        self.after(0, self.on_count_estimated, generation, expected)
+        async for rows in self.read_collection_pages(collection, expected):
+            self.after(0, self.on_page_loaded, generation, rows)
+
+    async def read_collection_pages(self, collection, expected=None):
+        # Páginas de filas de la colección completa. Las colecciones grandes se leen por rangos de
+        # IDs en paralelo; las páginas llegan sin ordenar
+        collection_ref = self.async_db.collection(collection)
+        fields = list_fields(collection)
+        if expected and expected >= PARALLEL_LOAD_MIN_DOCS:
+            async for rows in aiter_parallel_rows(collection_ref, fields, collection, self.user_names,
+                                                  on_docs=partial(self.on_docs_read, collection)):
+                yield rows
+            return
+        async for docs in aiter_pages(collection_ref.select(fields)):
+            await asyncio.to_thread(self.on_docs_read, collection, docs)
+            yield await self.build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs])
+
+    def on_docs_read(self, collection, docs):
+        # Se ejecuta en hilos auxiliares para no parar el bucle con SQLite
+        metrics.count_reads(collection, len(docs))
+        self.mirror.upsert(collection, docs)
+
+    def load_filtered(self, pushed):
+        # Lee de Firestore solo los documentos que cumplen las condiciones enviadas; la colección
+        # completa (si estaba cargada) se guarda para recuperarla al quitar los filtros
+        if not self.data.pushed and self.data.complete and not self.loading:
+            self.datasets[self.current_collection] = self.data
+        self.start_load(partial(self.fetch_filtered, pushed), "load_filtered")
+        self.data = CollectionData(self.collections[self.current_collection], complete=False, pushed=pushed,
+                                   key_fields=KEY_FIELDS.get(self.current_collection, ()))
+        self.set_view(array("l"))
+        self.loaded_count = 0
+        self.expected_count = None
+        self.populate_tree()
+        self.status_var.set(f"Consultando {self.current_collection} con filtros...")
+
+    async def fetch_filtered(self, pushed, collection, generation):
+        # No se guarda en el espejo local: es solo una parte de la colección
+        query = self.async_db.collection(collection).select(list_fields(collection))
+        query, order_field = apply_pushdown(query, collection, pushed)
+        async for docs in aiter_pages(query, order_field):
+            metrics.count_reads(collection, len(docs))
+            rows = await self.build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs])
+            self.after(0, self.on_page_loaded, generation, rows)
+
+    async def sync_delta(self, collection, generation):
+        # Pone al día el espejo local. Si todos los documentos tienen UPDATED_FIELD se piden solo
+        # los modificados desde la última sincronización y un recuento dice si hay bajas; solo
+        # entonces (o si hace más de SYNC_FULL_CHECK_INTERVAL de la última comprobación) se
+        # recorren los IDs. Sin ese campo Firestore no permite filtrar por el update_time de los
+        # documentos: se recorren todos los IDs con la proyección vacía, que Firestore cobra como
+        # una lectura por documento, y se descargan los que han cambiado
+        collection_ref = self.async_db.collection(collection)
+        local_times = await asyncio.to_thread(self.mirror.update_times, collection)
+        watermark = await asyncio.to_thread(self.mirror.get_watermark, collection)
+        upserts = []
+        if watermark is not None:
+            # Con >= también llegan los documentos modificados en el mismo instante que la marca;
+            # los que ya están en el espejo con ese update_time se descartan. Un documento que
+            # cambia durante la paginación puede llegar dos veces: se queda la última versión
+            query = collection_ref.select(list_fields(collection)).where(UPDATED_FIELD, ">=", watermark)
+            changed = {}
+            async for docs in aiter_pages(query, UPDATED_FIELD):
+                metrics.count_reads(collection, len(docs), "sincronización")
+                for doc in docs:
+                    if local_times.get(doc.id) != format_update_time(doc.update_time):
+                        changed[doc.id] = doc
+            docs = list(changed.values())
+            await asyncio.to_thread(self.mirror.upsert, collection, docs)
+            upserts = await self.build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs])
+            new_ids = [doc_id for doc_id in changed if doc_id not in local_times]
+            # Las bajas no aparecen en esa consulta. Si el recuento no cuadra hay alguna; si cuadra
+            # puede haber una baja compensada por un alta, así que de vez en cuando se comprueban
+            # los IDs igualmente
+            checked_at = await asyncio.to_thread(self.mirror.get_checked_at, collection)
+            removed_ids = []
+            if (checked_at is None or time.time() - checked_at >= SYNC_FULL_CHECK_INTERVAL
+                    or await self.count_documents(collection) != len(local_times) + len(new_ids)):
+                checked_at = time.time()
+                remote_ids = await self.remote_ids(collection)
+                removed_ids = [doc_id for doc_id in local_times if doc_id not in remote_ids]
+                await asyncio.to_thread(self.mirror.set_checked_at, collection, checked_at)
+        else:
+            checked_at = time.time()
+            remote_ids = set()
+            changed_ids = []
+            async for docs in aiter_pages(collection_ref.select([])):
+                metrics.count_reads(collection, len(docs), "sincronización")
+                for doc in docs:
+                    remote_ids.add(doc.id)
+                    if local_times.get(doc.id) != format_update_time(doc.update_time):
+                        changed_ids.append(doc.id)
+            removed_ids = [doc_id for doc_id in local_times if doc_id not in remote_ids]
+            for start in range(0, len(changed_ids), GET_ALL_BATCH_SIZE):
+                refs = [collection_ref.document(doc_id) for doc_id in changed_ids[start:start + GET_ALL_BATCH_SIZE]]
+                metrics.count_reads(collection, len(refs))
+                docs = [doc async for doc in self.async_db.get_all(refs, field_paths=list_fields(collection))
+                        if doc.exists]
+                await asyncio.to_thread(self.mirror.upsert, collection, docs)
+                upserts.extend(await self.build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs]))
+            await asyncio.to_thread(self.mirror.set_checked_at, collection, checked_at)
+        await asyncio.to_thread(self.mirror.delete, collection, removed_ids)
+        if collection == "usuarios":
+            self.user_names.invalidate(removed_ids)
+        self.after(0, self.on_delta_synced, generation, upserts, removed_ids)
+
+    async def remote_ids(self, collection):
+        # IDs de todos los documentos (proyección vacía): una lectura facturada por documento
+        ids = set()
+        async for docs in aiter_pages(self.async_db.collection(collection).select([])):
+            metrics.count_reads(collection, len(docs), "sincronización")
+            ids.update(doc.id for doc in docs)
+        return ids
+
+    async def estimate_count(self, collection):
+        # Las cargas y precargas de la misma colección comparten una única consulta de recuento
+        try:
+            return await self.data_layer.shared(("recuento", collection), partial(self.count_documents, collection))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            messagebox.showerror("Error de Carga", f"No se pudieron cargar los datos: {e}")
+            print(f"No se pudo estimar el tamaño de la colección: {e}")
+            return None
+
+    async def count_documents(self, collection):
+        result = await self.async_db.collection(collection).count().get()
+        count_aggregation_reads(collection, result[0][0].value)
+        return result[0][0].value
+
+    def on_count_estimated(self, generation, count):
+        if generation == self.load_generation:
+            self.expected_count = count
+
+    def on_page_loaded(self, generation, rows):
+        # Ignoramos páginas de cargas antiguas o canceladas
+        if generation != self.load_generation or not self.loading:
+            return
+        # El listener en vivo puede haber añadido ya alguna de estas filas; add_rows las ignora
+        positions = self.data.add_rows(rows)
+        self.loaded_count += len(positions)
+        if positions and not self.first_row_logged:
+            self.first_row_logged = True
+            self.after_idle(self.log_startup_time, "Tiempo hasta la primera fila")
+        visible = self.matching_positions(positions)
+        self.current_view.extend(visible)
+        self.schedule_dashboard_refresh()
+        if self.virtual_mode.get():
+            self.virtual_view.set_rows(self.current_data, keep_offset=True)
+        else:
+            self.insert_queue.extend(visible)
+            self.schedule_insert()
+        if self.expected_count:
+            self.status_var.set(f"Cargados {self.loaded_count} de ~{self.expected_count} registros")
+        else:
+            self.status_var.set(f"Cargados {self.loaded_count} registros")
+
+    def on_load_finished(self, generation, cancelled):
+        if generation != self.load_generation:
+            return
+        self.loading = False
+        self.cancel_load_btn.config(state=tk.DISABLED)
+        if cancelled:
+            self.status_var.set(f"Carga cancelada: {self.loaded_count} registros cargados")
+            return
+        self.data.complete = not self.data.pushed
+        self.schedule_dashboard_refresh()
+        # Reaplicamos el orden elegido durante la carga; sin orden, la tabla queda por ID (las
+        # lecturas en paralelo llegan desordenadas)
+        if self.sort_spec:
+            self.apply_sort()
+            self.show_sorted_rows()
+        else:
+            ids = self.data.store.ids
+            view = self.current_view
+            if any(ids[a] > ids[b] for a, b in zip(view, islice(view, 1, None))):
+                self.set_view(array("l", sorted(view, key=ids.__getitem__)))
+                self.show_sorted_rows()
+        if self.sync_summary:
+            self.status_var.set(f"Cargados {len(self.data.store)} registros (sincronizados: {self.sync_summary})")
+            self.sync_summary = None
+        else:
+            self.status_var.set(f"Cargados {len(self.data.store)} registros")
+        span_name, started = self.load_span
+        elapsed = time.perf_counter() - started
+        metrics.record_span(span_name, elapsed)
+        print(f"Cargados {len(self.data.store)} datos en {elapsed:.2f} s "
+              f"({metrics.reads.get(self.current_collection, 0)} lecturas de {self.current_collection} en la sesión)")
+
+    def on_dataset_loaded(self, generation, dataset):
+        # La colección llegó completa desde una precarga que seguía en curso
+        if generation != self.load_generation or not self.loading:
+            return
+        self.restore_dataset(dataset)
+        self.loaded_count = len(dataset.store)
+        self.filter_data()
+        self.schedule_dashboard_refresh()
+
+    def on_delta_synced(self, generation, upserts, removed_ids):
+        if generation != self.load_generation:
+            return
+        self.apply_row_changes(upserts, removed_ids)
+        self.sync_summary = f"{len(upserts)} actualizados, {len(removed_ids)} eliminados"
+
+    def apply_row_changes(self, upserts, removed_ids):
+        # Aplica altas, modificaciones y bajas de filas sin recargar la tabla completa
+        for doc_id in [row[0] for row in upserts] + list(removed_ids):
+            self.document_cache.pop((self.current_collection, doc_id), None)
+        touched = self.data.upsert_rows(upserts)
+        removed = self.data.remove_ids(removed_ids)
+        if not touched and not removed:
+            return
+        self.schedule_dashboard_refresh()
+        current = set(self.current_view)
+        hidden = set(removed)
+        new_positions = []
+        matching = set(self.matching_positions(touched))
+        for position in touched:
+            matches = position in matching
+            if position in current and not matches:
+                hidden.add(position)
+            elif position not in current and matches:
+                new_positions.append(position)
+        view = self.current_view
+        if hidden:
+            view = array("l", [position for position in view if position not in hidden])
+        view.extend(new_positions)
+        self.set_view(view)
+        self.apply_sort()
+        if self.virtual_mode.get():
+            self.virtual_view.set_rows(self.current_data, keep_offset=True)
+            return
+        # En la tabla clásica cada elemento usa el ID del documento como iid
+        ids = self.data.store.ids
+        for position in hidden:
+            if self.tree.exists(ids[position]):
+                self.tree.delete(ids[position])
+        index_of = {position: i for i, position in enumerate(self.current_view)}
+        for position in sorted((p for p in touched if p not in hidden), key=index_of.__getitem__):
+            doc_id = ids[position]
+            values = self.current_data.row(position)
+            if self.tree.exists(doc_id):
+                self.tree.item(doc_id, values=values)
+                self.tree.move(doc_id, "", index_of[position])
+            else:
+                self.tree.insert("", index_of[position], iid=doc_id, values=values)
+
+    def toggle_live_mode(self):
+        if self.live_mode.get():
+            self.start_listener()
+            self.status_var.set(f"Modo en vivo activado en {self.current_collection}")
+        else:
+            self.stop_listener()
+            self.status_var.set("Modo en vivo desactivado")
+
+    def start_listener(self):
+        self.stop_listener()
+        collection = self.current_collection
+        self.live_collection = collection
+        # Misma proyección que las cargas: los campos pesados no se descargan y las filas no cambian
+        self.listener = self.db.collection(collection).select(list_fields(collection)).on_snapshot(
+            lambda snapshots, changes, read_time: self.on_snapshot(collection, changes))
+
+    def stop_listener(self):
+        if self.listener:
+            self.listener.unsubscribe()
+            self.listener = None
+        self.live_collection = None
+        with self.live_lock:
+            self.live_changes = {}
+
+    def on_snapshot(self, collection, changes):
+        # Se ejecuta en el hilo del listener: guardamos los cambios en el espejo y dejamos la
+        # conversión en filas al bucle de la capa de datos sin esperarla, para no retener al listener
+        metrics.count_reads(collection, len(changes), "modo en vivo")
+        upserted = [change.document for change in changes if change.type.name != "REMOVED"]
+        removed = [change.document.id for change in changes if change.type.name == "REMOVED"]
+        self.mirror.upsert(collection, upserted)
+        self.mirror.delete(collection, removed)
+        if collection == "usuarios":
+            self.user_names.invalidate(removed)
+        documents = [(doc.id, project_document(collection, doc.to_dict())) for doc in upserted]
+        self.data_layer.post(self.queue_live_changes(collection, documents, removed))
+
+    async def queue_live_changes(self, collection, documents, removed):
+        # Acumulamos los cambios y pedimos un único refresco. El candado atiende por orden de
+        # llegada, así que una versión antigua de un documento no pisa a otra más nueva
+        async with self.live_build_lock:
+            try:
+                rows = await self.build_rows(collection, documents)
+            except Exception as e:
+                print(f"Error al procesar los cambios en vivo de {collection}: {e}")
+                return
+            with self.live_lock:
+                if collection != self.live_collection:
+                    return
+                for row in rows:
+                    self.live_changes[row[0]] = row
+                for doc_id in removed:
+                    self.live_changes[doc_id] = None
+                if self.live_flush_job is None:
+                    self.live_flush_job = self.after(LIVE_FRAME_MS, self.flush_live_changes)
+
+    def flush_live_changes(self):
+        with self.live_lock:
+            changes = self.live_changes
+            self.live_changes = {}
+            self.live_flush_job = None
+        if not changes or self.live_collection != self.current_collection:
+            return
+        upserts = [row for row in changes.values() if row is not None]
+        removed_ids = [doc_id for doc_id, row in changes.items() if row is None]
+        self.apply_row_changes(upserts, removed_ids)
+        self.status_var.set(f"En vivo: {len(upserts)} cambios y {len(removed_ids)} eliminados aplicados "
+                            f"({len(self.current_data)} registros visibles)")
+
+    def on_load_error(self, generation, error):
+        if generation != self.load_generation:
+            return
+        self.loading = False
+        self.cancel_load_btn.config(state=tk.DISABLED)
+        messagebox.showerror("Error de Carga", f"No se pudieron cargar los datos: {error}")
+
+    def cancel_load(self):
+        if self.loading:
+            self.data_layer.cancel("tabla")
+            self.loading = False
+            self.cancel_load_btn.config(state=tk.DISABLED)
+            self.status_var.set(f"Carga cancelada: {self.loaded_count} registros cargados")
 
+    @timed("populate_tree")
     def populate_tree(self):
+        if self.virtual_mode.get():
+            # En modo virtual no se crean elementos por fila: solo se recicla la ventana visible
+            self.insert_queue.clear()
+            self.virtual_view.set_rows(self.current_data)
+            return
         self.tree.delete(*self.tree.get_children())
-        for row_data in self.current_data:
-            self.tree.insert("", tk.END, values=row_data)
+        self.insert_queue = deque(self.current_view)
+        self.schedule_insert()
+
+    def toggle_virtual_mode(self):
+        if self.virtual_mode.get():
+            self.virtual_view.enable()
+        else:
+            self.virtual_view.disable()
+        self.populate_tree()
 
+    def schedule_insert(self):
+        if self.insert_job is None and self.insert_queue:
+            self.insert_job = self.after(1, self.insert_batch)
+
+    def insert_batch(self):
+        # Insertamos pocas filas por ciclo para que la ventana siga respondiendo
+        self.insert_job = None
+        for _ in range(min(INSERT_BATCH_SIZE, len(self.insert_queue))):
+            row = self.current_data.row(self.insert_queue.popleft())
+            if not self.tree.exists(row[0]):
+                self.tree.insert("", tk.END, iid=row[0], values=row)
+        self.schedule_insert()
+
+    def matching_positions(self, positions):
+        # Posiciones (en el mismo orden) que cumplen la búsqueda y el filtro avanzado
+        search_term = self.search_var.get().strip()
+        if search_term:
+            positions = [position for position in positions if self.data.search_index.matches(position, search_term)]
+        if self.advanced_filter:
+            return filter_positions(self.data.store, self.advanced_filter, positions)
+        return array("l", positions)
+
+    def schedule_filter(self):
+        # Esperamos a que el usuario deje de escribir antes de filtrar
+        if self.filter_job:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(SEARCH_DEBOUNCE_MS, self.filter_data)
+
+    @timed("filter_data")
     def filter_data(self):
-        search_term = self.search_var.get().strip().lower()
+        if self.filter_job:
+            self.after_cancel(self.filter_job)
+            self.filter_job = None
+        search_term = self.search_var.get().strip()
         if not search_term:
-            self.current_data = self.all_data.copy()
+            positions = self.data.store.live_positions()
         else:
-            self.current_data = [
-                row for row in self.all_data
-                if any(search_term in str(cell).lower() for cell in row)
-            ]
+            positions = array("l", sorted(self.data.search_index.search(search_term)))
+        # Las condiciones enviadas a Firestore se comprueban también aquí: el modo en vivo
+        # puede traer documentos que no las cumplen
+        if self.advanced_filter:
+            positions = filter_positions(self.data.store, self.advanced_filter, positions)
+        self.set_view(positions)
+        self.apply_sort()
         self.populate_tree()
         self.status_var.set(f"Mostrando {len(self.current_data)} registros (filtrados)")
 
+    def dataset_for(self, collection):
+        # Datos cargados de una colección, se esté mostrando o no
+        if collection == self.current_collection:
+            return self.data
+        return self.datasets.get(collection)
+
+    def show_dashboard(self):
+        if self.dashboard and self.dashboard.winfo_exists():
+            self.dashboard.lift()
+            return
+        self.dashboard = StatsDashboard(self)
+
+    def show_quality(self):
+        if self.quality and self.quality.winfo_exists():
+            self.quality.lift()
+            return
+        self.quality = QualityPanel(self)
+
+    def show_document(self, collection, doc_id):
+        # Lleva la tabla a un registro concreto: cambia de colección y lo busca por su ID
+        self.switch_collection(collection)
+        self.search_var.set(doc_id)
+        self.filter_data()
+        self.lift()
+
+    def schedule_dashboard_refresh(self):
+        # Las estadísticas se actualizan con los acumuladores; agrupamos los refrescos de la vista
+        if self.dashboard and self.dashboard.winfo_exists() and self.dashboard_job is None:
+            self.dashboard_job = self.after(STATS_REFRESH_MS, self.refresh_dashboard)
+
+    def refresh_dashboard(self):
+        self.dashboard_job = None
+        if self.dashboard and self.dashboard.winfo_exists():
+            self.dashboard.refresh()
+
+    def show_diagnostics(self):
+        if self.diagnostics and self.diagnostics.winfo_exists():
+            self.diagnostics.lift()
+            return
+        self.diagnostics = DiagnosticsPanel(self)
+
+    def update_metrics(self):
+        # Refresco periódico de la barra de estado y del panel de diagnóstico
+        _, _, last_span = metrics.snapshot()
+        text = f"Lecturas en la sesión: {metrics.total_reads()}"
+        if last_span:
+            text += f" · {last_span[0]}: {last_span[1] * 1000:.0f} ms"
+        self.metrics_var.set(text)
+        if self.diagnostics and self.diagnostics.winfo_exists():
+            self.diagnostics.refresh()
+        self.after(METRICS_REFRESH_MS, self.update_metrics)
+
+    def show_advanced_filter(self):
+        filter_window = tk.Toplevel(self)
+        filter_window.title("Filtros Avanzados")
+        filter_window.geometry("560x480")
+        filter_window.minsize(500, 420)
+        filter_window.transient(self)
+        filter_window.grab_set()
+        collection = self.current_collection
+        headers = self.collections[collection][1:]
+        conditions = list(self.advanced_filter)
+        tk.Label(filter_window, text=f"Filtros de {collection.capitalize()}",
+                 font=("Helvetica", 14, "bold")).pack(pady=(15, 10))
+        builder_frame = tk.Frame(filter_window, padx=15)
+        builder_frame.pack(fill=tk.X)
+        column_var = tk.StringVar(value=headers[0])
+        operator_var = tk.StringVar(value="==")
+        value_var = tk.StringVar()
+        ttk.Combobox(builder_frame, textvariable=column_var, values=headers, state="readonly",
+                     width=20).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Combobox(builder_frame, textvariable=operator_var, values=FILTER_OPERATORS, state="readonly",
+                     width=9).pack(side=tk.LEFT, padx=5)
+        value_entry = ttk.Entry(builder_frame, textvariable=value_var, width=18)
+        value_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        tk.Label(filter_window, text="Para 'entre' escribe los dos límites, por ejemplo: 20 y 30",
+                 font=("Helvetica", 9), fg="gray").pack(anchor="w", padx=15)
+        conditions_list = tk.Listbox(filter_window, height=8, font=("Helvetica", 11))
+        conditions_list.pack(fill=tk.BOTH, expand=True, padx=15, pady=10)
+        query_server = tk.BooleanVar(value=not self.data.complete or bool(self.data.pushed))
+        plan_var = tk.StringVar()
+
+        def refresh_conditions():
+            conditions_list.delete(0, tk.END)
+            for condition in conditions:
+                conditions_list.insert(tk.END, describe_condition(condition))
+            pushed, local = plan_filter(collection, conditions) if query_server.get() else ([], conditions)
+            plan_var.set(describe_plan(pushed, local, query_server.get(), collection))
+
+        def add_condition():
+            try:
+                condition = parse_condition(column_var.get(), operator_var.get(), value_var.get())
+            except ValueError as e:
+                messagebox.showerror("Filtro no válido", str(e), parent=filter_window)
+                return
+            conditions.append(condition)
+            value_var.set("")
+            refresh_conditions()
+
+        def remove_condition():
+            for index in reversed(conditions_list.curselection()):
+                del conditions[index]
+            refresh_conditions()
+
+        def apply_filter(new_conditions):
+            filter_window.destroy()
+            self.apply_advanced_filter(new_conditions, query_server.get())
+
+        tk.Button(builder_frame, text="Añadir", bg="#3498db", fg="white",
+                  command=add_condition).pack(side=tk.LEFT, padx=(5, 0))
+        value_entry.bind("<Return>", lambda e: add_condition())
+        tk.Checkbutton(filter_window, text="Consultar en Firestore (solo se leen los documentos que cumplen "
+                                           "las condiciones que se pueden enviar)",
+                       variable=query_server, command=refresh_conditions, wraplength=520,
+                       justify=tk.LEFT).pack(anchor="w", padx=15)
+        tk.Label(filter_window, textvariable=plan_var, font=("Helvetica", 10), fg="#2c3e50",
+                 justify=tk.LEFT, anchor="w", wraplength=520).pack(fill=tk.X, padx=15, pady=5)
+        buttons_frame = tk.Frame(filter_window, pady=10)
+        buttons_frame.pack()
+        tk.Button(buttons_frame, text="Quitar seleccionada", command=remove_condition).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons_frame, text="Quitar filtros", command=lambda: apply_filter([])).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons_frame, text="Aplicar", bg="#2ecc71", fg="white",
+                  command=lambda: apply_filter(conditions)).pack(side=tk.LEFT, padx=5)
+        refresh_conditions()
+
+    def apply_advanced_filter(self, conditions, query_server):
+        self.advanced_filter = list(conditions)
+        pushed, local = plan_filter(self.current_collection, self.advanced_filter) if query_server \
+            else ([], self.advanced_filter)
+        self.filter_summary_var.set(describe_plan(pushed, local, query_server, self.current_collection)
+                                    if self.advanced_filter else "")
+        if pushed:
+            self.load_filtered(pushed)
+        elif self.data.pushed:
+            # Se vuelve a la colección completa: la guardada si la hay o una carga nueva
+            if self.loading:
+                self.cancel_load()
+            dataset = self.datasets.pop(self.current_collection, None)
+            if dataset and dataset.complete:
+                self.restore_dataset(dataset)
+                self.filter_data()
+                self.refresh_data()
+            else:
+                self.load_data()
+        else:
+            self.filter_data()
+
     def switch_collection(self, collection_id):
         if collection_id == self.current_collection:
             return
+        previous_collection = self.current_collection
         self.current_collection = collection_id
         # Actualizar los botones del menú
         for col_id, btn in self.menu_buttons.items():
             btn.config(bg=self.active_bg if col_id == collection_id else self.inactive_bg)
-        if collection_id == "rutinas":
-            self.load_user_names()
+        self.stop_listener()
+        self.stash_dataset(previous_collection)
+        self.advanced_filter = []
+        self.filter_summary_var.set("")
+        self.schedule_dashboard_refresh()
         self.setup_table_headers()
-        self.load_data()
+        dataset = self.datasets.pop(collection_id, None)
+        if dataset and dataset.complete:
+            # La colección ya estaba cargada: la mostramos al momento y sincronizamos solo los cambios
+            self.restore_dataset(dataset)
+            self.filter_data()
+            self.refresh_data()
+        else:
+            self.load_data()
+        if self.live_mode.get():
+            self.start_listener()
         self.status_var.set(f"Colección cambiada a: {collection_id.capitalize()}")
 
+    def stash_dataset(self, collection):
+        # Guardamos lo cargado de la colección que se deja de mostrar; si la carga inicial no
+        # había terminado queda marcada como incompleta y la próxima vez se vuelve a cargar
+        if self.loading:
+            self.cancel_load()
+        # Una lectura filtrada no sustituye a la colección completa que ya estuviera guardada
+        if not self.data.pushed or collection not in self.datasets:
+            self.datasets[collection] = self.data
+
+    def restore_dataset(self, dataset):
+        self.data = dataset
+        self.set_view(dataset.store.live_positions())
+
     def show_export_options(self):
         if not self.current_data:
             messagebox.showinfo("Exportar", "No hay datos para exportar")
@@ -362,7 +4197,7 @@ class FirestoreAdminApp(tk.Tk):
         # Crear ventana de opciones de exportación
         export_window = tk.Toplevel(self)
         export_window.title("Opciones de Exportación")
-        export_window.geometry("400x300")
+        export_window.geometry("420x560")
         export_window.resizable(False, False)
         export_window.transient(self)
         export_window.grab_set()
@@ -416,6 +4251,40 @@ class FirestoreAdminApp(tk.Tk):
                                font=("Helvetica", 12), anchor="w", padx=10)
         db_btn.pack(fill=tk.X, pady=5)
         
+        ndjson_btn = tk.Radiobutton(formats_frame, text="NDJSON (un registro por línea)", 
+                                   variable=self.export_format, value="ndjson", 
+                                   font=("Helvetica", 12), anchor="w", padx=10)
+        ndjson_btn.pack(fill=tk.X, pady=5)
+        
+        # Parquet y Arrow solo si está instalado pyarrow
+        parquet_btn = tk.Radiobutton(formats_frame, text="Parquet (análisis por columnas)", 
+                                    variable=self.export_format, value="parquet", 
+                                    font=("Helvetica", 12), anchor="w", padx=10,
+                                    state=tk.NORMAL if format_available("parquet") else tk.DISABLED)
+        parquet_btn.pack(fill=tk.X, pady=5)
+        
+        arrow_btn = tk.Radiobutton(formats_frame, text="Arrow / Feather", 
+                                  variable=self.export_format, value="arrow", 
+                                  font=("Helvetica", 12), anchor="w", padx=10,
+                                  state=tk.NORMAL if format_available("arrow") else tk.DISABLED)
+        arrow_btn.pack(fill=tk.X, pady=5)
+        
+        # Compresión de los formatos de texto
+        compression_frame = tk.Frame(main_frame)
+        compression_frame.pack(fill=tk.X, pady=(10, 0))
+        tk.Label(compression_frame, text="Compresión (CSV, JSON, NDJSON, TXT):",
+                 font=("Helvetica", 11)).pack(side=tk.LEFT)
+        self.export_compression = tk.StringVar(value="ninguna")
+        compression_combo = ttk.Combobox(compression_frame, textvariable=self.export_compression, width=10,
+                                         values=["ninguna"] + list(COMPRESSION_EXTS), state="readonly")
+        compression_combo.pack(side=tk.LEFT, padx=5)
+        
+        # Solo los cambios respecto al manifiesto de una exportación anterior
+        self.export_delta = tk.BooleanVar(value=False)
+        delta_check = tk.Checkbutton(main_frame, text="Solo cambios desde una exportación anterior",
+                                     variable=self.export_delta, font=("Helvetica", 11), anchor="w")
+        delta_check.pack(fill=tk.X, pady=(10, 0))
+        
         # Botones de acción
         buttons_frame = tk.Frame(main_frame)
         buttons_frame.pack(fill=tk.X, pady=(20, 0))
@@ -435,9 +4304,25 @@ class FirestoreAdminApp(tk.Tk):
             messagebox.showinfo("Exportar", "No hay datos para exportar")
             return
         
+        previous_manifest = None
+        compression = None
         if export_window:
             format_selected = self.export_format.get()
+            if format_selected in COMPRESSIBLE_FORMATS and self.export_compression.get() in COMPRESSION_EXTS:
+                compression = self.export_compression.get()
+            delta = self.export_delta.get()
             export_window.destroy()
+            if delta and self.export_scope():
+                messagebox.showwarning("Exportar", f"Los cambios se calculan sobre la colección completa: quita "
+                                                   f"{self.export_scope()} y vuelve a exportar")
+                return
+            if delta:
+                previous_manifest = filedialog.askopenfilename(
+                    filetypes=[("Manifiestos de exportación", f"*{MANIFEST_EXT}"), ("All Files", "*.*")],
+                    title="Manifiesto de la exportación anterior"
+                )
+                if not previous_manifest:
+                    return
         else:
             format_selected = "csv"  # Valor por defecto si se llama directamente
         
@@ -445,97 +4330,320 @@ class FirestoreAdminApp(tk.Tk):
         formats = {
             "csv": (".csv", "CSV Files"),
             "json": (".json", "JSON Files"),
+            "ndjson": (".ndjson", "NDJSON Files"),
             "txt": (".txt", "Text Files"),
-            "db": (".db", "SQLite Database")
+            "db": (".db", "SQLite Database"),
+            "parquet": (".parquet", "Parquet Files"),
+            "arrow": (".arrow", "Arrow Files")
         }
         
         ext, file_type = formats.get(format_selected, (".csv", "CSV Files"))
+        if compression:
+            ext += COMPRESSION_EXTS[compression]
         
         # Diálogo para seleccionar dónde guardar
         filename = filedialog.asksaveasfilename(
             defaultextension=ext,
             filetypes=[(file_type, f"*{ext}"), ("All Files", "*.*")],
-            title=f"Exportar datos como {format_selected.upper()}"
+            title=f"Exportar {'cambios' if previous_manifest else 'datos'} como {format_selected.upper()}"
         )
         
         if not filename:
             return
+        # El diálogo no añade la extensión de la compresión si se escribe otra
+        if compression and not filename.lower().endswith(COMPRESSION_EXTS[compression]):
+            filename += COMPRESSION_EXTS[compression]
             
+        self.run_export(format_selected, filename, previous_manifest)
+
+    def export_scope(self):
+        # Búsqueda, filtros o carga incompleta que limitan las filas exportadas; None si se exporta
+        # la colección completa
+        parts = []
+        search_term = self.search_var.get().strip()
+        if search_term:
+            parts.append(f"la búsqueda '{search_term}'")
+        if self.advanced_filter:
+            parts.append("los filtros (" + ", ".join(describe_condition(condition)
+                                                     for condition in self.advanced_filter) + ")")
+        if not self.data.complete and not self.data.pushed:
+            parts.append("la carga incompleta")
+        return " y ".join(parts) or None
+
+    def run_export(self, format_selected, filename, previous_manifest=None):
+        # El hilo de exportación lee una copia del almacén hecha aquí, en el hilo de Tk: el modo en
+        # vivo y la sincronización siguen cambiando el original mientras se escribe el archivo
+        store = self.data.store.snapshot()
+        # Las columnas numéricas con algún texto se exportan como texto en los formatos tipados
+        numeric = numeric_headers(store)
+        export_methods = {
+            "csv": self.export_as_csv,
+            "json": self.export_as_json,
+            "ndjson": partial(self.export_as_ndjson, numeric_headers=numeric),
+            "txt": self.export_as_txt,
+            "db": partial(self.export_as_sqlite, table_name=self.current_collection, numeric_headers=numeric),
+            "parquet": partial(self.export_as_parquet, numeric_headers=numeric),
+            "arrow": partial(self.export_as_arrow, numeric_headers=numeric)
+        }
+        headers = self.collections[self.current_collection]
+        # Las filas se generan desde la copia mientras se escriben. Los cambios se calculan siempre
+        # sobre todas las filas cargadas, no sobre la vista
+        positions = store.live_positions() if previous_manifest else array("l", self.current_view)
+        rows = store.view(positions)
+        scope = self.export_scope()
+        self.export_cancel_event = threading.Event()
+
+        # Ventana de progreso
+        self.export_window = tk.Toplevel(self)
+        self.export_window.title("Exportando...")
+        self.export_window.geometry("400x150")
+        self.export_window.resizable(False, False)
+        self.export_window.transient(self)
+        self.export_window.protocol("WM_DELETE_WINDOW", self.export_cancel_event.set)
+        frame = tk.Frame(self.export_window, padx=20, pady=20)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.export_label = tk.Label(frame, text=f"Exportando 0 de {len(rows)} registros...",
+                                     font=("Helvetica", 11))
+        self.export_label.pack(fill=tk.X)
+        self.export_progress = ttk.Progressbar(frame, orient="horizontal", length=360,
+                                               mode='determinate', maximum=max(1, len(rows)))
+        self.export_progress.pack(pady=10)
+        cancel_btn = tk.Button(frame, text="Cancelar", command=self.export_cancel_event.set,
+                               bg="#95a5a6", fg="white", font=("Helvetica", 12))
+        cancel_btn.pack(side=tk.RIGHT)
+
+        threading.Thread(target=self.export_worker,
+                         args=(export_methods[format_selected], filename, headers, rows, self.export_cancel_event,
+                               self.current_collection, previous_manifest, scope),
+                         daemon=True).start()
+
+    def export_worker(self, export_method, filename, headers, rows, cancel_event, collection,
+                      previous_manifest=None, scope=None):
+        total = len(rows)
+        progress = lambda written: self.after(0, self.on_export_progress, written, total)
+        entries = []
         try:
-            headers = self.collections[self.current_collection]
-            
-            # Exportar según el formato seleccionado
-            if format_selected == "csv":
-                self.export_as_csv(filename, headers)
-            elif format_selected == "json":
-                self.export_as_json(filename, headers)
-            elif format_selected == "txt":
-                self.export_as_txt(filename, headers)
-            elif format_selected == "db":
-                self.export_as_sqlite(filename, headers)
-            
+            # Versiones (update_time) guardadas en el espejo local de los documentos cargados
+            versions = self.mirror.update_times(collection) if versioned_hashes(collection) else None
+            if previous_manifest:
+                # Primero las huellas de todas las filas y después solo las que cambian
+                previous = previous_entries(previous_manifest, collection, False)
+                entries = [(row[0], row_hash(row, versions.get(row[0], "") if versions else "")) for row in rows]
+                entries.sort()
+                changes = list(diff_entries(previous, entries))
+                total = len(changes)
+                export_method(filename, [DELTA_COLUMN] + headers, delta_rows(rows.store, changes),
+                              progress=progress, cancel_event=cancel_event)
+            else:
+                export_method(filename, headers, hashed_rows(rows, entries, versions), progress=progress,
+                              cancel_event=cancel_event)
+            # El manifiesto describe siempre todo lo exportado, también tras un archivo de cambios
+            write_manifest(manifest_path(filename), collection, entries, False, None if previous_manifest else scope)
+            self.after(0, self.on_export_finished, filename, None)
+        except ExportCancelled:
+            if os.path.exists(filename):
+                os.remove(filename)
+            self.after(0, self.on_export_finished, filename, "cancelled")
+        except Exception as e:
+            self.after(0, self.on_export_finished, filename, e)
+
+    def on_export_progress(self, written, total):
+        if self.export_window.winfo_exists():
+            self.export_progress["value"] = written
+            self.export_label.config(text=f"Exportando {written} de {total} registros...")
+
+    def on_export_finished(self, filename, error):
+        if self.export_window.winfo_exists():
+            self.export_window.destroy()
+        if error == "cancelled":
+            self.status_var.set("Exportación cancelada")
+        elif error:
+            messagebox.showerror("Error", f"Error al exportar datos: {error}")
+        else:
             messagebox.showinfo("Exportar", f"Datos exportados exitosamente a {filename}")
-            
+
+    def show_import_dialog(self):
+        collection = self.current_collection
+        filename = filedialog.askopenfilename(
+            filetypes=[("Archivos exportados", "*.csv *.json *.ndjson *.txt *.db *.parquet *.arrow *.gz *.zst"),
+                       ("All Files", "*.*")],
+            title=f"Importar datos en {collection}"
+        )
+        if not filename:
+            return
+        done = ImportCheckpoint(collection, filename).load()
+        if done:
+            resume = messagebox.askyesnocancel(
+                "Importar", f"Ya se importaron {done} registros de este archivo en una importación anterior "
+                            f"que no terminó.\n\n¿Continuar desde ahí? (No: empezar desde el principio)")
+            if resume is None:
+                return
+        else:
+            resume = True
+            if not messagebox.askyesno(
+                    "Importar", f"Se escribirán en la colección {collection} los registros de "
+                                f"{os.path.basename(filename)}. Los documentos con el mismo ID se actualizarán.\n\n"
+                                f"¿Continuar?"):
+                return
+        self.run_import(collection, filename, resume)
+
+    def run_import(self, collection, filename, resume):
+        self.import_cancel_event = threading.Event()
+        # Ventana de progreso; no se sabe cuántos registros hay hasta terminar de leer el archivo
+        self.import_window = tk.Toplevel(self)
+        self.import_window.title("Importando...")
+        self.import_window.geometry("400x150")
+        self.import_window.resizable(False, False)
+        self.import_window.transient(self)
+        self.import_window.protocol("WM_DELETE_WINDOW", self.import_cancel_event.set)
+        frame = tk.Frame(self.import_window, padx=20, pady=20)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.import_label = tk.Label(frame, text=f"Importando {os.path.basename(filename)}...",
+                                     font=("Helvetica", 11))
+        self.import_label.pack(fill=tk.X)
+        self.import_progress = ttk.Progressbar(frame, orient="horizontal", length=360, mode='indeterminate')
+        self.import_progress.pack(pady=10)
+        self.import_progress.start()
+        cancel_btn = tk.Button(frame, text="Cancelar", command=self.import_cancel_event.set,
+                               bg="#95a5a6", fg="white", font=("Helvetica", 12))
+        cancel_btn.pack(side=tk.RIGHT)
+        threading.Thread(target=self.import_worker, args=(collection, filename, resume, self.import_cancel_event),
+                         daemon=True).start()
+
+    @timed("import_documents")
+    def import_worker(self, collection, filename, resume, cancel_event):
+        # BulkWriter solo existe en el cliente síncrono, así que la importación va en su propio hilo
+        try:
+            summary = import_documents(self.db, collection, filename, resume=resume,
+                                       progress=lambda done: self.after(0, self.on_import_progress, done),
+                                       cancel_event=cancel_event)
+            self.after(0, self.on_import_finished, collection, summary, None)
         except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar datos: {e}")
-    
-    def export_as_csv(self, filename, headers):
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)
-            for row in self.current_data:
-                writer.writerow(row)
-    
-    def export_as_json(self, filename, headers):
-        json_data = []
-        for row in self.current_data:
-            item = {}
-            for i, header in enumerate(headers):
-                item[header] = row[i]
-            json_data.append(item)
-            
-        with open(filename, 'w', encoding='utf-8') as jsonfile:
-            json.dump(json_data, jsonfile, ensure_ascii=False, indent=2)
-    
-    def export_as_txt(self, filename, headers):
-        with open(filename, 'w', encoding='utf-8') as txtfile:
-            # Encabezado
-            header_line = "\t".join(headers)
-            txtfile.write(f"{header_line}\n")
-            txtfile.write("-" * len(header_line) + "\n")
-            
-            # Datos
-            for row in self.current_data:
-                row_text = "\t".join(str(cell) for cell in row)
-                txtfile.write(f"{row_text}\n")
-    
-    def export_as_sqlite(self, filename, headers):
-        # Eliminar el archivo si ya existe
-        if os.path.exists(filename):
-            os.remove(filename)
-            
-        # Crear conexión a la base de datos
-        conn = sqlite3.connect(filename)
-        cursor = conn.cursor()
-        
-        # Crear tabla
-        table_name = self.current_collection
-        fields = ", ".join([f'"{header}" TEXT' for header in headers])
-        cursor.execute(f'CREATE TABLE "{table_name}" ({fields})')
-        
-        # Insertar datos
-        placeholders = ", ".join(["?" for _ in headers])
-        for row in self.current_data:
-            cursor.execute(f'INSERT INTO "{table_name}" VALUES ({placeholders})', row)
-        
-        # Guardar cambios y cerrar
-        conn.commit()
-        conn.close()
+            self.after(0, self.on_import_finished, collection, None, e)
+
+    def on_import_progress(self, done):
+        if self.import_window.winfo_exists():
+            self.import_label.config(text=f"Importados {done} registros...")
+
+    def on_import_finished(self, collection, summary, error):
+        if self.import_window.winfo_exists():
+            self.import_window.destroy()
+        if error:
+            messagebox.showerror("Error", f"Error al importar datos: {error}")
+            return
+        # Los documentos abiertos en detalles pueden haber cambiado
+        for key in [key for key in self.document_cache if key[0] == collection]:
+            del self.document_cache[key]
+        lines = [f"Documentos escritos: {summary['written']}"]
+        if summary["deleted"]:
+            lines.append(f"Documentos borrados: {summary['deleted']}")
+        if summary["resumed_at"]:
+            lines.append(f"Continuada desde el registro {summary['resumed_at']}")
+        if summary["empty"] or summary["invalid"]:
+            lines.append(f"Registros omitidos: {summary['empty'] + summary['invalid']}")
+        if summary["unmatched_users"]:
+            lines.append(f"Rutinas sin usuario (nombre desconocido o repetido): {summary['unmatched_users']}")
+        if summary["failed"]:
+            lines.append(f"Errores de escritura: {len(summary['failed'])} (p. ej. {summary['failed'][0][0]}: "
+                         f"{summary['failed'][0][1]})")
+        if summary["cancelled"]:
+            self.status_var.set(f"Importación cancelada tras {summary['done']} registros")
+            lines.append("Importación cancelada: se puede continuar importando el mismo archivo")
+        messagebox.showinfo("Importar", "\n".join(lines))
+        # La sincronización incremental trae a la tabla lo que se acaba de escribir (las otras
+        # colecciones se sincronizan al volver a abrirlas)
+        if collection == self.current_collection:
+            self.refresh_data()
+
+    @timed("export_as_csv")
+    def export_as_csv(self, filename, headers, rows, progress=None, cancel_event=None):
+        write_csv(filename, headers, rows, progress=progress, cancel_event=cancel_event)
+
+    @timed("export_as_json")
+    def export_as_json(self, filename, headers, rows, progress=None, cancel_event=None):
+        write_json(filename, headers, rows, progress=progress, cancel_event=cancel_event)
+
+    @timed("export_as_ndjson")
+    def export_as_ndjson(self, filename, headers, rows, progress=None, cancel_event=None, numeric_headers=None):
+        write_ndjson(filename, headers, rows, progress=progress, cancel_event=cancel_event,
+                     numeric_headers=numeric_headers)
+
+    @timed("export_as_txt")
+    def export_as_txt(self, filename, headers, rows, progress=None, cancel_event=None):
+        write_txt(filename, headers, rows, progress=progress, cancel_event=cancel_event)
+
+    @timed("export_as_sqlite")
+    def export_as_sqlite(self, filename, headers, rows, progress=None, cancel_event=None, table_name=None,
+                         numeric_headers=None):
+        write_sqlite(filename, headers, rows, table_name=table_name or self.current_collection,
+                     progress=progress, cancel_event=cancel_event, numeric_headers=numeric_headers)
+
+    @timed("export_as_parquet")
+    def export_as_parquet(self, filename, headers, rows, progress=None, cancel_event=None, numeric_headers=None):
+        write_parquet(filename, headers, rows, progress=progress, cancel_event=cancel_event,
+                      numeric_headers=numeric_headers)
+
+    @timed("export_as_arrow")
+    def export_as_arrow(self, filename, headers, rows, progress=None, cancel_event=None, numeric_headers=None):
+        write_arrow(filename, headers, rows, progress=progress, cancel_event=cancel_event,
+                    numeric_headers=numeric_headers)
 
     def setup_context_menu(self):
         self.context_menu = tk.Menu(self, tearoff=0)
         self.context_menu.add_command(label="Ver detalles", command=self.view_details)
         self.tree.bind("<Button-3>", self.show_context_menu)
+        # Doble clic: filas relacionadas (rutinas de un usuario, usuario de una rutina)
+        self.tree.bind("<Double-1>", self.on_tree_double_click)
+
+    def on_tree_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return
+        values = self.tree.item(item, 'values')
+        if values:
+            self.show_related([values[0]], values[1] if len(values) > 1 else values[0])
+
+    def show_view_related(self):
+        ids = self.data.store.ids
+        self.show_related([ids[position] for position in self.current_view],
+                          f"los {len(self.current_view)} registros visibles")
+
+    def show_related(self, doc_ids, label):
+        # Rutinas de unos usuarios o usuarios de unas rutinas, con los índices de relaciones de
+        # los datos ya cargados
+        relations = self.relations()
+        parents = [(parent, field) for parent, _, child, field in RELATIONS if child == self.current_collection]
+        if relations:
+            _, collection, field = relations[0]
+        elif parents:
+            collection, field = parents[0]
+        else:
+            # Sin relaciones (dietas), el doble clic abre los detalles
+            self.view_details()
+            return
+        dataset = self.dataset_for(collection)
+        if dataset is None or not dataset.complete:
+            self.status_var.set(f"La colección {collection} todavía se está cargando; inténtalo en unos segundos")
+            return
+        if relations:
+            positions = dataset.get_relation(field).positions(doc_ids)
+        else:
+            store = self.data.store
+            parent_ids = {store.key(field, store.positions[doc_id]) for doc_id in doc_ids if doc_id in store.positions}
+            positions = array("l", sorted(dataset.store.positions[parent_id] for parent_id in parent_ids
+                                          if parent_id in dataset.store.positions))
+        RelatedRowsWindow(self, f"{collection.capitalize()} de {label}", collection, dataset, positions)
+
+    def refresh_joined_columns(self):
+        # Vuelve a pintar las columnas calculadas, p. ej. al terminar de precargarse las rutinas
+        if self.virtual_mode.get():
+            self.virtual_view.refresh()
+            return
+        ids = self.data.store.ids
+        for header, value_at in self.joined_columns().items():
+            for position in self.current_view:
+                if self.tree.exists(ids[position]):
+                    self.tree.set(ids[position], header, joined_cell(value_at(position)))
 
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
@@ -550,16 +4658,20 @@ class FirestoreAdminApp(tk.Tk):
         item_values = self.tree.item(selected[0], 'values')
         if not item_values:
             return
+        collection = self.current_collection
+        doc_id = item_values[0]
         details_window = tk.Toplevel(self)
-        details_window.title(f"Detalles - {self.current_collection.capitalize()}")
+        details_window.title(f"Detalles - {collection.capitalize()}")
         details_window.geometry("600x400")
         details_window.minsize(500, 300)
         details_window.grab_set()
         details_frame = tk.Frame(details_window, padx=20, pady=20)
         details_frame.pack(fill=tk.BOTH, expand=True)
-        header_label = tk.Label(details_frame, text=f"Detalles de {self.current_collection.capitalize()}",
+        header_label = tk.Label(details_frame, text=f"Detalles de {collection.capitalize()}",
                                  font=("Helvetica", 16, "bold"))
-        header_label.pack(pady=(0, 20))
+        header_label.pack(pady=(0, 10))
+        status_label = tk.Label(details_frame, text="Cargando documento completo...", fg="gray")
+        status_label.pack(pady=(0, 10))
         canvas = tk.Canvas(details_frame)
         scrollbar = ttk.Scrollbar(details_frame, orient="vertical", command=canvas.yview)
         scrollable_frame = tk.Frame(canvas)
@@ -568,16 +4680,78 @@ class FirestoreAdminApp(tk.Tk):
         canvas.configure(yscrollcommand=scrollbar.set)
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
-        headers = self.collections[self.current_collection]
-        for i, (header, value) in enumerate(zip(headers, item_values)):
-            field_frame = tk.Frame(scrollable_frame)
+        headers = self.collections[collection]
+        # Mostramos al momento lo que ya tiene la tabla y completamos con el documento entero
+        self.render_details(scrollable_frame, list(zip(headers, item_values)))
+        key = (collection, doc_id)
+        if key in self.document_cache:
+            self.document_cache.move_to_end(key)
+            self.on_document_loaded(details_window, scrollable_frame, status_label, key, item_values,
+                                    self.document_cache[key], None)
+            return
+        self.data_layer.submit("detalles", partial(self.fetch_document, details_window, scrollable_frame,
+                                                   status_label, key, item_values))
+
+    async def fetch_document(self, details_window, frame, status_label, key, item_values):
+        try:
+            data = await self.data_layer.shared(("documento",) + key, partial(self.read_document, key))
+            self.after(0, self.on_document_loaded, details_window, frame, status_label, key, item_values,
+                       data, None)
+        except Exception as e:
+            self.after(0, self.on_document_loaded, details_window, frame, status_label, key, item_values, None, e)
+
+    async def read_document(self, key):
+        collection, doc_id = key
+        metrics.count_reads(collection, 1, "detalles")
+        doc = await self.async_db.collection(collection).document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def on_document_loaded(self, details_window, frame, status_label, key, item_values, data, error):
+        if not details_window.winfo_exists():
+            return
+        if error is not None:
+            status_label.config(text=f"No se pudo cargar el documento completo: {error}", fg="red")
+            return
+        if data is None:
+            status_label.config(text="El documento ya no existe en Firestore", fg="red")
+            return
+        self.document_cache[key] = data
+        self.document_cache.move_to_end(key)
+        while len(self.document_cache) > DOCUMENT_CACHE_SIZE:
+            self.document_cache.popitem(last=False)
+        collection = key[0]
+        field_mapping = self.field_mappings.get(collection, {})
+        fields = []
+        shown = set()
+        for header, value in zip(self.collections[collection], item_values):
+            firestore_field = field_mapping.get(header, header.lower())
+            # El usuario se sigue mostrando por su nombre; el resto con el valor completo del documento
+            if header in ("ID", "Usuario") or firestore_field not in data:
+                fields.append((header, value))
+            else:
+                fields.append((header, data[firestore_field]))
+            shown.add(firestore_field)
+        fields.extend((field, value) for field, value in data.items() if field not in shown)
+        for child in frame.winfo_children():
+            child.destroy()
+        self.render_details(frame, fields)
+        status_label.config(text="")
+
+    def render_details(self, frame, fields):
+        for header, value in fields:
+            field_frame = tk.Frame(frame)
             field_frame.pack(fill=tk.X, pady=5)
             label = tk.Label(field_frame, text=f"{header}:", font=("Helvetica", 11, "bold"),
-                             width=15, anchor="w")
-            label.pack(side=tk.LEFT, padx=(0, 10))
-            value_text = tk.Text(field_frame, height=2 if len(str(value)) > 50 else 1,
-                                 wrap=tk.WORD, font=("Helvetica", 11))
-            value_text.insert(tk.END, value)
+                             width=15, anchor="nw")
+            label.pack(side=tk.LEFT, anchor="n", padx=(0, 10))
+            if isinstance(value, (dict, list)):
+                text = format_nested(value)
+                height = min(15, max(1, text.count("\n") + 1))
+            else:
+                text = str(value)
+                height = 2 if len(text) > 50 else 1
+            value_text = tk.Text(field_frame, height=height, wrap=tk.WORD, font=("Helvetica", 11))
+            value_text.insert(tk.END, text)
             value_text.config(state=tk.DISABLED)
             value_text.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
@@ -587,6 +4761,243 @@ class FirestoreAdminApp(tk.Tk):
 #     for i in range(1, 10001):
 #         print(f"Cargando datos {i}/{10000}")
 
-if __name__ == "__main__":
+def read_collection(db, collection, user_names, since=None):
+    # Lee una colección completa por páginas; con since solo se quedan los documentos
+    # modificados desde esa fecha (Firestore no permite filtrar por update_time en el servidor)
+    store = ColumnStore(COLLECTIONS[collection])
+    for docs in iter_pages(db.collection(collection)):
+        metrics.count_reads(collection, len(docs))
+        if since:
+            docs = [doc for doc in docs if doc.update_time >= since]
+        # La exportación por línea de comandos guarda el contenido completo de los campos pesados
+        for row in build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs], user_names, preview=False):
+            store.append(row)
+    return store
+
+
+def live_entries(db, collection, full=True):
+    # (ID, huella) de los documentos actuales de Firestore. Las páginas llegan ordenadas por ID,
+    # igual que los manifiestos, así que se pueden comparar sin guardar la colección en memoria
+    user_names = UserNameResolver(db)
+    versioned = not full and versioned_hashes(collection)
+    for docs in iter_pages(db.collection(collection)):
+        metrics.count_reads(collection, len(docs))
+        if full:
+            rows = build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs], user_names, preview=False)
+        else:
+            # Igual que la interfaz: campos pesados sin descargar y la versión del documento en la huella
+            rows = build_rows(collection, [(doc.id, project_document(collection, doc.to_dict())) for doc in docs],
+                              user_names)
+        for doc, row in zip(docs, rows):
+            version = format_update_time(doc.update_time) if versioned else ""
+            yield row[0], row_hash(row[:len(COLLECTIONS[collection])], version)
+
+
+def export_manifest(collection, store, output_dir, delta_from=None):
+    # Guarda el manifiesto de la colección en output_dir (uno para todos los formatos). Con
+    # delta_from devuelve los cambios respecto al manifiesto de esa carpeta, o None si no lo hay
+    entries = [(store.ids[position], row_hash(store.row(position))) for position in store.live_positions()]
+    entries.sort()
+    changes = None
+    previous = os.path.join(delta_from, f"{collection}{MANIFEST_EXT}") if delta_from else None
+    if previous and os.path.exists(previous):
+        # Se comparan antes de escribir el manifiesto nuevo, que puede reemplazar al anterior
+        changes = list(diff_entries(previous_entries(previous, collection, True), entries))
+    elif previous:
+        print(f"{collection}: no hay manifiesto en {delta_from}, se exporta completa")
+    write_manifest(os.path.join(output_dir, f"{collection}{MANIFEST_EXT}"), collection, entries, True)
+    return changes
+
+
+def write_export(collection, store, export_format, output_dir, changes=None, compression=None):
+    writer = partial(EXPORT_FORMATS[export_format][1], table_name=collection, numeric_headers=numeric_headers(store))
+    if changes is None:
+        filename = export_filename(os.path.join(output_dir, collection), export_format, compression)
+        writer(filename, COLLECTIONS[collection], store.view(store.live_positions()))
+    else:
+        filename = export_filename(os.path.join(output_dir, f"{collection}_cambios"), export_format, compression)
+        writer(filename, [DELTA_COLUMN] + COLLECTIONS[collection], delta_rows(store, changes))
+    return filename
+
+
+def parse_since(value):
+    since = datetime.fromisoformat(value)
+    # Las fechas sin zona horaria se interpretan en UTC
+    return since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+
+
+def run_cli_export(args):
+    os.makedirs(args.output, exist_ok=True)
+    try:
+        db = connect_firestore(args.credentials)
+    except Exception as e:
+        print(f"No se pudo inicializar Firebase: {e}", file=sys.stderr)
+        return 2
+    user_names = UserNameResolver(db)
+    failed = False
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        # Cada colección se lee en paralelo y, según termina, se escriben sus formatos también en paralelo
+        reads = {executor.submit(read_collection, db, collection, user_names, args.since): collection
+                 for collection in args.collections}
+        writes = {}
+        for future in as_completed(reads):
+            collection = reads[future]
+            try:
+                store = future.result()
+            except Exception as e:
+                print(f"Error leyendo {collection}: {e}", file=sys.stderr)
+                failed = True
+                continue
+            print(f"{collection}: {len(store)} registros leídos")
+            changes = None
+            # Con --since la exportación es parcial y su manifiesto no serviría para comparar
+            if not args.since:
+                try:
+                    changes = export_manifest(collection, store, args.output, args.delta_from)
+                except Exception as e:
+                    print(f"Error en el manifiesto de {collection}: {e}", file=sys.stderr)
+                    failed = True
+                    continue
+            if changes is not None:
+                counts = {change: 0 for change in ("alta", "modificado", "baja")}
+                for change, _ in changes:
+                    counts[change] += 1
+                print(f"{collection}: {counts['alta']} altas, {counts['modificado']} modificados, "
+                      f"{counts['baja']} bajas")
+            for export_format in args.formats:
+                writes[executor.submit(write_export, collection, store, export_format, args.output,
+                                       changes, args.compress)] = collection
+        for future in as_completed(writes):
+            try:
+                print(f"Exportado {future.result()}")
+            except Exception as e:
+                print(f"Error exportando {writes[future]}: {e}", file=sys.stderr)
+                failed = True
+    print(f"Lecturas de documentos: {metrics.total_reads()}")
+    return 1 if failed else 0
+
+
+def run_cli_diff(args):
+    try:
+        old_meta, old = snapshot_entries(args.old, args.table)
+        if args.new:
+            new_meta, new = snapshot_entries(args.new, args.table)
+        else:
+            collection = args.collection or old_meta.get("collection")
+            if collection not in COLLECTIONS:
+                print("Indica la colección con --collection", file=sys.stderr)
+                return 2
+            try:
+                db = connect_firestore(args.credentials)
+            except Exception as e:
+                print(f"No se pudo inicializar Firebase: {e}", file=sys.stderr)
+                return 2
+            # Las huellas de los campos pesados dependen de si se exportaron completos o resumidos
+            new = live_entries(db, collection, full=old_meta.get("full") is not False)
+        counts = {change: 0 for change in ("alta", "modificado", "baja")}
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for change, doc_id in diff_entries(old, new, args.old, args.new or "Firestore"):
+                counts[change] += 1
+                output.write(f"{change}\t{doc_id}\n")
+        finally:
+            if args.output:
+                output.close()
+    except Exception as e:
+        print(f"Error comparando: {e}", file=sys.stderr)
+        return 1
+    print(f"Altas: {counts['alta']}, modificados: {counts['modificado']}, bajas: {counts['baja']}")
+    if not args.new:
+        print(f"Lecturas de documentos: {metrics.total_reads()}")
+    return 0
+
+
+def run_cli_import(args):
+    try:
+        db = connect_firestore(args.credentials)
+    except Exception as e:
+        print(f"No se pudo inicializar Firebase: {e}", file=sys.stderr)
+        return 2
+    started = time.perf_counter()
+    try:
+        summary = import_documents(db, args.collection, args.file, resume=not args.restart, table_name=args.table,
+                                   max_ops=args.rate,
+                                   progress=lambda done: print(f"{done} registros procesados"))
+    except KeyboardInterrupt:
+        print("Importación interrumpida: vuelve a ejecutar la orden para continuar desde el último punto de control",
+              file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"Error importando {args.file}: {e}", file=sys.stderr)
+        return 1
+    print_import_summary(summary, time.perf_counter() - started)
+    return 1 if summary["failed"] else 0
+
+
+def print_import_summary(summary, elapsed):
+    if summary["resumed_at"]:
+        print(f"Continuada desde el registro {summary['resumed_at']}")
+    print(f"Documentos escritos: {summary['written']} en {elapsed:.1f} s")
+    if summary["deleted"]:
+        print(f"Documentos borrados: {summary['deleted']}")
+    if summary["empty"] or summary["invalid"]:
+        print(f"Registros sin datos: {summary['empty']}, con ID no válido: {summary['invalid']}")
+    if summary["unmatched_users"]:
+        print(f"Rutinas sin usuarioId (nombre de usuario desconocido o repetido): {summary['unmatched_users']}")
+    for doc_id, message in summary["failed"][:20]:
+        print(f"Error escribiendo {doc_id}: {message}", file=sys.stderr)
+    if len(summary["failed"]) > 20:
+        print(f"... y {len(summary['failed']) - 20} errores más", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Panel de administración de GymRace")
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser("export", help="Exporta colecciones sin abrir la interfaz gráfica")
+    export_parser.add_argument("-c", "--collections", nargs="+", choices=list(COLLECTIONS),
+                               default=list(COLLECTIONS), help="Colecciones a exportar (por defecto, todas)")
+    export_parser.add_argument("-f", "--formats", nargs="+", choices=list(EXPORT_FORMATS),
+                               default=["csv"], help="Formatos de salida (por defecto, csv)")
+    export_parser.add_argument("--compress", choices=list(COMPRESSION_EXTS),
+                               help="Comprime los formatos de texto (csv, json, ndjson y txt)")
+    export_parser.add_argument("-o", "--output", default=".", help="Carpeta donde se guardan los archivos")
+    export_parser.add_argument("--since", type=parse_since,
+                               help="Exporta solo los documentos modificados desde esta fecha ISO (p. ej. 2024-05-01)")
+    export_parser.add_argument("--delta-from",
+                               help="Carpeta de una exportación anterior: solo se exportan las altas, "
+                                    "modificaciones y bajas respecto a su manifiesto")
+    export_parser.add_argument("-w", "--workers", type=int, default=4, help="Hilos para leer y escribir en paralelo")
+    export_parser.add_argument("--credentials", default=CREDENTIALS_PATH, help="Archivo de credenciales de Firebase")
+    import_parser = subparsers.add_parser("import", help="Importa a Firestore un archivo exportado por el panel")
+    import_parser.add_argument("collection", choices=list(COLLECTIONS), help="Colección de destino")
+    import_parser.add_argument("file", help="Archivo exportado por el panel (también .gz, .zst, .parquet o .arrow)")
+    import_parser.add_argument("--table", help="Tabla a leer de un archivo .db (por defecto, la de la colección)")
+    import_parser.add_argument("--restart", action="store_true",
+                               help="Empieza desde el principio aunque haya una importación interrumpida")
+    import_parser.add_argument("--rate", type=int, default=IMPORT_MAX_OPS, help="Máximo de escrituras por segundo")
+    import_parser.add_argument("--credentials", default=CREDENTIALS_PATH, help="Archivo de credenciales de Firebase")
+    diff_parser = subparsers.add_parser("diff", help="Compara dos exportaciones, o una exportación con Firestore")
+    diff_parser.add_argument("old", help="Manifiesto o archivo exportado")
+    diff_parser.add_argument("new", nargs="?",
+                             help="Manifiesto o archivo exportado (si se omite, se compara con Firestore)")
+    diff_parser.add_argument("--collection", choices=list(COLLECTIONS),
+                             help="Colección con la que comparar (por defecto, la del manifiesto)")
+    diff_parser.add_argument("--table", help="Tabla a leer de un archivo .db sin manifiesto")
+    diff_parser.add_argument("-o", "--output", help="Guarda la lista de cambios en este archivo")
+    diff_parser.add_argument("--credentials", default=CREDENTIALS_PATH, help="Archivo de credenciales de Firebase")
+    args = parser.parse_args(argv)
+    if args.command == "export" and args.since and args.delta_from:
+        parser.error("--since y --delta-from no se pueden combinar")
+    if args.command == "export":
+        return run_cli_export(args)
+    if args.command == "import":
+        return run_cli_import(args)
+    if args.command == "diff":
+        return run_cli_diff(args)
     app = FirestoreAdminApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# Las pruebas importan gymRaceAdmin y benchmarks/ desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gymRaceAdmin as app
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.generate_data import generate_dataset, populate
+
+# Documentos con las formas raras que también hay en la base real: campos que faltan, números
+# guardados como real sin decimales, calorías como número y fechas como texto
+EDGE_DOCUMENTS = {
+    "usuarios": [
+        ("edge_sin_campos", {"nombre": "Marta Díaz"}),
+        ("edge_sin_nombre", {"edad": 25, "peso": 70.0, "nivelExperiencia": "Avanzado"}),
+        ("edge_real", {"nombre": "Juan García", "edad": 25.0, "peso": 80, "altura": 175.0,
+                       "objetivoFitness": "Perder peso"}),
+    ],
+    "rutinas": [
+        ("edge_sin_usuario", {"nombre": "Rutina suelta", "dificultad": "Media"}),
+        ("edge_fecha_texto", {"nombre": "Rutina antigua", "dificultad": "Fácil",
+                              "fechaCreacion": "2023-05-01T10:00:00"}),
+        ("edge_fecha", {"nombre": "Rutina nueva", "dificultad": "Difícil",
+                        "fechaCreacion": datetime(2024, 6, 1, tzinfo=timezone.utc)}),
+    ],
+    "dietas": [
+        ("edge_calorias_numero", {"nombre": "Dieta antigua", "calorias": 2000, "comidas": "3 comidas"}),
+        ("edge_sin_calorias", {"nombre": "Dieta sin datos"}),
+    ],
+}
+
+
+@pytest.fixture(scope="session")
+def db():
+    db = populate(FakeFirestore(), generate_dataset(300, seed=7))
+    for collection, documents in EDGE_DOCUMENTS.items():
+        db.load(collection, documents)
+    return db
+
+
+def load_rows(db, collection, query=None, order_field=None):
+    # Mismas filas que la tabla del panel: páginas con proyección convertidas con build_rows
+    if query is None:
+        query = db.collection(collection).select(app.list_fields(collection))
+    data = app.CollectionData(app.COLLECTIONS[collection], key_fields=app.KEY_FIELDS.get(collection, ()))
+    user_names = app.UserNameResolver(db)
+    for docs in app.iter_pages(query, order_field=order_field):
+        data.add_rows(app.build_rows(collection, [(doc.id, doc.to_dict()) for doc in docs], user_names))
+    return data
+
+
+# Filas de usuarios ya convertidas, con tildes, mayúsculas y N/A para la búsqueda y la ordenación
+USUARIOS_ROWS = [
+    ["u1", "Juan García", 30, 80.5, 180, 4, "Avanzado", "Ganar masa muscular"],
+    ["u2", "María López", 25, 60, 165, 3, "Principiante", "Perder peso"],
+    ["u3", "Álvaro Martín", "N/A", 75, 175, 5, "Intermedio", "Perder peso"],
+    ["u4", "marta ruiz", 41, "N/A", 170, 2, "Avanzado", "Mantenerse en forma"],
+    ["u5", "Juana Pérez", 30, 58, 160, 3, "Intermedio", "Mejorar resistencia"],
+]
+
+
+@pytest.fixture
+def usuarios_data():
+    data = app.CollectionData(app.COLLECTIONS["usuarios"])
+    data.add_rows([list(row) for row in USUARIOS_ROWS])
+    return data
+
+
+def row_ids(data, positions):
+    return [data.store.ids[position] for position in positions]
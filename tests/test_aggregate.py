@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+import gymRaceAdmin as app
+
+
+@pytest.mark.parametrize("collection", ["usuarios", "dietas"])
+def test_aggregations_are_split_in_queries_firestore_accepts(db, collection):
+    # usuarios pide el recuento y suma y media de 4 columnas: 9 agregaciones, más de las 5 por consulta
+    total, stats = asyncio.run(app.aggregate_collection(db.async_client(), collection))
+    documents = [data for _, data, _ in db.collection(collection).matching()]
+    assert total == len(documents)
+    field_mapping = app.FIELD_MAPPINGS[collection]
+    for header, (total_sum, average) in stats.items():
+        numbers = [data[field_mapping[header]] for data in documents
+                   if isinstance(data.get(field_mapping[header]), (int, float))]
+        assert total_sum == pytest.approx(sum(numbers))
+        assert average == pytest.approx(sum(numbers) / len(numbers) if numbers else None)
+
+
+def test_fake_rejects_more_than_five_aggregations(db):
+    query = db.collection("usuarios").count(alias="total")
+    for i in range(5):
+        query.sum("edad", alias=f"sum_{i}")
+    with pytest.raises(ValueError):
+        query.get()
@@ -0,0 +1,77 @@
+import pytest
+
+import gymRaceAdmin as app
+
+
+def test_diff_entries_reports_changes_in_id_order():
+    old = [("a", "1"), ("b", "2"), ("d", "4"), ("e", "5")]
+    new = [("b", "2"), ("c", "3"), ("d", "40"), ("f", "6")]
+    assert list(app.diff_entries(old, new)) == [("baja", "a"), ("alta", "c"), ("modificado", "d"),
+                                                 ("baja", "e"), ("alta", "f")]
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    ([], [], []),
+    ([], [("a", "1"), ("b", "2")], [("alta", "a"), ("alta", "b")]),
+    ([("a", "1"), ("b", "2")], [], [("baja", "a"), ("baja", "b")]),
+    ([("a", "1"), ("b", "2")], [("a", "1"), ("b", "2")], []),
+])
+def test_diff_entries_edge_cases(old, new, expected):
+    assert list(app.diff_entries(iter(old), iter(new))) == expected
+
+
+@pytest.mark.parametrize("old, new, name", [
+    ([("b", "1"), ("a", "2")], [], "anterior"),
+    ([], [("a", "1"), ("a", "2")], "actual"),
+])
+def test_diff_entries_rejects_unsorted_input(old, new, name):
+    with pytest.raises(ValueError, match=name):
+        list(app.diff_entries(old, new))
+
+
+def test_row_hash_ignores_id_and_uses_version():
+    row = ["id1", "Ana", 30, "(ver detalles)"]
+    assert app.row_hash(row) == app.row_hash(["id2"] + row[1:])
+    assert app.row_hash(row) != app.row_hash(["id1", "Ana", 31, "(ver detalles)"])
+    assert app.row_hash(row, "2024-01-01T00:00:00.000000Z") != app.row_hash(row, "2024-02-01T00:00:00.000000Z")
+
+
+def test_manifest_round_trip(tmp_path):
+    filename = str(tmp_path / "usuarios.manifest")
+    entries = []
+    rows = [["c", "Carla", 40], ["a", "Ana", 30], ["b", "Beto", 35]]
+    assert list(app.hashed_rows(rows, entries)) == rows
+    app.write_manifest(filename, "usuarios", entries, full=True)
+    meta, read_entries = app.read_manifest(filename)
+    assert meta["collection"] == "usuarios" and meta["rows"] == 3 and meta["full"] is True
+    assert meta["filter"] is None
+    assert list(read_entries) == sorted((row[0], app.row_hash(row)) for row in rows)
+
+
+def test_manifest_diff_against_new_export(tmp_path):
+    filename = str(tmp_path / "usuarios.manifest")
+    entries = []
+    list(app.hashed_rows([["a", "Ana", 30], ["b", "Beto", 35]], entries))
+    app.write_manifest(filename, "usuarios", entries, full=False)
+    current = sorted((row[0], app.row_hash(row)) for row in [["b", "Beto", 36], ["c", "Carla", 40]])
+    previous = app.previous_entries(filename, "usuarios", full=False)
+    assert list(app.diff_entries(previous, current)) == [("baja", "a"), ("modificado", "b"), ("alta", "c")]
+
+
+@pytest.mark.parametrize("collection, full, scope, message", [
+    ("rutinas", False, None, "manifiesto de usuarios"),
+    ("usuarios", True, None, "no es comparable"),
+    ("usuarios", False, "búsqueda 'ana'", "exportación filtrada"),
+])
+def test_previous_entries_rejects_incomparable_manifests(tmp_path, collection, full, scope, message):
+    filename = str(tmp_path / "usuarios.manifest")
+    app.write_manifest(filename, "usuarios", [("a", "1")], full=False, scope=scope)
+    with pytest.raises(ValueError, match=message):
+        app.previous_entries(filename, collection, full)
+
+
+def test_read_manifest_rejects_other_files(tmp_path):
+    filename = tmp_path / "usuarios.csv"
+    filename.write_text("ID,Nombre\na,Ana\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="no es un manifiesto"):
+        app.read_manifest(str(filename))
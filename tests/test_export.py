@@ -0,0 +1,75 @@
+import pytest
+
+import gymRaceAdmin as app
+
+HEADERS = app.COLLECTIONS["dietas"]
+TYPED_FORMATS = ["ndjson", "db", "parquet", "arrow"]
+
+
+def dietas_store():
+    store = app.ColumnStore(HEADERS)
+    for row in [["d1", "Dieta HCG", "Plan", "['Pollo']", "['Azúcares']", "500-800 kcal", "3 comidas"],
+                ["d2", "Dieta antigua", "Plan", "['Arroz']", "['Alcohol']", 2000, "5 comidas"],
+                ["d3", "Dieta sin datos", "N/A", "N/A", "N/A", "N/A", "N/A"]]:
+        store.append(row)
+    return store
+
+
+def export(tmp_path, export_format, store, headers=HEADERS):
+    if not app.format_available(export_format):
+        pytest.skip("pyarrow no está instalado")
+    filename = str(tmp_path / f"dietas{app.EXPORT_FORMATS[export_format][0]}")
+    app.EXPORT_FORMATS[export_format][1](filename, headers, store.view(store.live_positions()), table_name="dietas",
+                                         numeric_headers=app.numeric_headers(store))
+    return list(app.iter_import_records(filename, "dietas"))
+
+
+@pytest.mark.parametrize("export_format", TYPED_FORMATS)
+def test_typed_exports_keep_text_in_numeric_columns(tmp_path, export_format):
+    store = dietas_store()
+    records = export(tmp_path, export_format, store)
+    # La columna tiene un texto: se exporta entera como texto
+    assert [record["Calorias"] for record in records] == ["500-800 kcal", "2000", None]
+    documents = [app.record_to_document("dietas", record) for record in records]
+    assert documents[0][1]["calorias"] == "500-800 kcal"
+    assert documents[1][1]["calorias"] == 2000
+    assert "calorias" not in documents[2][1]
+    # Releer el archivo tipado da la misma huella que la tabla
+    for record, position in zip(records, store.live_positions()):
+        assert app.row_hash(list(record.values())) == app.row_hash(store.row(position))
+
+
+@pytest.mark.parametrize("export_format", TYPED_FORMATS)
+def test_typed_exports_keep_numbers_as_numbers(tmp_path, export_format):
+    store = dietas_store()
+    store.remove("d1")
+    records = export(tmp_path, export_format, store)
+    assert [record["Calorias"] for record in records] == [2000, None]
+
+
+def test_numeric_headers_ignore_removed_rows():
+    store = dietas_store()
+    assert "Calorias" not in app.numeric_headers(store)
+    store.remove("d1")
+    assert app.numeric_headers(store) == ["Calorias"]
+
+
+def test_typed_number_never_drops_text():
+    assert app.typed_number("500-800 kcal") == "500-800 kcal"
+    assert app.typed_number("25") == 25
+    assert app.typed_number("N/A") is None
+
+
+def test_snapshot_is_not_changed_by_the_live_store():
+    # La exportación lee la copia en su hilo mientras el modo en vivo cambia el almacén
+    store = dietas_store()
+    snapshot = store.snapshot()
+    rows = snapshot.view(snapshot.live_positions())
+    store.update(store.positions["d2"], ["d2", "Dieta nueva", "Plan", "['Arroz']", "['Alcohol']", 1800, "4 comidas"])
+    store.remove("d3")
+    store.append(["d4", "Dieta keto", "Plan", "['Huevos']", "['Pan']", 1600, "3 comidas"])
+    assert [row[:2] + row[5:6] for row in rows] == [["d1", "Dieta HCG", "500-800 kcal"],
+                                                    ["d2", "Dieta antigua", "2000"],
+                                                    ["d3", "Dieta sin datos", "N/A"]]
+    assert list(app.delta_rows(snapshot, [("modificado", "d2"), ("alta", "d3")]))[1][:2] == ["alta", "d3"]
+    assert "d3" not in store.positions and "d4" not in snapshot.positions
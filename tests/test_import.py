@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import gymRaceAdmin as app
+
+
+@pytest.mark.parametrize("header, value, expected", [
+    ("Edad", "25", 25),
+    ("Peso", " 72.5 ", 72.5),
+    ("Peso", 70.0, 70),
+    ("Peso", 70.5, 70.5),
+    ("Edad", "N/A", None),
+    ("Edad", "", None),
+    ("Edad", None, None),
+    ("Edad", "veinte", "veinte"),
+    ("Calorias", "500-800 kcal", "500-800 kcal"),
+    ("Fecha de Creación", "1700000000000", 1700000000000),
+    ("Fecha de Creación", "2024-06-01 00:00:00+00:00", datetime(2024, 6, 1, tzinfo=timezone.utc)),
+    ("Alimentos Permitidos", "['Pollo', 'Arroz']", ["Pollo", "Arroz"]),
+    ("Nombre", "[sin cerrar", "[sin cerrar"),
+    ("Ejercicios", app.HEAVY_PLACEHOLDER, None),
+    ("Ejercicios", "3 elementos", None),
+    ("Ejercicios", "[{'nombre': 'Sentadilla', 'series': 4}]", [{"nombre": "Sentadilla", "series": 4}]),
+    ("Comidas", "3 comidas principales y 2 snacks", "3 comidas principales y 2 snacks"),
+])
+def test_parse_import_value(header, value, expected):
+    parsed = app.parse_import_value(header, value)
+    assert parsed == expected
+    assert type(parsed) is type(expected)
+
+
+def test_record_to_document_maps_headers_to_fields():
+    record = {"ID": " abc ", "Nombre": "Ana", "Edad": "30", "Peso": "N/A", "diasEntrenamientoPorSemana": "4",
+              app.DELTA_COLUMN: "alta", None: "sobrante"}
+    assert app.record_to_document("usuarios", record) == ("abc", {"nombre": "Ana", "edad": 30,
+                                                                  "diasEntrenamientoPorSemana": 4})
+
+
+def test_record_to_document_without_id():
+    assert app.record_to_document("dietas", {"ID": "", "Nombre": "Dieta"}) == (None, {"nombre": "Dieta"})
+
+
+@pytest.mark.parametrize("user, expected", [
+    ("Ana López", {"nombre": "Fuerza", "usuarioId": "u1"}),
+    ("Nombre repetido", {"nombre": "Fuerza"}),
+])
+def test_record_to_document_resolves_user_names(user, expected):
+    record = {"ID": "r1", "Nombre": "Fuerza", "Usuario": user}
+    assert app.record_to_document("rutinas", record, {"Ana López": "u1"}) == ("r1", expected)
+
+
+def test_resume_after_interruption_mid_chunk_does_not_duplicate(tmp_path, monkeypatch):
+    from benchmarks.fake_firestore import FakeBulkWriter, FakeFirestore
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "IMPORT_CHUNK_SIZE", 4)
+    headers = app.COLLECTIONS["dietas"]
+    # La mitad de los registros no trae ID
+    rows = [[f"d{i}" if i % 2 else "", f"Dieta {i}", "Plan", "['Pollo']", "['Pan']", 2000 + i, "3 comidas"]
+            for i in range(10)]
+    filename = str(tmp_path / "dietas.csv")
+    app.write_csv(filename, headers, rows)
+
+    class FailingWriter(FakeBulkWriter):
+        # Se corta la conexión a mitad del segundo bloque; lo ya encolado se envía al cerrar
+        def set(self, reference, data, merge=False):
+            if failing and self.calls == 6:
+                raise ConnectionError("sin conexión")
+            self.calls += 1
+            super().set(reference, data, merge)
+
+    db = FakeFirestore()
+    failing = True
+    FailingWriter.calls = 0
+    monkeypatch.setattr(db, "bulk_writer", lambda options=None: FailingWriter(db))
+    with pytest.raises(ConnectionError):
+        app.import_documents(db, "dietas", filename)
+    assert len(db.store("dietas").docs) == 6
+    assert app.ImportCheckpoint("dietas", filename).load() == 4
+    failing = False
+    summary = app.import_documents(db, "dietas", filename)
+    assert summary["resumed_at"] == 4
+    documents = db.store("dietas").docs
+    assert len(documents) == 10
+    assert sorted(data["calorias"] for data, _ in documents.values()) == list(range(2000, 2010))
@@ -0,0 +1,70 @@
+import pytest
+
+import gymRaceAdmin as app
+from conftest import load_rows
+
+# Cada caso es (colección, condiciones del filtro avanzado)
+FILTERS = [
+    ("usuarios", [("Edad", "entre", (20.0, 30.0))]),
+    ("usuarios", [("Edad", "==", 25.0)]),
+    ("usuarios", [("Edad", ">", 40.0), ("Nivel de Experiencia", "==", "Avanzado")]),
+    ("usuarios", [("Peso", "<=", 70.0), ("Altura", ">=", 175.0)]),
+    ("usuarios", [("Objetivo Fitness", "==", "Perder peso"), ("Nombre", "contiene", "mar")]),
+    ("usuarios", [("Nombre", "==", "Juan García")]),
+    ("usuarios", [("Nombre", "==", "N/A")]),
+    ("usuarios", [("Edad", "!=", 25.0)]),
+    ("rutinas", [("Dificultad", "==", "Media")]),
+    ("rutinas", [("Fecha de Creación", ">", "2024-01-01")]),
+    ("rutinas", [("Nombre", "contiene", "fuerza"), ("Dificultad", "==", "Fácil")]),
+    ("dietas", [("Calorias", ">=", 2000.0)]),
+    ("dietas", [("Alimentos Permitidos", "contiene", "pollo"), ("Nombre", "contiene", "dieta")]),
+]
+
+
+def matching_ids(data, conditions):
+    positions = app.filter_positions(data.store, conditions, data.store.live_positions())
+    return {data.store.ids[position] for position in positions}
+
+
+@pytest.mark.parametrize("collection, conditions", FILTERS)
+def test_pushdown_matches_local_filter(db, collection, conditions):
+    # Leer solo lo que devuelve Firestore con las condiciones enviadas y filtrar el resto en
+    # local da las mismas filas que filtrar en local la colección completa
+    expected = matching_ids(load_rows(db, collection), conditions)
+    pushed, local = app.plan_filter(collection, conditions)
+    query = db.collection(collection).select(app.list_fields(collection))
+    query, order_field = app.apply_pushdown(query, collection, pushed)
+    assert matching_ids(load_rows(db, collection, query, order_field), local) == expected
+
+
+def test_range_is_pushed_and_equalities_stay_local():
+    conditions = [("Nivel de Experiencia", "==", "Avanzado"), ("Edad", ">", 40.0), ("Edad", "<", 60.0)]
+    pushed, local = app.plan_filter("usuarios", conditions)
+    assert pushed == [("Edad", ">", 40.0), ("Edad", "<", 60.0)]
+    assert local == [("Nivel de Experiencia", "==", "Avanzado")]
+
+
+def test_only_one_range_field_is_pushed():
+    conditions = [("Peso", "<=", 70.0), ("Altura", ">=", 175.0)]
+    pushed, local = app.plan_filter("usuarios", conditions)
+    assert pushed == [("Peso", "<=", 70.0)]
+    assert local == [("Altura", ">=", 175.0)]
+
+
+def test_equalities_are_pushed_together():
+    conditions = [("Nivel de Experiencia", "==", "Avanzado"), ("Objetivo Fitness", "==", "Perder peso")]
+    assert app.plan_filter("usuarios", conditions) == (conditions, [])
+
+
+@pytest.mark.parametrize("collection, condition", [
+    ("dietas", ("Calorias", ">=", 2000.0)),
+    ("rutinas", ("Fecha de Creación", ">", "2024-01-01")),
+    ("dietas", ("Alimentos Permitidos", "==", "['Pollo']")),
+    ("rutinas", ("Usuario", "==", "Juan García")),
+    ("usuarios", ("Nombre", "==", "N/A")),
+    ("usuarios", ("Nombre", "contiene", "mar")),
+    ("usuarios", ("Edad", "!=", 25.0)),
+])
+def test_conditions_firestore_cannot_resolve_stay_local(collection, condition):
+    assert app.plan_filter(collection, [condition]) == ([], [condition])
+    assert "(solo en local)" in app.describe_plan([], [condition], collection=collection)
@@ -0,0 +1,79 @@
+import pytest
+
+import gymRaceAdmin as app
+
+
+def snapshot(collection, rows):
+    store = app.ColumnStore(app.COLLECTIONS[collection], app.KEY_FIELDS.get(collection, ()))
+    for row in rows:
+        store.append(row)
+    return app.QualitySnapshot(collection, store)
+
+
+def problems(findings):
+    return sorted((finding[1], finding[3]) for finding in findings)
+
+
+def dieta(doc_id, nombre, calorias, comidas="3 comidas principales y 2 snacks"):
+    return [doc_id, nombre, "Plan", "['Pollo']", "['Azúcares']", calorias, comidas]
+
+
+def test_exact_duplicates_ignore_the_id():
+    rows = [["u1", "Ana Ruiz", 30, 60, 165, 3, "Intermedio", "Perder peso"],
+            ["u2", "Ana Ruiz", 30, 60, 165, 3, "Intermedio", "Perder peso"],
+            ["u3", "Ana Ruiz", 31, 60, 165, 3, "Intermedio", "Perder peso"]]
+    findings = app.find_duplicates(snapshot("usuarios", rows))
+    exact = [finding for finding in findings if finding[3] == "Duplicado exacto"]
+    assert [(finding[1], finding[6]) for finding in exact] == [("u2", "igual que u1")]
+
+
+def test_near_duplicates_within_tolerance():
+    rows = [["u1", "Ana Ruiz", 30, 60, 165, 3, "Intermedio", "Perder peso"],
+            ["u2", "ANA RUIZ", 31, 61.5, 166, 3, "Intermedio", "Perder peso"],
+            ["u3", "Ana Ruiz", 45, 60, 165, 3, "Intermedio", "Perder peso"],
+            ["u4", "Ana Ruíz", 30, 60, 165, 3, "Avanzado", "Perder peso"]]
+    findings = app.find_duplicates(snapshot("usuarios", rows))
+    assert problems(findings) == [("u1", "Posible duplicado")]
+    assert findings[0][6] == "parecido a u2"
+
+
+def test_range_strings_are_compared_by_text_and_number():
+    # "1500-1800 kcal" y "1600-1700 kcal" tienen el mismo punto medio pero no son el mismo valor
+    rows = [dieta("d1", "Dieta A", "1500-1800 kcal"), dieta("d2", "Dieta A", "1600-1700 kcal"),
+            dieta("d3", "Dieta B", "2000 kcal"), dieta("d4", "Dieta B", "2000 kcal")]
+    findings = app.find_duplicates(snapshot("dietas", rows))
+    assert problems(findings) == [("d1", "Posible duplicado"), ("d4", "Duplicado exacto")]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("500-800 kcal", 650),
+    ("1800 - 2200", 2000),
+    ("75 kg", 75),
+    ("72,5", 72.5),
+    ("2000", 2000),
+    ("variable", None),
+    ("kcal", None),
+    ("500-", None),
+])
+def test_parse_quantity(text, expected):
+    assert app.parse_quantity(text) == expected
+
+
+def test_outliers_on_range_strings():
+    rows = [dieta(f"d{i}", f"Dieta {i}", f"{1600 + 100 * (i % 4)}-{2000 + 100 * (i % 4)} kcal") for i in range(20)]
+    rows += [dieta("bajo", "Dieta HCG", "500-800 kcal"), dieta("imposible", "Dieta X", "50-100 kcal"),
+             dieta("texto", "Dieta Y", "según el día")]
+    findings = app.find_outliers(snapshot("dietas", rows))
+    assert problems(findings) == [("bajo", "Valor atípico"), ("imposible", "Valor imposible"),
+                                  ("texto", "Valor no numérico")]
+    # Se muestra el texto de la tabla, no el número que se sacó de él
+    assert {finding[1]: finding[5] for finding in findings}["bajo"] == "500-800 kcal"
+
+
+def test_dangling_references():
+    usuarios = snapshot("usuarios", [["u1", "Ana", 30, 60, 165, 3, "Intermedio", "Perder peso"]])
+    rutinas = snapshot("rutinas", [["r1", "Fuerza", "Ana", "", "Media", "", "N/A", "u1"],
+                                   ["r2", "Cardio", "N/A", "", "Fácil", "", "N/A", "u9"],
+                                   ["r3", "Suelta", "N/A", "", "Fácil", "", "N/A", ""]])
+    findings = app.scan_quality({"usuarios": usuarios, "rutinas": rutinas})
+    assert problems(findings) == [("r2", "Referencia rota"), ("r3", "Sin referencia")]
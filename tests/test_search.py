@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import row_ids
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("juan", {"u1", "u5"}),
+    ("JUAN GARCIA", {"u1"}),
+    ("alvaro", {"u3"}),
+    ("nombre: mar", {"u2", "u3", "u4"}),
+    ("objetivo fitness: perder", {"u2", "u3"}),
+    ("zzz", set()),
+    ("", {"u1", "u2", "u3", "u4", "u5"}),
+])
+def test_search_ignores_case_and_accents(usuarios_data, query, expected):
+    assert set(row_ids(usuarios_data, usuarios_data.search_index.search(query))) == expected
+
+
+def test_search_after_narrowing_and_widening_a_query(usuarios_data):
+    # Al alargar el término se filtra el resultado anterior; al acortarlo no se puede reutilizar
+    search = usuarios_data.search_index.search
+    assert set(row_ids(usuarios_data, search("mar"))) == {"u2", "u3", "u4"}
+    assert set(row_ids(usuarios_data, search("mart"))) == {"u3", "u4"}
+    assert set(row_ids(usuarios_data, search("ma"))) == {"u1", "u2", "u3", "u4"}
+
+
+def test_search_skips_updated_and_removed_rows(usuarios_data):
+    position = usuarios_data.store.positions["u1"]
+    usuarios_data.upsert_rows([["u1", "Pedro Sanz", 30, 80.5, 180, 4, "Avanzado", "Ganar masa muscular"]])
+    usuarios_data.remove_ids(["u5"])
+    assert usuarios_data.search_index.search("juan") == set()
+    assert usuarios_data.search_index.matches(position, "pedro")
+
+
+def test_postings_of_changed_rows_are_dropped(usuarios_data):
+    # Cada cambio de nombre deja trigramas que ya no valen; las listas se compactan y no crecen sin límite
+    index = usuarios_data.search_index
+    postings = sum(len(positions) for positions in index.grams.values())
+    for i in range(200):
+        usuarios_data.upsert_rows([["u1", f"Nombre {i:03d}", 30, 80.5, 180, 4, "Avanzado", "Ganar masa muscular"]])
+    assert sum(len(positions) for positions in index.grams.values()) < 2 * postings
+    assert set(row_ids(usuarios_data, index.search("nombre 199"))) == {"u1"}
+    assert index.search("nombre 198") == set()
+    usuarios_data.remove_ids(["u1", "u2", "u3", "u4", "u5"])
+    assert not index.grams
+    assert index.search("perder") == set()
@@ -0,0 +1,22 @@
+import pytest
+
+from conftest import row_ids
+
+
+@pytest.mark.parametrize("sort_spec, expected", [
+    ([("Edad", True)], ["u2", "u1", "u5", "u4", "u3"]),
+    ([("Edad", False)], ["u3", "u4", "u1", "u5", "u2"]),
+    ([("Nombre", True)], ["u3", "u1", "u5", "u2", "u4"]),
+    # En orden descendente los N/A quedan delante
+    ([("Nivel de Experiencia", True), ("Peso", False)], ["u4", "u1", "u3", "u5", "u2"]),
+    ([("Edad", True), ("Nombre", False)], ["u2", "u5", "u1", "u4", "u3"]),
+])
+def test_sort_keys(usuarios_data, sort_spec, expected):
+    assert row_ids(usuarios_data, usuarios_data.sort_keys.permutation(sort_spec)) == expected
+
+
+def test_sort_keys_follow_updates(usuarios_data):
+    assert row_ids(usuarios_data, usuarios_data.sort_keys.permutation([("Edad", True)]))[0] == "u2"
+    usuarios_data.upsert_rows([["u2", "María López", 50, 60, 165, 3, "Principiante", "Perder peso"]])
+    assert row_ids(usuarios_data, usuarios_data.sort_keys.permutation([("Edad", True)])) == \
+        ["u1", "u5", "u4", "u2", "u3"]
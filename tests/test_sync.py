@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import gymRaceAdmin as app
+from benchmarks.fake_firestore import FakeFirestore
+
+
+def usuario(nombre, hour):
+    return {"nombre": nombre, "edad": 30, "updatedAt": datetime(2024, 6, 1, hour, tzinfo=timezone.utc)}
+
+
+@pytest.fixture
+def sync(tmp_path):
+    # El panel sin ventana: sync_delta entrega el resultado con after(), que aquí se llama en el acto
+    db = FakeFirestore()
+    db.load("usuarios", [("u1", usuario("Ana", 10)), ("u2", usuario("Luis", 11)), ("u3", usuario("Eva", 11))])
+    window = object.__new__(app.FirestoreAdminApp)
+    window.async_db = db.async_client()
+    window.user_names = app.UserNameResolver(db, window.async_db)
+    window.mirror = app.LocalMirror(str(tmp_path / "mirror.db"))
+    synced = []
+    window.after = lambda delay, func, *args: func(*args)
+    window.on_delta_synced = lambda generation, upserts, removed_ids: synced.append(
+        (sorted(row[0] for row in upserts), sorted(removed_ids)))
+
+    def run():
+        asyncio.run(window.sync_delta("usuarios", 0))
+        return synced[-1]
+
+    # La primera sincronización (sin marca de agua) recorre todos los IDs y llena el espejo
+    assert run() == (["u1", "u2", "u3"], [])
+    yield db, window.mirror, run
+    window.mirror.conn.close()
+
+
+def test_documents_written_at_the_watermark_are_not_skipped(sync):
+    db, mirror, run = sync
+    db.set_document("usuarios", "u4", usuario("Pablo", 11))
+    # u2 y u3 vuelven con >= pero no han cambiado y se descartan
+    assert run() == (["u4"], [])
+    assert run() == ([], [])
+
+
+def test_deletion_hidden_by_an_addition_is_found_by_the_full_check(sync):
+    db, mirror, run = sync
+    db.delete_document("usuarios", "u1")
+    db.set_document("usuarios", "u5", usuario("Sara", 12))
+    # El recuento cuadra (una baja y un alta); la comprobación periódica de IDs encuentra la baja
+    mirror.set_checked_at("usuarios", mirror.get_checked_at("usuarios") - app.SYNC_FULL_CHECK_INTERVAL)
+    assert run() == (["u5"], ["u1"])
+    assert sorted(mirror.update_times("usuarios")) == ["u2", "u3", "u5"]
+
+
+def test_deletion_alone_is_found_by_the_count(sync):
+    db, mirror, run = sync
+    db.delete_document("usuarios", "u2")
+    assert run() == ([], ["u2"])